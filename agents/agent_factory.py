@@ -0,0 +1,115 @@
+# -------------------- Agent Factory ---------------------------
+# Builds an AgentExecutor in one of two modes:
+#   "tools" - native function/tool calling with strict JSON-schema tools
+#   "react" - the text Thought/Action format parsed by create_react_agent
+# "auto" (default) decides per request: "tools" while a tool-calling backend
+# (OpenAI, Gemini) is healthy, "react" otherwise (e.g. Ollama only), and a
+# "tools" run whose backends all fail before any tool ran is retried as "react".
+# Override with AGENT_MODE=tools|react|auto.
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import BaseTool
+
+from config.llm import NoBackendAvailable
+from config.prompts import get_tool_calling_prompt
+
+AGENT_MODE = os.getenv("AGENT_MODE", "auto")
+AGENT_MODES = ("auto", "tools", "react")
+
+
+def resolve_mode(llm, mode: str = None) -> str:
+    """Concrete mode ("tools" or "react") for `llm`."""
+    mode = mode or AGENT_MODE
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode '{mode}', use one of {AGENT_MODES}")
+    if mode == "auto":
+        supports = getattr(llm, "supports_tool_calling", None)
+        return "tools" if supports and supports() else "react"
+    return mode
+
+
+def _single_mode_executor(llm, tools, react_prompt, agent_name: str, mode: str, **executor_kwargs) -> AgentExecutor:
+    if mode == "tools":
+        agent = create_tool_calling_agent(llm, tools, get_tool_calling_prompt(agent_name))
+    else:
+        agent = create_react_agent(llm=llm, tools=tools, prompt=react_prompt)
+    # LangChain 0.3 agents only support forced stopping; "generate" raises at max_iterations
+    executor_kwargs["early_stopping_method"] = "force"
+    executor = AgentExecutor(agent=agent, tools=tools, **executor_kwargs)
+    executor.metadata = {**(executor.metadata or {}), "agent_mode": mode}
+    return executor
+
+
+class _ToolCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.tool_calls = 0
+
+    def on_tool_start(self, serialized, input_str, **kwargs) -> None:
+        self.tool_calls += 1
+
+
+class AdaptiveExecutor:
+    """
+    "auto" mode: a tool-calling and a ReAct executor over the same tools.
+    Each invoke() uses tool calling while the LLM reports a healthy
+    tool-capable provider. If that run fails because no backend answered and
+    no tool has run yet (so nothing is repeated), it is retried as ReAct.
+    """
+
+    def __init__(self, llm, tools_executor: AgentExecutor, react_executor: AgentExecutor):
+        self.llm = llm
+        self.tools_executor = tools_executor
+        self.react_executor = react_executor
+        self.metadata = {"agent_mode": "auto"}
+
+    def invoke(self, inputs, config=None, **kwargs):
+        if self.llm.supports_tool_calling():
+            counter = _ToolCounter()
+            config = dict(config or {})
+            callbacks = config.get("callbacks")
+            if callbacks is None or isinstance(callbacks, list):
+                config["callbacks"] = list(callbacks or []) + [counter]
+            else:  # a callback manager
+                callbacks = callbacks.copy()
+                callbacks.add_handler(counter, inherit=True)
+                config["callbacks"] = callbacks
+            try:
+                result = self.tools_executor.invoke(inputs, config=config, **kwargs)
+                result["agent_mode"] = "tools"
+                return result
+            except (NoBackendAvailable, TimeoutError):
+                if counter.tool_calls:
+                    raise
+                config["callbacks"] = callbacks
+        result = self.react_executor.invoke(inputs, config=config, **kwargs)
+        result["agent_mode"] = "react"
+        return result
+
+
+def build_executor(llm, tools, react_prompt, agent_name: str, mode: str = None, **executor_kwargs):
+    """
+    Executor for `tools` in `mode` (default AGENT_MODE). `react_prompt` is
+    the agent's existing ReAct prompt; tool-calling mode uses
+    get_tool_calling_prompt(agent_name) instead. "auto" with an LLM that can
+    report tool-calling health returns an AdaptiveExecutor, which picks the
+    mode per request. Raises TypeError if an entry of `tools` is not a tool.
+    """
+    invalid = [t for t in tools if not isinstance(t, BaseTool)]
+    if invalid:
+        raise TypeError(f"{agent_name} agent: not tools: {[repr(t)[:60] for t in invalid]}")
+    tools = list(tools)
+    mode = mode or AGENT_MODE
+    if mode == "auto" and hasattr(llm, "supports_tool_calling"):
+        return AdaptiveExecutor(
+            llm,
+            _single_mode_executor(llm, tools, react_prompt, agent_name, "tools", **executor_kwargs),
+            _single_mode_executor(llm, tools, react_prompt, agent_name, "react", **executor_kwargs),
+        )
+    return _single_mode_executor(llm, tools, react_prompt, agent_name, resolve_mode(llm, mode), **executor_kwargs)
@@ -17,6 +17,16 @@ from langchain.output_parsers import StructuredOutputParser
 from config.llm import get_llm
 from config.prompts import get_analytics_prompt
 from config.database import execute_query
+from tools.query_sandbox import run_sandboxed_query
+from tools.query_validator import run_validated_query
+from tools.query_catalog import run_query
+from tools.vector_index import rag_search
+from tools.report_library import note_generated_query, run_saved_report, save_pending_report, set_current_question
+from tools.rollups import kpi_trend, get_kpi_trend
+from tools.approx_analytics import use_approx, approx_top_products, get_approximate_analytics
+from config.schema import get_schema, schema_digest
+from config.budget import run_with_budget
+from agents.agent_factory import build_executor
 from datetime import datetime, timedelta
 
 
@@ -29,7 +39,7 @@ from datetime import datetime, timedelta
 
 # ----------------- Sales Analytics -----------------
 @tool
-def get_sale_analytics(_: str) -> dict:
+def get_sale_analytics(request: str = "") -> dict:
     """
     Returns comprehensive sales metrics including:
     - Top customers
@@ -40,56 +50,24 @@ def get_sale_analytics(_: str) -> dict:
     """
     try:
         # Top 10 customers by total order value
-        top_customers_query = """
-        SELECT c.name AS customer_name,
-               COUNT(o.id) AS order_count,
-               SUM(o.total) AS total_value
-        FROM customers c
-        JOIN orders o ON c.id = o.customer_id
-        GROUP BY c.id, c.name
-        ORDER BY total_value DESC
-        LIMIT 10;
-        """
-        top_customers = execute_query(top_customers_query)
+        top_customers = run_query("sales.top_customers")
 
         # Sales by status
-        sales_by_status_query = """
-        SELECT status,
-               COUNT(*) AS order_count,
-               SUM(total) AS total_value
-        FROM orders
-        GROUP BY status;
-        """
-        sales_by_status = execute_query(sales_by_status_query)
+        sales_by_status = run_query("sales.by_status")
 
         # Monthly sales for last 6 months
         six_months_ago = (datetime.now() - timedelta(days=180)).strftime("%Y-%m-01")
-        monthly_sales_query = f"""
-        SELECT strftime('%Y-%m', created_at) AS month,
-               COUNT(*) AS order_count,
-               SUM(total) AS total_value
-        FROM orders
-        WHERE created_at >= '{six_months_ago}'
-        GROUP BY month
-        ORDER BY month ASC;
-        """
-        monthly_sales = execute_query(monthly_sales_query)
+        # Read from the monthly rollup buckets rather than grouping every order
+        monthly_sales = [{"month": r["bucket"][:7], "order_count": r["order_count"], "total_value": r["revenue"]}
+                         for r in kpi_trend(("order_count", "revenue"), "month", six_months_ago)]
 
         # Average order value
-        avg_order_query = "SELECT AVG(total) AS avg_order_value FROM orders;"
-        avg_order_value_result = execute_query(avg_order_query)
+        avg_order_value_result = run_query("sales.avg_order_value")
         avg_order_value = avg_order_value_result[0]['avg_order_value'] if avg_order_value_result else 0
 
         # New customers in last 6 months
-        new_customers_query = f"""
-        SELECT strftime('%Y-%m', created_at) AS month,
-               COUNT(*) AS new_customers
-        FROM customers
-        WHERE created_at >= '{six_months_ago}'
-        GROUP BY month
-        ORDER BY month ASC;
-        """
-        new_customers = execute_query(new_customers_query)
+        new_customers = [{"month": r["bucket"][:7], "new_customers": r["new_customers"]}
+                         for r in kpi_trend(("new_customers",), "month", six_months_ago)]
 
         # Final structured result
         analytics = {
@@ -126,7 +104,7 @@ NEW CUSTOMERS (LAST 6 MONTHS):
 
 # ----------------- Product Analytics -----------------
 @tool
-def get_product_analytics(_: str) -> dict:
+def get_product_analytics(request: str = "") -> dict:
     """
     Returns product-related metrics including:
     - Top 10 products by sales
@@ -134,45 +112,22 @@ def get_product_analytics(_: str) -> dict:
     - Inventory summary
     """
     try:
-        # Top products by sales
-        top_products_query = """
-        SELECT p.name AS product_name,
-               SUM(oi.quantity) AS total_sold,
-               SUM(oi.price * oi.quantity) AS total_revenue
-        FROM products p
-        JOIN order_items oi ON p.id = oi.product_id
-        GROUP BY p.id, p.name
-        ORDER BY total_sold DESC
-        LIMIT 10;
-        """
-        top_products = execute_query(top_products_query)
+        # Top products by sales (from the Space-Saving sketch when ANALYTICS_APPROX is on)
+        approximate = use_approx()
+        top_products = approx_top_products() if approximate else run_query("products.top_by_sales")
 
         # Top products by reviews
-        top_reviewed_query = """
-        SELECT p.name AS product_name,
-               COUNT(r.id) AS review_count,
-               AVG(r.rating) AS avg_rating
-        FROM products p
-        LEFT JOIN reviews r ON p.id = r.product_id
-        GROUP BY p.id, p.name
-        ORDER BY avg_rating DESC
-        LIMIT 10;
-        """
-        top_reviewed = execute_query(top_reviewed_query)
+        # Not every ERP database ships a reviews table
+        top_reviewed = run_query("products.top_by_reviews") if "reviews" in get_schema() else []
 
         # Inventory summary
-        inventory_query = """
-        SELECT name AS product_name, stock_quantity
-        FROM products
-        ORDER BY stock_quantity ASC;
-        """
-        inventory = execute_query(inventory_query)
+        inventory = run_query("products.inventory")
 
         # Formatted report
         report = f"""
 PRODUCT ANALYTICS REPORT
 ========================
-TOP 10 PRODUCTS BY SALES:
+TOP 10 PRODUCTS BY SALES{" (APPROXIMATE)" if approximate else ""}:
 {chr(10).join([f"- {p['product_name']}: {p['total_sold']} sold, ${p['total_revenue']:.2f}" for p in top_products])}
 
 TOP 10 PRODUCTS BY REVIEWS:
@@ -193,7 +148,7 @@ INVENTORY SUMMARY (Lowest to Highest Stock):
         return {"error": str(e)}
 # --------------------------------- Customer Analytics Tool ------------------------
 @tool
-def get_customer_analytics(_: str) -> dict:
+def get_customer_analytics(request: str = "") -> dict:
     """
     Returns customer-related metrics including:
     - Customer growth per month
@@ -202,36 +157,14 @@ def get_customer_analytics(_: str) -> dict:
     """
     try:
         # Customer growth per month
-        customer_growth_query = """
-        SELECT strftime('%Y-%m', created_at) AS month,
-               COUNT(*) AS new_customers
-        FROM customers
-        GROUP BY month
-        ORDER BY month ASC;
-        """
-        customer_growth = execute_query(customer_growth_query)
+        customer_growth = [{"month": r["bucket"][:7], "new_customers": r["new_customers"]}
+                           for r in kpi_trend(("new_customers",), "month")]
 
         # Customer activity (orders and spending)
-        customer_activity_query = """
-        SELECT c.name AS customer_name,
-               COUNT(o.id) AS order_count,
-               SUM(o.total) AS total_spent
-        FROM customers c
-        LEFT JOIN orders o ON c.id = o.customer_id
-        GROUP BY c.id, c.name
-        ORDER BY total_spent DESC;
-        """
-        customer_activity = execute_query(customer_activity_query)
+        customer_activity = run_query("customers.activity")
 
         # Lead status and average score
-        lead_status_query = """
-        SELECT status,
-               COUNT(*) AS count,
-               AVG(CASE WHEN score IS NOT NULL THEN score ELSE 0 END) AS avg_score
-        FROM leads
-        GROUP BY status;
-        """
-        lead_status = execute_query(lead_status_query)
+        lead_status = run_query("leads.status_summary")
 
         # Build a readable analytics report
         report = f"""
@@ -258,35 +191,35 @@ LEAD STATUS:
         return {"error": str(e)}
 @tool
 def run_custom_query(input: str) -> List[Dict]:
-    """Run any SQL query (read-only recommended) and return the results."""
-    return execute_custom_query(input)
+    """
+    Run a read-only SQL query (SELECT/WITH only) and return the results.
+    At most 200 rows are returned; queries that join tables without a join
+    condition or run too long are rejected with an error.
+    Misspelled table/column names are repaired automatically where possible;
+    otherwise the error comes back with suggested column names, and with
+    suggested_sql when a column exists under another name. Check that the
+    suggestion means what you asked before running it.
+    """
+    rows = run_validated_query(input)
+    if not (rows and "error" in rows[0]) and not (rows and "auto_repaired" in rows[-1]):
+        # Candidate saved report; only the request's last one is saved, once it has answered
+        note_generated_query(input)
+    return rows
 
 @tool
-def get_financial_summary_tool(_: str) -> Dict[str, float]:
+def get_financial_summary_tool(request: str = "") -> Dict[str, float]:
     """
     Return a basic financial summary:
     - total revenue
     - total cost
     - total profit
     """
-
-    query = """
-    SELECT 
-        SUM(oi.unit_price * oi.quantity) AS total_revenue,
-        SUM(oi.cost * oi.quantity) AS total_cost,
-        SUM(oi.unit_price * oi.quantity) - SUM(oi.cost * oi.quantity) AS total_profit
-    FROM order_items oi
-    JOIN orders o ON oi.order_id = o.id
-    WHERE o.status = 'completed'
-    """
-
     try:
-        conn = sqlite3.connect("erp.db")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(query)
-        result = cursor.fetchone()
-        conn.close()
+        # orders has no 'completed' status; everything not cancelled counts
+        rows = run_query("finance.summary_excluding_status", {"excluded_status": "cancelled"})
+        if rows and "error" in rows[0]:
+            return rows[0]
+        result = rows[0] if rows else None
 
         if result:
             return {
@@ -302,9 +235,13 @@ def get_financial_summary_tool(_: str) -> Dict[str, float]:
 Analytics_tools = [
     get_sale_analytics,
     get_customer_analytics,
+    get_kpi_trend,
+    get_approximate_analytics,
+    run_saved_report,
     run_custom_query,
     get_product_analytics, 
-    get_financial_summary_tool
+    get_financial_summary_tool,
+    rag_search
 ]
 
 # ----------------------------- LLM -----------------------------
@@ -326,19 +263,16 @@ output_parser = StructuredOutputParser.from_response_schemas(
 
 # ----------------------- Building the Analytics Agent -----------------
 prompt = get_analytics_prompt()
-agent = create_react_agent(
-    llm=llm,
-    tools=Analytics_tools,
-    prompt=prompt
-)
-
-executor = AgentExecutor(
-    agent=agent,
-    tools=Analytics_tools,
+# Native tool calling where the backend supports it, ReAct otherwise (see agent_factory)
+executor = build_executor(
+    llm,
+    Analytics_tools,
+    prompt,
+    "analytics",
     verbose=True,
     handle_parsing_errors=True,
-    max_iteration=3,
-    early_stopping_method="generate"
+    max_iterations=3,
+    early_stopping_method="force"
 )
 
 def main_analytics_agent():
@@ -360,7 +294,10 @@ def main_analytics_agent():
             print("Exiting Analytics Agent. Goodbye!")
             break
         try:
-            result = executor.invoke({"user_input": user_input})
+            set_current_question(user_input)
+            result = run_with_budget(executor, {"input": user_input, "schema": schema_digest(user_input)})
+            if not result["budget"]["exceeded"] and "Agent stopped" not in result["output"]:
+                save_pending_report()
             print(f"Analytics Agent Response:\n{result['output']}\n")
         except KeyboardInterrupt:
             print("Analytics Agent shutting down")
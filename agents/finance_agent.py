@@ -12,6 +12,8 @@ from langchain.agents import create_react_agent, AgentExecutor
 from langchain.tools import tool
 from langchain.output_parsers import StructuredOutputParser
 from config.prompts import get_react_prompt
+from tools.vector_index import get_vector_index
+from tools.lead_scoring import rescore_leads, score_lead_text
 #from sklearn.feature_extraction.text import TfidfVectorizer
 #from sklearn.linear_model import LogisticRegression
 
@@ -43,19 +45,27 @@ def sales_sql_write(query: str):
 @tool
 def sales_rag_search(query: str) -> str:
     """
-    Retrieve related documents using RAG (Chroma/FAISS)
-    Placeholder implementation, replace with real vector search
+    Retrieve related documents, glossary terms and saved reports from the local vector index
     """
-    # Simulate retrieved documents
-    return f"Relevant docs for query: {query}"
+    hits = get_vector_index().search(query, k=5)
+    if not hits:
+        return f"No related documents found for: {query}"
+    return "\n".join(f"- [{h['source']} #{h['source_id']}] {h['text'][:300]}" for h in hits)
 
 # --------------------- Lead Scoring -------------------------
 
-# Example ML model (pre-trained elsewhere)
-# Placeholder: always returns 0.75
+# Registry-managed model from tools.lead_scoring (trained offline, loaded once per process).
+# Read-only: re-scoring stored leads is the separate rescore_leads tool.
 @tool
-def lead_score_tool(lead_text: str) -> float:
-    return 0.75
+def lead_score_tool(lead_text: str) -> dict:
+    """
+    Score one lead's message text (probability of conversion, 0-1).
+    Does not write anything; use rescore_leads to update stored lead scores.
+    """
+    score = score_lead_text(lead_text)
+    if score is None:
+        return {"error": "No lead-scoring model is registered yet; run rescore_leads first."}
+    return {"score": score}
 
 # --------------------- CRM Tools ----------------------------
 
@@ -117,6 +127,7 @@ def test_all_tools():
     print("7️⃣ Sales SQL Write:", sales_sql_write("INSERT INTO customers(name) VALUES('Delta Inc')"))
     print("8️⃣ RAG Search:", sales_rag_search("how to handle returns"))
     print("9️⃣ Lead Score:", lead_score_tool("Lead email content"))
+    print("🔟 Rescore Leads:", json.dumps(rescore_leads.invoke("all"), default=str))
 
 if __name__ == "__main__":
     test_all_tools()
@@ -0,0 +1,200 @@
+# -------------------- Speculative Tool Prefetch ---------------------------
+# Once a request is routed, its likely first tool call is predictable
+# ("orders of customer 5" -> get_orders(customer_id=5)). start_speculation()
+# runs those calls on a small pool while the LLM writes its first Thought;
+# tools wrapped with speculative() hand back the prefetched result when the
+# agent's Action matches, and run normally otherwise.
+#
+# Policy: only read-only tools listed in PREFETCH_RULES, at most
+# MAX_CALLS_PER_REQUEST per request, no new speculation while MAX_INFLIGHT
+# calls are already running, calls that have not started are cancelled
+# when the request finishes, and whole-table reports only while their
+# tables are small enough for a wasted run to be cheap.
+
+import contextvars
+import json
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from tools.query_sandbox import _table_rows, get_readonly_connection
+
+PREFETCH_WORKERS = 4
+MAX_CALLS_PER_REQUEST = 2
+MAX_INFLIGHT = 8
+# How long a matching Action waits for a prefetch that is still running.
+MATCH_WAIT_SECONDS = 10.0
+# Analytics reports aggregate these tables in full; they are speculated only
+# while the tables hold at most REPORT_MAX_SCAN_ROWS rows together.
+REPORT_TABLES = ("orders", "order_items", "customers", "leads")
+REPORT_MAX_SCAN_ROWS = 50_000
+
+
+def _customer_args(text: str) -> Dict[str, Any]:
+    m = re.search(r"customer\s*(?:id\s*)?#?\s*(\d+)", text, flags=re.I)
+    return {"customer_id": int(m.group(1))} if m else {}
+
+
+def _lead_args(text: str) -> Dict[str, Any]:
+    m = re.search(r"\b(new|qualified|lost)\b", text, flags=re.I)
+    return {"status": m.group(1).lower()} if m else {}
+
+
+def _report_args(text: str) -> Optional[Dict[str, Any]]:
+    """No arguments, or None (don't speculate) once the report's full scans get expensive."""
+    rows = _table_rows(get_readonly_connection())  # MAX(rowid) estimates, cached
+    return {} if sum(rows.get(t, 0) for t in REPORT_TABLES) <= REPORT_MAX_SCAN_ROWS else None
+
+
+# domain -> [(pattern, tool name, args from the question, args that must match)]
+# Filtered lookups are only prefetched when the question supplies a filter
+# (an empty args dict skips the rule), so no unfiltered lookup is speculated.
+# Report tools do read whole tables; None for "args that must match" means
+# any call of them is a hit (their only parameter is free text), and their
+# args function returns None to skip them on large databases.
+PREFETCH_RULES: Dict[str, List[Tuple[str, str, Callable[[str], Optional[Dict[str, Any]]], Optional[Tuple[str, ...]]]]] = {
+    "sales": [
+        (r"\borders?\b", "get_orders", _customer_args, ("customer_id", "order_id")),
+        (r"\bleads?\b", "get_leads", _lead_args, ("lead_id", "contact_email", "status")),
+        (r"\bcustomers?\b", "get_customers", _customer_args, ("name", "email", "phone", "customer_id")),
+    ],
+    "analytics": [
+        (r"\b(sales|revenue|report)\b", "get_sale_analytics", _report_args, None),
+        (r"\bproducts?\b", "get_product_analytics", _report_args, None),
+        (r"\b(customers?|leads?)\b", "get_customer_analytics", _report_args, None),
+    ],
+}
+
+_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_inflight = threading.BoundedSemaphore(MAX_INFLIGHT)
+_current: contextvars.ContextVar[Optional["Speculation"]] = contextvars.ContextVar("speculation", default=None)
+_stats = {"started": 0, "hits": 0, "wasted": 0, "cancelled": 0, "skipped": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def prefetch_stats() -> Dict[str, int]:
+    """Process-wide counters: started, hits, wasted (finished but unused), cancelled, skipped."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _coerce(tool: BaseTool, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate args through the tool's schema, so "5" from a ReAct Action Input becomes 5."""
+    schema = tool.args_schema
+    if schema is None or not hasattr(schema, "model_validate"):
+        return args
+    try:
+        return schema.model_validate(args).model_dump(exclude_unset=True)
+    except Exception:
+        return args  # the real call reports the validation error
+
+
+def _key(args: Dict[str, Any], match: Optional[Tuple[str, ...]]) -> Optional[str]:
+    if match is None:
+        return None
+    relevant = {k: v for k, v in args.items() if k in match and v not in (None, "", 0)}
+    return json.dumps(relevant, sort_keys=True, default=str)
+
+
+class Speculation:
+    """Prefetched calls for one request; use as a context manager around the agent run."""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._token = None
+
+    def start(self, tool: BaseTool, args: Dict[str, Any], match: Optional[Tuple[str, ...]]) -> bool:
+        if not _inflight.acquire(blocking=False):
+            _count("skipped")
+            return False
+
+        def run() -> Any:
+            try:
+                return tool.invoke(args)
+            finally:
+                _inflight.release()
+
+        try:
+            future = _pool.submit(run)
+        except RuntimeError:
+            _inflight.release()
+            return False
+        self.calls.append({"tool": tool.name, "key": _key(_coerce(tool, args), match), "match": match,
+                           "future": future, "used": False})
+        _count("started")
+        return True
+
+    def take(self, name: str, args: Dict[str, Any]) -> Tuple[bool, Any]:
+        """(True, result) when a prefetched call matches this Action, else (False, None)."""
+        for call in self.calls:
+            if call["used"] or call["tool"] != name or call["key"] != _key(args, call["match"]):
+                continue
+            future: Future = call["future"]
+            try:
+                result = future.result(timeout=MATCH_WAIT_SECONDS)
+            except Exception:
+                return False, None
+            if isinstance(result, dict) and "error" in result:
+                return False, None  # let the real call produce (and report) the error
+            call["used"] = True
+            _count("hits")
+            return True, result
+        return False, None
+
+    def summary(self) -> Dict[str, Any]:
+        return {"prefetched": [c["tool"] for c in self.calls], "hits": sum(c["used"] for c in self.calls)}
+
+    def __enter__(self) -> "Speculation":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _current.reset(self._token)
+        for call in self.calls:
+            if call["used"]:
+                continue
+            if call["future"].cancel():
+                _count("cancelled")
+            else:
+                _count("wasted")
+
+
+def start_speculation(domain: Optional[str], question: str, tools: List[BaseTool]) -> Speculation:
+    """Start the predicted first tool calls for `question` in `domain` (tools by name from `tools`)."""
+    speculation = Speculation()
+    by_name = {t.name: t for t in tools}
+    for pattern, name, args_for, match in PREFETCH_RULES.get(domain, []):
+        if len(speculation.calls) >= MAX_CALLS_PER_REQUEST:
+            break
+        if name not in by_name or not re.search(pattern, question, flags=re.I):
+            continue
+        args = args_for(question)
+        if args is None or (match is not None and not args):
+            continue  # too expensive to risk, or nothing to filter on
+        speculation.start(by_name[name], args, match)
+    return speculation
+
+
+def speculative(tool: BaseTool) -> BaseTool:
+    """Same name, description and schema as `tool`; serves prefetched results when one matches."""
+    fields = list(tool.args)
+
+    def run(*args, **kwargs):
+        kwargs.update(zip(fields, args))  # ReAct passes a single positional input
+        speculation = _current.get()
+        if speculation is not None:
+            hit, result = speculation.take(tool.name, _coerce(tool, kwargs))
+            if hit:
+                return result
+        return tool.invoke(kwargs)
+
+    return StructuredTool.from_function(func=run, name=tool.name, description=tool.description,
+                                        args_schema=tool.args_schema)
@@ -17,10 +17,12 @@ Features:
 
 # ------------------------------- IMPORTS ------------------------------------------
 import os 
+import re
 import sys
 from dotenv import load_dotenv #secure API key
 from pathlib import Path 
 import sqlite3
+import threading
 
 # Load environment variables for API keys
 load_dotenv()
@@ -30,12 +32,19 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # LangChain imports
-from config.prompts import get_router_prompt
+from config.prompts import get_flat_router_prompt, get_router_prompt
 from langchain.memory.buffer_window import ConversationBufferWindowMemory
 from langchain.prompts import ChatPromptTemplate
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain.tools import tool
 from config.llm import get_llm
+from tools.vector_index import rag_search
+from tools.report_library import answer_from_library, save_pending_report, set_current_question
+from config.schema import schema_digest
+from config.memory import get_memory
+from config.budget import run_with_budget
+from agents.agent_factory import build_executor
+from agents.prefetch import speculative, start_speculation
 
 
 # Import domain agents (must exist in Agents folder)
@@ -43,6 +52,19 @@ from agents.sales_agent import executor as sales_executor
 #from agents.finance_agent import executor as finance_executor
 #from agents.inventory_agent import executor as inventory_executor
 from agents.analytics_agent import executor as analytics_executor
+from agents.analytics_agent import (get_sale_analytics, get_customer_analytics, get_product_analytics,
+                                    get_financial_summary_tool)
+from tools.database_tools import get_customers, get_orders, get_leads, get_financial_summary, get_stock_levels
+from tools.report_library import run_saved_report
+from tools.text_search import search_tickets, search_lead_messages
+from tools.customer_search import search_customers_tool
+from tools.rollups import get_kpi_trend
+from tools.bulk_tools import INVENTORY_TOOLS
+from tools.approx_analytics import get_approximate_analytics
+
+# "flat": the router calls domain tools itself and nests a sub-agent only for
+# multi-step work; "nested": every request goes through a sub-agent
+ROUTER_MODE = os.getenv("ROUTER_MODE", "flat")
 
 #--------------------------------- DATABASE HELPER --------------------------------------
 #  ----- Get Connected with you DB file rep.db and explore its content for logging/registry tool
@@ -112,54 +134,74 @@ def excute_with_analytics_agent(user_request:str) -> str:
     Input: user's request/question about analytics, reports, or business insights
     """
     try:
+        # A closely matching saved report answers without another LLM loop
+        saved = answer_from_library(user_request)
+        if saved:
+            return f"Analytics Agent response:{saved}"
+        set_current_question(user_request)
         print(f"Your request is being sent to the Analytics Agent: {user_request}")
-        result = analytics_executor.invoke({"input": user_request})
+        result = analytics_executor.invoke({"input": user_request, "schema": schema_digest(user_request)})
+        if "Agent stopped" not in result["output"]:
+            save_pending_report()  # only the query behind a final answer is kept
         return f"Analytics Agent response:{result['output']}"
     except Exception as e:
         return f"Analytics Agent error: {str(e)}"
     
 # --------------------------- CLASSIFIER & ROUTER -----------------------------
-@tool
-def classify_and_route(user_request: str) -> str:
-    """
-    Automatically classify user request and route it to the CORRECT agent BASED ON KEYWORDS.
-    Input: user's request/question
-    """
-    request_lower = user_request.lower() # To avoid case-insensitive keyword matching
-
-    # Keywords for each domain
-    sales_keywords = [
+# Keywords for each domain
+DOMAIN_KEYWORDS = {
+    'sales': [
     "customer", "lead", "prospect", "order", "purchase", "ticket",
     "crm", "client", "quote", "deal", "support", "follow-up"
-]
-    finance_keywords = [
+],
+    'finance': [
     "invoice", "billing", "payment", "refund", "transaction", "ledger",
     "account", "policy", "budget", "cashflow", "expense", "tax", "anomaly"
-]
-    inventory_keywords = [
+],
+    'inventory': [
     "inventory", "stock", "warehouse", "supplier", "delivery", "supply",
     "purchase order", "po", "receipt", "shipment", "logistics", "forecast", "restock"
-]
-    analytics_keywords = [
+],
+    'analytics': [
     "report", "kpi", "metric", "dashboard", "analytics", "performance",
     "trend", "statistics", "sql", "chart", "visualization", "summary", "insight"
-]
+] }
+
+# The best domain must beat the runner-up by this many keyword matches;
+# anything less (e.g. a tie) is left to the nested router's LLM.
+MIN_ROUTING_MARGIN = 1
+
+def classify_domain(user_request: str):
+    """
+    Return (domain, keyword matches) for the best matching domain, or
+    (None, matches) when nothing matches or the best domain is not a clear winner.
+    """
+    request_lower = user_request.lower() # To avoid case-insensitive keyword matching
 
-# Count keyword matches
-    scores = {
-    'sales': sum(1 for kw in sales_keywords if kw in request_lower),
-    'finance': sum(1 for kw in finance_keywords if kw in request_lower),
-    'inventory': sum(1 for kw in inventory_keywords if kw in request_lower),
-    'analytics': sum(1 for kw in analytics_keywords if kw in request_lower) }
+# Count whole-word keyword matches ("po" must not match inside "report"); plurals count
+    scores = {domain: sum(1 for kw in keywords if re.search(rf"\b{re.escape(kw)}(?:s|es)?\b", request_lower))
+              for domain, keywords in DOMAIN_KEYWORDS.items()}
 
 # Select domain with highest score
+    ranked = sorted(scores.values(), reverse=True)
     best_domain = max(scores.items(), key =lambda x: x[1])
-    if best_domain[1] == 0:
+    if best_domain[1] == 0 or best_domain[1] - ranked[1] < MIN_ROUTING_MARGIN:
+        return None, best_domain[1]
+    return best_domain
+
+@tool
+def classify_and_route(user_request: str) -> str:
+    """
+    Automatically classify user request and route it to the CORRECT agent BASED ON KEYWORDS.
+    Input: user's request/question
+    """
+    domain, confidence = classify_domain(user_request)
+    if domain is None and confidence:
+        return "The request matches several agents equally. Call the sales or analytics agent directly."
+    if domain is None:
         return f"I can help you with various ERP tasks"
     
 # Route for selection of the appropriate agent
-    domain = best_domain[0]
-    confidence = best_domain[1]
     print(f"auto routing to {domain} agent (confidence :{confidence} keywor matches)")
 
     if domain == 'sales':
@@ -213,21 +255,17 @@ SMART_ROUTER_TOOLS = [
     classify_and_route,
     get_system_info, 
     excute_with_sales_agent, 
-    '''excute_with_finance_agent, 
-    excute_with_inventory_agent''',
-    excute_with_analytics_agent
+    # excute_with_finance_agent, excute_with_inventory_agent: no such agents yet
+    excute_with_analytics_agent,
+    rag_search
     ]
 
 #--------------------------- LLM --------------------------------------
 llm = get_llm()
 
 #--------------------------- Memory -------------------------------------
-'''
-def get_memory():
-    """Return a conversation buffer memory for the last k messages."""
-    return ConversationBufferWindowMemory(k=5, memory_key="chat_history", return_messages=True)
+# Windowed + summarized history persisted to conversations/messages
 memory = get_memory()
-'''
 #--------------------------- prompt -------------------------------------
 '''def smart_react_prompt():
     """Return the prompt template for the router agent."""
@@ -263,14 +301,72 @@ Always try to automatically route and excute the request rather than just provid
 """
 
 #------------------------------ Agent and Executor --------------------------------
-agent = create_react_agent(llm =llm, tools=SMART_ROUTER_TOOLS, prompt= prompt)
-executor = AgentExecutor(
-    agent = agent, 
-    tools = SMART_ROUTER_TOOLS,
+# Native tool calling where the backend supports it, ReAct otherwise (see agent_factory)
+nested_executor = build_executor(
+    llm,
+    SMART_ROUTER_TOOLS,
+    prompt,
+    "router",
     verbose = True,
     handle_parsing_errors= True,
     max_iterations=3,
-    early_stopping_method="generate")
+    early_stopping_method="force")
+
+#------------------------------ Flattened Orchestration --------------------------------
+# Single-step domain tools the router may call directly. The sub-agent wrapper
+# stays available for genuinely multi-step work (e.g. custom SQL, chained lookups).
+DIRECT_TOOLS = {
+    'sales': [get_customers, search_customers_tool, get_orders, get_leads, search_tickets, search_lead_messages, get_financial_summary,
+              excute_with_sales_agent],
+    'analytics': [run_saved_report, get_kpi_trend, get_sale_analytics, get_customer_analytics, get_product_analytics,
+                  get_approximate_analytics, get_financial_summary_tool, excute_with_analytics_agent],
+    # No inventory sub-agent yet: stock reads and writes directly, anything else via the analytics agent
+    'inventory': [get_stock_levels, get_product_analytics, *INVENTORY_TOOLS, excute_with_analytics_agent],
+}
+
+class FlatRouter:
+    """
+    Routes with the keyword classifier first, then runs one agent loop whose
+    tools are that domain's direct tools, so "list customers" costs one loop
+    (router) instead of two (router + sales agent). Requests without a
+    direct-tool domain, or whose classification is ambiguous, use the nested router.
+
+    While the LLM writes its first Thought, the domain's predictable first
+    tool calls run in the background (agents/prefetch.py); a matching Action
+    returns the prefetched result.
+    """
+
+    def __init__(self):
+        self._executors = {}
+        self._lock = threading.Lock()  # one FlatRouter serves every server thread
+        self._prompt = get_flat_router_prompt()
+
+    def executor_for(self, domain):
+        if domain not in DIRECT_TOOLS:
+            return nested_executor
+        with self._lock:
+            if domain not in self._executors:
+                self._executors[domain] = build_executor(
+                    llm,
+                    [speculative(t) for t in DIRECT_TOOLS[domain]] + [get_system_info, rag_search],
+                    self._prompt,
+                    "flat_router",
+                    verbose = True,
+                    handle_parsing_errors= True,
+                    max_iterations=3,
+                    early_stopping_method="force")
+            return self._executors[domain]
+
+    def invoke(self, inputs, config=None, **kwargs):
+        domain, _ = classify_domain(inputs["input"])
+        executor = self.executor_for(domain)
+        with start_speculation(domain, inputs["input"], DIRECT_TOOLS.get(domain, [])) as speculation:
+            result = executor.invoke(inputs, config=config, **kwargs)
+        result["route"] = {"mode": "flat", "domain": domain if domain in DIRECT_TOOLS else None,
+                           "prefetch": speculation.summary()}
+        return result
+
+executor = FlatRouter() if ROUTER_MODE == "flat" else nested_executor
 
 # --------------------------------- INTERACTIVE RUN -------------------------------
 def main_smart_router_agent():
@@ -283,14 +379,19 @@ def main_smart_router_agent():
     print(" Sales report -> Auto-routes to Analytics Agent")
     print (" Type 'quit' to exit \n")
 
+    session_id = memory.start_session()
     while True:
         user_input = input("Smart Router > ").strip()
         if user_input.lower() in ["quit", "exit", "q"]:
+            memory.flush()
             print("Exiting Smart Router Agent. Goodbye!")
             break
         try:
-            result = executor.invoke({"input": user_input})
+            # One budget covers the router and every agent it delegates to
+            result = run_with_budget(executor, {"input": user_input, "chat_history": memory.history(session_id)})
+            memory.add_turn(session_id, user_input, result['output'])
             print(f"Smart Router Response: {result['output']}\n")
+            print(f"Budget used: {result['budget']['used']}\n")
         except Exception as e:
             print(f"Error while processing request: {str(e)}\n")
 
@@ -15,6 +15,13 @@ from langchain.output_parsers import StructuredOutputParser
 from config.llm import get_llm
 from config.prompts import get_sales_prompt
 from tools.database_tools import get_customers, create_customer, get_orders, get_leads, ask_clarification, execute_query, get_financial_summary
+from tools.bulk_tools import create_customers_bulk, upsert_leads
+from tools.vector_index import rag_search
+from tools.lead_scoring import rescore_leads
+from tools.customer_search import search_customers_tool
+from tools.text_search import search_tickets, search_lead_messages
+from config.budget import run_with_budget
+from agents.agent_factory import build_executor
 
 
 # --------------------- Tools for Sales Agent ---------------------
@@ -55,7 +62,7 @@ def ask_clarification(question: str) -> str:
 
 # --------------------- Tools for Sales Agent ---------------------
 
-SALES_TOOLS = [get_customers, create_customer, get_orders, get_leads, ask_clarification, get_financial_summary]
+SALES_TOOLS = [get_customers, search_customers_tool, create_customer, create_customers_bulk, upsert_leads, get_orders, get_leads, search_tickets, search_lead_messages, rescore_leads, ask_clarification, get_financial_summary, rag_search]
 
 # ----------------------------- LLM -----------------------------
 llm = get_llm()
@@ -74,19 +81,16 @@ tool_names = [tool.name for tool in SALES_TOOLS]
 prompt = get_sales_prompt()
 # ----------------------- Building the Sales Agent -----------------
 
-agent = create_react_agent(
-    llm=llm,
-    tools=SALES_TOOLS,
-    prompt=prompt
-)
-
+# Native tool calling where the backend supports it, ReAct otherwise (see agent_factory)
 # Verbose is handled by the executor
-executor = AgentExecutor(
-    agent=agent,
-    tools=SALES_TOOLS,
+executor = build_executor(
+    llm,
+    SALES_TOOLS,
+    prompt,
+    "sales",
     verbose=True,
     handle_parsing_errors=True,
-    max_iteration=3,
+    max_iterations=3,
     early_stopping_method="force"  
 )
 
@@ -112,7 +116,7 @@ def main_smart_sales_agent():
             print("Exiting Smart Router Agent. Goodbye!")
             break
         try:
-            result = executor.invoke({"input": user_input})
+            result = run_with_budget(executor, {"input": user_input})
             print(f"Smart Router Response: {result['output']}\n")
         except KeyboardInterrupt as e:
             print(f"Sales Agent shutting down")
@@ -0,0 +1,160 @@
+# -------------------- Batch Question Runner ---------------------------
+# Answers a file of questions offline (e.g. nightly reporting) and streams
+# one JSON result per line as each question finishes.
+#
+#   python batch_runner.py questions.jsonl -o results.jsonl --workers 4
+#
+# Input: JSONL with {"question": ..., "id"?: ..., "agent"?: ...} per line,
+# or CSV with a "question" column (optional "id" and "agent" columns).
+
+import argparse
+import csv
+import importlib
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Routed domain -> agent module. Domains without their own agent go through the router.
+DOMAIN_AGENTS = {
+    "sales": "agents.sales_agent",
+    "analytics": "agents.analytics_agent",
+    "router": "agents.router_agent",
+}
+DEFAULT_WORKERS = 4
+
+_executors: Dict[str, Any] = {}
+_executors_lock = threading.Lock()
+
+
+# --------------------------
+# Input
+# --------------------------
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield {"id", "question", "agent"} from a .jsonl or .csv file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for i, row in enumerate(rows, start=1):
+            question = (row.get("question") or "").strip()
+            if question:
+                yield {"id": row.get("id") or i, "question": question, "agent": row.get("agent") or None}
+
+
+def _normalize(question: str) -> str:
+    return re.sub(r"[^a-z0-9 ]", "", re.sub(r"\s+", " ", question.lower())).strip()
+
+
+def plan_batch(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Deduplicate questions (case/whitespace/punctuation-insensitive) and route
+    each unique one to a domain. Returned jobs are grouped by domain so each
+    agent's caches stay warm while its questions run.
+    """
+    from agents.router_agent import classify_domain
+
+    jobs: Dict[tuple, Dict[str, Any]] = {}
+    for q in questions:
+        agent = q["agent"]
+        if agent is None:
+            domain, _ = classify_domain(q["question"])
+            agent = domain if domain in DOMAIN_AGENTS else "router"
+        key = (_normalize(q["question"]), agent)
+        if key in jobs:
+            jobs[key]["ids"].append(q["id"])
+        else:
+            jobs[key] = {"ids": [q["id"]], "question": q["question"], "agent": agent}
+    return sorted(jobs.values(), key=lambda j: j["agent"])
+
+
+# --------------------------
+# Execution
+# --------------------------
+def _executor(agent: str):
+    with _executors_lock:
+        if agent not in _executors:
+            _executors[agent] = importlib.import_module(DOMAIN_AGENTS[agent]).executor
+        return _executors[agent]
+
+
+def answer(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer one job; never raises, errors are reported in the result."""
+    from config.budget import run_with_budget
+    from config.schema import schema_digest
+    from tools.report_library import answer_from_library, save_pending_report, set_current_question
+
+    question, agent = job["question"], job["agent"]
+    started = time.time()
+    result = {"ids": job["ids"], "question": question, "agent": agent}
+    try:
+        output = None
+        if agent == "analytics":
+            # Saved reports answer without an LLM call
+            output = answer_from_library(question)
+            result["source"] = "saved_report" if output else "agent"
+        if output is None:
+            inputs = {"input": question}
+            if agent == "analytics":
+                set_current_question(question)
+                inputs["schema"] = schema_digest(question)
+            res = run_with_budget(_executor(agent), inputs)
+            output = res.get("output", "No output generated.")
+            result["budget"] = res["budget"]
+            if agent == "analytics" and not res["budget"]["exceeded"] and "Agent stopped" not in output:
+                save_pending_report()  # only the query behind a final answer is kept
+        result.update(status="done", output=output)
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["seconds"] = round(time.time() - started, 3)
+    return result
+
+
+def run_batch(questions: List[Dict[str, Any]], out, workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """
+    Run `questions` through a bounded thread pool, writing each result to
+    `out` as one JSON line as soon as it finishes. LLM calls are throttled
+    per backend by the rate limiter in the shared LLM client (config.llm).
+    """
+    started = time.time()
+    jobs = plan_batch(questions)
+    write_lock = threading.Lock()
+    stats = {"questions": len(questions), "unique": len(jobs), "done": 0, "errors": 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(answer, job) for job in jobs]
+        for future in as_completed(futures):
+            res = future.result()
+            stats["done" if res["status"] == "done" else "errors"] += 1
+            with write_lock:
+                out.write(json.dumps(res, default=str) + "\n")
+                out.flush()
+
+    stats["seconds"] = round(time.time() - started, 3)
+    return stats
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of ERP questions in batch")
+    parser.add_argument("input", help="questions file (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", help="results file (JSONL); defaults to stdout")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    questions = list(read_questions(args.input))
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        stats = run_batch(questions, out, workers=args.workers)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Answered {stats['unique']} unique of {stats['questions']} questions "
+          f"({stats['errors']} errors) in {stats['seconds']}s", file=sys.stderr)
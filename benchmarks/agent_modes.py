@@ -0,0 +1,110 @@
+# -------------------- Agent Mode Benchmark ---------------------------
+# Compares native tool calling with text ReAct parsing on the same questions:
+# LLM calls per solved question, parse failures and latency.
+#
+#   python benchmarks/agent_modes.py                 # both modes, built-in questions
+#   python benchmarks/agent_modes.py --modes react --questions my_questions.jsonl
+#
+# Needs a live backend; "tools" mode needs OpenAI or Gemini.
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.agent_factory import build_executor
+from config.budget import Budget, run_with_budget
+from config.llm import get_llm
+from config.schema import schema_digest
+
+QUESTIONS = [
+    {"agent": "sales", "question": "Show me all customers"},
+    {"agent": "sales", "question": "List the orders of customer 1"},
+    {"agent": "sales", "question": "Which leads are qualified?"},
+    {"agent": "sales", "question": "Give me the financial summary"},
+    {"agent": "analytics", "question": "Give me a sales report"},
+    {"agent": "analytics", "question": "What is the total revenue, cost and profit?"},
+    {"agent": "analytics", "question": "Which 5 products sold the most units?"},
+    {"agent": "analytics", "question": "How many orders are in each status?"},
+]
+# Generous enough that the mode, not the budget, decides how many calls a question takes
+BENCH_BUDGET = {"max_llm_calls": 12, "max_tool_calls": 12, "max_seconds": 180.0}
+UNSOLVED_MARKERS = ("Stopped early", "Agent stopped", "iteration limit", "time limit")
+
+
+def _executors(mode: str) -> Dict[str, Any]:
+    from agents import analytics_agent, sales_agent
+    llm = get_llm()
+    kwargs = dict(handle_parsing_errors=True, max_iterations=BENCH_BUDGET["max_llm_calls"],
+                  early_stopping_method="force", return_intermediate_steps=True)
+    return {
+        "sales": build_executor(llm, sales_agent.SALES_TOOLS, sales_agent.prompt, "sales", mode=mode, **kwargs),
+        "analytics": build_executor(llm, analytics_agent.Analytics_tools, analytics_agent.prompt,
+                                    "analytics", mode=mode, **kwargs),
+    }
+
+
+def _solved(output: str, failed: bool = False) -> bool:
+    """An answer that is not a stop/budget notice; `failed` marks runs that raised."""
+    return (not failed and bool(output and output.strip())
+            and not any(m.lower() in output.lower() for m in UNSOLVED_MARKERS))
+
+
+def run_mode(mode: str, questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    executors = _executors(mode)
+    rows = []
+    for q in questions:
+        inputs = {"input": q["question"]}
+        if q["agent"] == "analytics":
+            inputs["schema"] = schema_digest(q["question"])
+        started = time.time()
+        failed = False
+        try:
+            result = run_with_budget(executors[q["agent"]], inputs, Budget(**BENCH_BUDGET))
+            output, used = result["output"], result["budget"]["used"]
+            parse_errors = sum(1 for action, _ in result.get("intermediate_steps", [])
+                               if action.tool == "_Exception")
+        except Exception as e:
+            output, used, parse_errors, failed = f"error: {e}", {"llm_calls": 0, "tokens": 0}, 0, True
+        rows.append({"mode": mode, "agent": q["agent"], "question": q["question"],
+                     "solved": _solved(output, failed), "llm_calls": used["llm_calls"], "tokens": used["tokens"],
+                     "parse_errors": parse_errors, "seconds": round(time.time() - started, 2)})
+
+    solved = [r for r in rows if r["solved"]]
+    return {
+        "mode": mode,
+        "questions": len(rows),
+        "solved": len(solved),
+        "llm_calls": sum(r["llm_calls"] for r in rows),
+        "llm_calls_per_solved": round(sum(r["llm_calls"] for r in rows) / len(solved), 2) if solved else None,
+        "parse_errors": sum(r["parse_errors"] for r in rows),
+        "avg_seconds": round(sum(r["seconds"] for r in rows) / len(rows), 2) if rows else 0.0,
+        "rows": rows,
+    }
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark tool-calling vs ReAct agents")
+    parser.add_argument("--modes", nargs="+", default=["tools", "react"], choices=["tools", "react"])
+    parser.add_argument("--questions", help='JSONL file of {"agent": "sales"|"analytics", "question": ...}')
+    parser.add_argument("--json", help="also write full per-question results to this file")
+    args = parser.parse_args()
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [json.loads(line) for line in f if line.strip()]
+
+    summaries = [run_mode(mode, questions) for mode in args.modes]
+    print(f"\n{'mode':<8}{'solved':>10}{'LLM calls':>11}{'calls/solved':>14}{'parse errs':>12}{'avg s':>8}")
+    for s in summaries:
+        print(f"{s['mode']:<8}{s['solved']:>6}/{s['questions']:<3}{s['llm_calls']:>11}"
+              f"{str(s['llm_calls_per_solved']):>14}{s['parse_errors']:>12}{s['avg_seconds']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2, default=str)
@@ -0,0 +1,228 @@
+# -------------------- Ollama Pool Benchmark ---------------------------
+# Compares the old offline path (cold model, one prompt at a time) with
+# config.ollama_pool (warmed, keep-alive, micro-batched and streamed) against a
+# local stub of Ollama's /api/generate, so it runs without a model or GPU.
+#
+#   python benchmarks/ollama_pool.py
+#   python benchmarks/ollama_pool.py --sessions 8 --prompts 4 --tokens 64
+#   python benchmarks/ollama_pool.py --host http://localhost:11434   # real server instead of the stub
+#
+# The stub models a CPU host: loading a model takes --load-seconds, and each
+# decode step costs --token-seconds, growing by --batch-overhead per extra
+# sequence decoded in the same step (batching is cheaper than running one
+# request after another).
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.ollama_pool import OllamaPool
+
+MODEL = "qwen3:0.6b"
+PREFILL_SECONDS = 0.05
+
+
+# ------------------------- Stub server -------------------------
+class StubOllama:
+    """Just enough of Ollama for the benchmark: load/keep-alive, parallel slots, batched decoding."""
+
+    def __init__(self, load_seconds: float, token_seconds: float, batch_overhead: float,
+                 tokens: int, parallel: int):
+        self.load_seconds, self.token_seconds = load_seconds, token_seconds
+        self.batch_overhead, self.tokens = batch_overhead, tokens
+        self.slots = threading.Semaphore(parallel)
+        self.loaded_until = 0.0
+        self.active = 0
+        self.loads = 0
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+
+    def ensure_loaded(self, keep_alive: str) -> float:
+        with self.load_lock:
+            waited = 0.0
+            if time.monotonic() > self.loaded_until:
+                time.sleep(self.load_seconds)
+                self.loads += 1
+                waited = self.load_seconds
+            seconds = {"0": 0.0, "-1": float("inf")}.get(str(keep_alive))
+            if seconds is None:
+                text = str(keep_alive or "5m")
+                seconds = float(text[:-1]) * {"s": 1, "m": 60, "h": 3600}[text[-1]]
+            self.loaded_until = time.monotonic() + seconds
+            return waited
+
+    def generate(self, body: Dict[str, Any]):
+        """Yields the NDJSON messages of one /api/generate call."""
+        load = self.ensure_loaded(body.get("keep_alive", "5m"))
+        if not body.get("prompt"):
+            yield {"model": body["model"], "done": True, "load_duration": int(load * 1e9)}
+            return
+        with self.slots:
+            with self.lock:
+                self.active += 1
+            try:
+                time.sleep(PREFILL_SECONDS)
+                for i in range(self.tokens):
+                    with self.lock:
+                        batch = self.active
+                    time.sleep(self.token_seconds * (1 + self.batch_overhead * (batch - 1)))
+                    yield {"model": body["model"], "response": f"tok{i} ", "done": False}
+            finally:
+                with self.lock:
+                    self.active -= 1
+        yield {"model": body["model"], "response": "", "done": True, "eval_count": self.tokens,
+               "load_duration": int(load * 1e9)}
+
+    def serve(self) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                messages = stub.generate(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                if body.get("stream", True) and body.get("prompt"):
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for message in messages:
+                        data = (json.dumps(message) + "\n").encode()
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                parts = list(messages)
+                final = dict(parts[-1], response="".join(m.get("response", "") for m in parts))
+                data = json.dumps(final).encode()
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                pass  # clients dropping keep-alive connections at shutdown
+
+        server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# ------------------------- Clients -------------------------
+def run_baseline(host: str, sessions: int, prompts: int) -> Dict[str, Any]:
+    """Old path: no warm-up, default keep-alive, one non-streamed prompt at a time."""
+    serial = threading.Lock()
+    latencies: List[float] = []
+    tokens = [0]
+
+    def session(s: int) -> None:
+        for p in range(prompts):
+            started = time.monotonic()
+            with serial:
+                response = requests.post(f"{host}/api/generate", timeout=600,
+                                         json={"model": MODEL, "prompt": f"session {s} question {p}", "stream": False})
+            message = response.json()
+            latencies.append(time.monotonic() - started)  # first token arrives with the whole answer
+            tokens[0] += message.get("eval_count") or len(message.get("response", "").split())
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    return _summary("baseline", started, 0.0, tokens[0], latencies)
+
+
+def run_pool(host: str, sessions: int, prompts: int, parallel: int) -> Dict[str, Any]:
+    """New path: warm at start-up, then concurrent sessions through the batching pool."""
+    pool = OllamaPool(host=host, parallel=parallel)
+    warm_started = time.monotonic()
+    pool.warm([MODEL])
+    warm_seconds = time.monotonic() - warm_started
+    latencies: List[float] = []
+    tokens = [0]
+
+    def session(s: int) -> None:
+        for p in range(prompts):
+            completion = pool.submit(f"session {s} question {p}", MODEL)
+            for _ in completion.stream():
+                pass
+            latencies.append(completion.first_token_at - completion.submitted_at)
+            tokens[0] += completion.stats.get("eval_count") or 0
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(session, range(sessions)))
+    result = _summary("pool", started, warm_seconds, tokens[0], latencies)
+    result["pool"] = pool.stats()
+    return result
+
+
+def _summary(mode: str, started: float, warm_seconds: float, tokens: int, latencies: List[float]) -> Dict[str, Any]:
+    seconds = time.monotonic() - started
+    ordered = sorted(latencies)
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "tokens": tokens,
+        "seconds": round(seconds, 2),
+        "tokens_per_second": round(tokens / seconds, 1) if seconds else 0.0,
+        "ttft_p50": round(statistics.median(ordered), 3) if ordered else None,
+        "ttft_p95": round(ordered[int(0.95 * (len(ordered) - 1))], 3) if ordered else None,
+        "warm_seconds": round(warm_seconds, 2),
+    }
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Ollama warm pool against the cold serial path")
+    parser.add_argument("--host", help="benchmark a real Ollama server instead of the stub")
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--prompts", type=int, default=3, help="prompts per session")
+    parser.add_argument("--parallel", type=int, default=4, help="server slots (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--tokens", type=int, default=32, help="stub: tokens per answer")
+    parser.add_argument("--load-seconds", type=float, default=1.0)
+    parser.add_argument("--token-seconds", type=float, default=0.01)
+    parser.add_argument("--batch-overhead", type=float, default=0.15)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("baseline", "pool"):
+        server = None
+        host = args.host
+        if not host:  # a fresh, cold stub per mode
+            stub = StubOllama(args.load_seconds, args.token_seconds, args.batch_overhead, args.tokens, args.parallel)
+            server = stub.serve()
+            host = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            if mode == "baseline":
+                results.append(run_baseline(host, args.sessions, args.prompts))
+            else:
+                results.append(run_pool(host, args.sessions, args.prompts, args.parallel))
+        finally:
+            if server:
+                server.shutdown()
+
+    print(f"\n{'mode':<10}{'requests':>9}{'tokens':>8}{'seconds':>9}{'tok/s':>8}{'TTFT p50':>10}{'TTFT p95':>10}{'warm s':>8}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['requests']:>9}{r['tokens']:>8}{r['seconds']:>9}{r['tokens_per_second']:>8}"
+              f"{r['ttft_p50']:>10}{r['ttft_p95']:>10}{r['warm_seconds']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
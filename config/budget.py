@@ -0,0 +1,159 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config.prompt_cache import take_render
+
+# Defaults for one user request, shared by the router and every nested agent.
+MAX_LLM_CALLS = 8
+MAX_TOKENS = 20_000
+MAX_SECONDS = 90.0
+MAX_TOOL_CALLS = 10
+CHARS_PER_TOKEN = 4
+# Length of the tool output quoted in a partial answer.
+PARTIAL_ANSWER_CHARS = 1500
+
+
+class BudgetExceeded(Exception):
+    """Raised from a callback to stop an agent run that spent its budget."""
+
+
+# ------------------------- Budget -------------------------
+class Budget:
+    """
+    Hard per-request limits on LLM calls (one per ReAct iteration), tokens,
+    wall-clock time and tool calls. Enforced by BudgetCallback, which nested
+    agents inherit from the outer invoke(), so one budget covers the whole
+    request no matter how many agents it passes through.
+    """
+
+    def __init__(self, max_llm_calls: int = MAX_LLM_CALLS, max_tokens: int = MAX_TOKENS,
+                 max_seconds: float = MAX_SECONDS, max_tool_calls: int = MAX_TOOL_CALLS):
+        self.limits = {"llm_calls": max_llm_calls, "tokens": max_tokens,
+                       "seconds": max_seconds, "tool_calls": max_tool_calls}
+        self.used = {"llm_calls": 0, "tokens": 0, "tool_calls": 0}
+        self.started = time.monotonic()
+        self.observations: List[str] = []
+        # One entry per LLM call: cached vs uncached prompt tokens
+        self.prompt_calls: List[Dict[str, Any]] = []
+        self.exceeded: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def check(self, about_to: Optional[str] = None) -> None:
+        """Raise BudgetExceeded if a limit is spent (or would be by one more `about_to`)."""
+        if self.elapsed() > self.limits["seconds"]:
+            self.exceeded = f"time limit of {self.limits['seconds']}s"
+        elif self.used["tokens"] >= self.limits["tokens"]:
+            self.exceeded = f"token limit of {self.limits['tokens']}"
+        elif about_to and self.used[about_to] >= self.limits[about_to]:
+            self.exceeded = f"{about_to.replace('_', ' ')} limit of {self.limits[about_to]}"
+        if self.exceeded:
+            raise BudgetExceeded(f"Request budget exhausted: {self.exceeded}")
+
+    def usage(self) -> Dict[str, Any]:
+        used = dict(self.used, seconds=round(self.elapsed(), 3))
+        return {"used": used, "limits": self.limits, "exceeded": self.exceeded,
+                "prompt_cache": self.prompt_calls}
+
+    def partial_answer(self) -> str:
+        """Best answer available when the run was cut short: the latest tool result."""
+        note = f"Stopped early ({self.exceeded})."
+        if not self.observations:
+            return note + " No partial result was produced."
+        return f"{note} Best partial result:\n{self.observations[-1][:PARTIAL_ANSWER_CHARS]}"
+
+
+# ------------------------- LangChain Callback -------------------------
+def _tokens_from(response) -> Optional[int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    for generations in response.generations:
+        for g in generations:
+            meta = getattr(getattr(g, "message", None), "usage_metadata", None)
+            if meta and meta.get("total_tokens"):
+                return meta["total_tokens"]
+    return None
+
+
+def _cached_tokens_from(response) -> Optional[Dict[str, int]]:
+    """Provider-reported prompt cache use (OpenAI-style usage), if any."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    if usage.get("prompt_tokens") and details.get("cached_tokens") is not None:
+        return {"prompt": usage["prompt_tokens"], "cached": details["cached_tokens"]}
+    for generations in response.generations:
+        for g in generations:
+            meta = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+            cached = (meta.get("input_token_details") or {}).get("cache_read")
+            if meta.get("input_tokens") and cached is not None:
+                return {"prompt": meta["input_tokens"], "cached": cached}
+    return None
+
+
+class BudgetCallback(BaseCallbackHandler):
+    """Counts usage into a Budget and stops the run when it is spent."""
+
+    raise_error = True
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self._prompt_chars: Dict[Any, int] = {}
+        self._renders: Dict[Any, Dict[str, Any]] = {}
+
+    def _start_llm(self, run_id, chars: int) -> None:
+        self.budget.check("llm_calls")
+        self.budget.used["llm_calls"] += 1
+        self._prompt_chars[run_id] = chars
+        render = take_render()  # the prompt was rendered on this thread just before the call
+        if render:
+            self._renders[run_id] = render
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start_llm(run_id, sum(len(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start_llm(run_id, sum(len(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        tokens = _tokens_from(response)
+        if tokens is None:  # e.g. Ollama: estimate from text length
+            output = sum(len(g.text) for gens in response.generations for g in gens)
+            tokens = (self._prompt_chars.get(run_id, 0) + output) // CHARS_PER_TOKEN
+        self._prompt_chars.pop(run_id, None)
+        self.budget.used["tokens"] += tokens
+        render = self._renders.pop(run_id, None)
+        reported = _cached_tokens_from(response)
+        if reported:
+            render = {"agent": render["agent"] if render else None, "cached_tokens": reported["cached"],
+                      "uncached_tokens": reported["prompt"] - reported["cached"], "source": "provider"}
+        if render:
+            self.budget.prompt_calls.append(render)
+
+    def on_tool_start(self, serialized, input_str, **kwargs) -> None:
+        self.budget.check("tool_calls")
+        self.budget.used["tool_calls"] += 1
+
+    def on_tool_end(self, output, **kwargs) -> None:
+        text = str(getattr(output, "content", output))
+        # Sub-agent wrappers report their own errors as text; skip those
+        if text and "budget exhausted" not in text:
+            self.budget.observations.append(text)
+
+
+def run_with_budget(executor, inputs: Dict[str, Any], budget: Optional[Budget] = None) -> Dict[str, Any]:
+    """
+    invoke() `executor` under `budget` (a fresh default Budget if None).
+    Returns the executor's result plus "budget" usage; when a limit is hit
+    the output is the best partial answer instead of an exception.
+    """
+    budget = budget or Budget()
+    try:
+        result = executor.invoke(inputs, config={"callbacks": [BudgetCallback(budget)]})
+    except BudgetExceeded:
+        result = {**inputs, "output": budget.partial_answer()}
+    result["budget"] = budget.usage()
+    return result
@@ -0,0 +1,179 @@
+import atexit
+import re
+import sqlite3
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+DB_PATH = "erp.db"
+
+# Turns (user + assistant message pairs) kept verbatim per session.
+WINDOW_TURNS = 5
+# Token budget for the rolled-up summary of older turns.
+SUMMARY_TOKEN_BUDGET = 300
+# Token budget for one verbatim message in the window.
+MESSAGE_TOKEN_BUDGET = 200
+CHARS_PER_TOKEN = 4
+# Pending messages written to SQLite in one executemany().
+FLUSH_BATCH_SIZE = 20
+
+SUMMARY_SENDER = "summary"
+
+Turn = Tuple[str, str]  # (user message, assistant message)
+
+
+def _truncate(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def extractive_summary(previous: str, turn: Turn, token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Fold one turn into the running summary without an LLM call: keep the
+    question and the first sentence of the answer, and drop the oldest
+    entries once the summary exceeds its token budget.
+    """
+    user, assistant = turn
+    first_sentence = re.split(r"(?<=[.!?])\s", (assistant or "").strip(), maxsplit=1)[0]
+    entry = f"- Q: {_truncate(user, 40)} A: {_truncate(first_sentence, 60)}"
+    lines = [l for l in (previous or "").splitlines() if l] + [entry]
+    while len("\n".join(lines)) > token_budget * CHARS_PER_TOKEN and len(lines) > 1:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+# ------------------------- Conversation Memory -------------------------
+class ConversationMemory:
+    """
+    Bounded per-session chat history.
+
+    The last WINDOW_TURNS turns stay verbatim in RAM; older turns are folded
+    into a running summary by `summarizer(previous_summary, turn)`, so the
+    history handed to the prompt stays roughly constant in size. Messages and
+    summaries are persisted to the conversations/messages tables in batches.
+    """
+
+    def __init__(self, window_turns: int = WINDOW_TURNS,
+                 summarizer: Callable[[str, Turn], str] = extractive_summary):
+        self.window_turns = window_turns
+        self.summarizer = summarizer
+        self._windows: Dict[int, Deque[Turn]] = {}
+        self._summaries: Dict[int, str] = {}
+        self._pending: List[Tuple[int, str, str]] = []
+        # Re-entrant: _load() flushes while add_turn()/history() hold the lock
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    # ---------- sessions ----------
+    def start_session(self, user_id: Optional[int] = None) -> int:
+        """Create a conversations row and return its id."""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            cur = conn.execute(
+                "INSERT INTO conversations (user_id, started_at) VALUES (?, datetime('now'))", (user_id,)
+            )
+            conn.commit()
+            session_id = cur.lastrowid
+        finally:
+            conn.close()
+        with self._lock:
+            self._windows[session_id] = deque(maxlen=self.window_turns)
+            self._summaries[session_id] = ""
+        return session_id
+
+    def _load(self, session_id: int) -> None:
+        """Rebuild a session's window and summary from SQLite (e.g. after a restart)."""
+        self.flush()
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            row = conn.execute(
+                "SELECT content FROM messages WHERE conversation_id = ? AND sender = ? "
+                "ORDER BY id DESC LIMIT 1", (session_id, SUMMARY_SENDER)
+            ).fetchone()
+            # Every roll-up happens with a full window, so the latest summary
+            # covers everything except the last window_turns turns.
+            messages = conn.execute(
+                "SELECT sender, content FROM messages WHERE conversation_id = ? "
+                "AND sender IN ('user', 'assistant') ORDER BY id DESC LIMIT ?",
+                (session_id, 2 * self.window_turns)
+            ).fetchall()[::-1]
+        finally:
+            conn.close()
+
+        window: Deque[Turn] = deque(maxlen=self.window_turns)
+        pending_user = None
+        for sender, content in messages:
+            if sender == "user":
+                pending_user = content
+            elif pending_user is not None:
+                window.append((pending_user, content))
+                pending_user = None
+        summary = row[0] if row else ""
+        self._windows[session_id] = window
+        self._summaries[session_id] = summary
+
+    # ---------- writes ----------
+    def add_turn(self, session_id: int, user_message: str, assistant_message: str) -> None:
+        """Record one exchange, rolling the oldest window turn into the summary if full."""
+        with self._lock:
+            if session_id not in self._windows:
+                self._load(session_id)
+            window = self._windows[session_id]
+            if len(window) == self.window_turns:
+                summary = self.summarizer(self._summaries[session_id], window[0])
+                self._summaries[session_id] = summary
+                self._pending.append((session_id, SUMMARY_SENDER, summary))
+            window.append((user_message, assistant_message))
+            self._pending.append((session_id, "user", user_message))
+            self._pending.append((session_id, "assistant", assistant_message))
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Write pending messages to SQLite."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, sender, content, created_at) "
+                "VALUES (?, ?, ?, datetime('now'))", self._pending
+            )
+            conn.commit()
+            self._pending = []
+        finally:
+            conn.close()
+
+    # ---------- reads ----------
+    def history(self, session_id: Optional[int]) -> str:
+        """Summary plus recent turns, formatted for the {chat_history} prompt slot."""
+        if session_id is None:
+            return ""
+        with self._lock:
+            if session_id not in self._windows:
+                self._load(session_id)
+            summary = self._summaries.get(session_id, "")
+            window = list(self._windows.get(session_id, ()))
+        parts = []
+        if summary:
+            parts.append(f"Earlier in this conversation:\n{summary}")
+        for user, assistant in window:
+            parts.append(f"User: {_truncate(user, MESSAGE_TOKEN_BUDGET)}\n"
+                         f"Assistant: {_truncate(assistant, MESSAGE_TOKEN_BUDGET)}")
+        return "\n".join(parts)
+
+
+_memory: Optional[ConversationMemory] = None
+
+
+def get_memory() -> ConversationMemory:
+    """Return the process-wide conversation memory."""
+    global _memory
+    if _memory is None:
+        _memory = ConversationMemory()
+    return _memory
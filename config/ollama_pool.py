@@ -0,0 +1,251 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Models kept resident; the first one is the offline fallback model.
+OLLAMA_MODELS = [m.strip() for m in os.getenv("OLLAMA_MODELS", "qwen3:0.6b").split(",") if m.strip()]
+# How long Ollama keeps a model loaded after its last request ("-1" = forever).
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Set OLLAMA_WARM=0 to skip loading the models when the process starts.
+WARM_AT_STARTUP = os.getenv("OLLAMA_WARM", "1") != "0"
+# Requests arriving within this window are dispatched together...
+BATCH_WINDOW_SECONDS = 0.01
+MAX_BATCH = 8
+# ...onto this many concurrent streams; match the server's OLLAMA_NUM_PARALLEL.
+MAX_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+REQUEST_TIMEOUT_SECONDS = 120.0
+WARM_TIMEOUT_SECONDS = 300.0
+
+_DONE = object()
+
+
+# ------------------------- Completions -------------------------
+class Completion:
+    """One submitted prompt. stream() yields text as it is generated; result() waits for all of it."""
+
+    def __init__(self):
+        self._chunks: "queue.Queue[Any]" = queue.Queue()
+        self._parts: List[str] = []
+        self._done = threading.Event()
+        self.error: Optional[str] = None
+        self.stats: Dict[str, Any] = {}
+        self.submitted_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+
+    def _push(self, text: str) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self._parts.append(text)
+        self._chunks.put(text)
+
+    def _finish(self, error: Optional[str] = None, stats: Optional[Dict[str, Any]] = None) -> None:
+        self.error, self.stats = error, stats or {}
+        self._done.set()
+        self._chunks.put(_DONE)
+
+    def stream(self, timeout: float = REQUEST_TIMEOUT_SECONDS) -> Iterator[str]:
+        while True:
+            try:
+                item = self._chunks.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"Ollama produced no output for {timeout}s")
+            if item is _DONE:
+                break
+            yield item
+        if self.error:
+            raise RuntimeError(f"Ollama request failed: {self.error}")
+
+    def result(self, timeout: float = REQUEST_TIMEOUT_SECONDS) -> str:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Ollama did not finish within {timeout}s")
+        if self.error:
+            raise RuntimeError(f"Ollama request failed: {self.error}")
+        return "".join(self._parts)
+
+
+# ------------------------- Pool -------------------------
+class OllamaPool:
+    """
+    Shared front end for a local Ollama server.
+
+    - Keeps models resident: every request carries keep_alive, and warm()
+      loads the models up front so the first user request does not pay the load.
+    - Micro-batches: requests from concurrent sessions that arrive within
+      BATCH_WINDOW_SECONDS are sent together on up to MAX_PARALLEL streams,
+      so the server decodes them in one batch instead of one prompt at a time.
+      Identical deterministic requests (temperature 0 or a fixed seed) in a
+      batch share one upstream generation; sampled ones each get their own.
+    - Streams each response back to its own caller as tokens arrive.
+    """
+
+    def __init__(self, host: str = OLLAMA_HOST, keep_alive: str = KEEP_ALIVE,
+                 window: float = BATCH_WINDOW_SECONDS, max_batch: int = MAX_BATCH, parallel: int = MAX_PARALLEL):
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._workers = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="ollama")
+        self._dispatcher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"requests": 0, "upstream": 0, "batches": 0, "coalesced": 0, "errors": 0}
+        self.warmed: Dict[str, Any] = {}
+
+    def _session(self) -> requests.Session:
+        # One keep-alive HTTP connection per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    # ---- warm-up ----
+    def warm(self, models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Load `models` (default OLLAMA_MODELS) and pin them for keep_alive. Returns seconds or error per model."""
+        for model in models or OLLAMA_MODELS:
+            started = time.monotonic()
+            try:
+                # A request without a prompt only loads the model
+                response = self._session().post(f"{self.host}/api/generate", timeout=WARM_TIMEOUT_SECONDS,
+                                                json={"model": model, "keep_alive": self.keep_alive})
+                response.raise_for_status()
+                self.warmed[model] = round(time.monotonic() - started, 3)
+            except Exception as e:
+                self.warmed[model] = {"error": str(e)}
+        return dict(self.warmed)
+
+    def warm_async(self, models: Optional[List[str]] = None) -> threading.Thread:
+        thread = threading.Thread(target=self.warm, args=(models,), name="ollama-warm", daemon=True)
+        thread.start()
+        return thread
+
+    # ---- submission ----
+    def submit(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+               stop: Optional[List[str]] = None) -> Completion:
+        options = dict(options or {})
+        if stop:
+            options["stop"] = list(stop)
+        payload = {"model": model or OLLAMA_MODELS[0], "prompt": prompt, "stream": True,
+                   "keep_alive": self.keep_alive, "options": options}
+        completion = Completion()
+        with self._lock:
+            self._stats["requests"] += 1
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="ollama-batcher", daemon=True)
+                self._dispatcher.start()
+        self._queue.put((payload, completion))
+        return completion
+
+    def complete(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                 stop: Optional[List[str]] = None) -> str:
+        return self.submit(prompt, model, options, stop).result()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups: Dict[Any, tuple] = {}
+            for payload, completion in batch:
+                options = payload["options"]
+                deterministic = options.get("temperature") == 0 or options.get("seed") is not None
+                key = json.dumps(payload, sort_keys=True) if deterministic else id(completion)
+                groups.setdefault(key, (payload, []))[1].append(completion)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["upstream"] += len(groups)
+                self._stats["coalesced"] += len(batch) - len(groups)
+            for payload, completions in groups.values():
+                self._workers.submit(self._run, payload, completions)
+
+    def _run(self, payload: Dict[str, Any], completions: List[Completion]) -> None:
+        stats: Dict[str, Any] = {}
+        try:
+            with self._session().post(f"{self.host}/api/generate", json=payload, stream=True,
+                                      timeout=REQUEST_TIMEOUT_SECONDS) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if message.get("error"):
+                        raise RuntimeError(message["error"])
+                    if message.get("response"):
+                        for completion in completions:
+                            completion._push(message["response"])
+                    if message.get("done"):
+                        stats = {k: message.get(k) for k in
+                                 ("prompt_eval_count", "eval_count", "eval_duration", "load_duration")}
+                        break
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            for completion in completions:
+                completion._finish(error=str(e))
+            return
+        for completion in completions:
+            completion._finish(stats=stats)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, warmed=dict(self.warmed), host=self.host, keep_alive=self.keep_alive)
+
+
+_pool: Optional[OllamaPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ollama_pool() -> OllamaPool:
+    """The process-wide pool; models are warmed in the background on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool()
+            if WARM_AT_STARTUP:
+                _pool.warm_async()
+        return _pool
+
+
+# ------------------------- LangChain LLM -------------------------
+class OllamaPoolLLM(LLM):
+    """Text-completion LLM served through the shared OllamaPool (streaming supported)."""
+
+    model: str = OLLAMA_MODELS[0]
+    temperature: float = 0.3
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-pool"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        completion = get_ollama_pool().submit(prompt, self.model, {"temperature": self.temperature}, stop)
+        for text in completion.stream():
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompts.chat import (ChatPromptTemplate, HumanMessagePromptTemplate,
+                                         SystemMessagePromptTemplate)
+
+CHARS_PER_TOKEN = 4
+# Rendered static prefixes kept (one per agent and tool set in practice).
+MAX_PREFIXES = 64
+
+_prefixes: "OrderedDict[tuple, str]" = OrderedDict()
+# Last full prompt sent after each prefix, to estimate how much a prefix cache reuses.
+_last_prompt: Dict[str, str] = {}
+_totals: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+# ------------------------- Rendering -------------------------
+def _tokens(chars: int) -> int:
+    return chars // CHARS_PER_TOKEN
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n  # binary search on slice equality; much faster than a char loop
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _record(agent: str, prefix: str, messages: List[BaseMessage]) -> None:
+    text = "\n".join(str(m.content) for m in messages)
+    with _lock:
+        previous = _last_prompt.get(prefix, "")
+        _last_prompt[prefix] = text
+        cached = _common_prefix(previous, text)
+        totals = _totals.setdefault(agent, {"calls": 0, "cached_tokens": 0, "uncached_tokens": 0})
+        entry = {"agent": agent, "cached_tokens": _tokens(cached),
+                 "uncached_tokens": _tokens(len(text) - cached), "source": "estimate"}
+        totals["calls"] += 1
+        totals["cached_tokens"] += entry["cached_tokens"]
+        totals["uncached_tokens"] += entry["uncached_tokens"]
+    _local.pending = entry
+
+
+class CachedPrefixPrompt(ChatPromptTemplate):
+    """
+    Chat prompt whose system message is the static part (instructions, output
+    format, tool specs) and whose human message carries everything that
+    changes: per-question context, the input and the scratchpad. The system
+    message is rendered once per agent and tool set and reused byte for byte,
+    so provider prompt caches and Ollama's KV cache match the whole prefix on
+    every ReAct step.
+    """
+
+    agent: str = "agent"
+
+    def _static_prefix(self, kwargs: Dict[str, Any]) -> str:
+        template = self.messages[0]
+        values = tuple(str(kwargs[v]) for v in template.input_variables)
+        key = (self.agent, template.prompt.template, values)
+        with _lock:
+            prefix = _prefixes.get(key)
+            if prefix is not None:
+                _prefixes.move_to_end(key)
+                return prefix
+        prefix = template.format(**kwargs).content
+        with _lock:
+            _prefixes[key] = prefix
+            while len(_prefixes) > MAX_PREFIXES:
+                _last_prompt.pop(_prefixes.popitem(last=False)[1], None)
+        return prefix
+
+    def format_messages(self, **kwargs: Any) -> List[BaseMessage]:
+        kwargs = self._merge_partial_and_user_variables(**kwargs)
+        prefix = self._static_prefix(kwargs)
+        messages: List[BaseMessage] = [SystemMessage(content=prefix)]
+        for template in self.messages[1:]:
+            messages.extend(template.format_messages(**kwargs))
+        _record(self.agent, prefix, messages)
+        return messages
+
+    async def aformat_messages(self, **kwargs: Any) -> List[BaseMessage]:
+        return self.format_messages(**kwargs)
+
+
+def build_prompt(agent: str, static: str, dynamic: str, *after: Any, **partials: Any) -> CachedPrefixPrompt:
+    """
+    CachedPrefixPrompt for `agent`. `static` may only use variables that stay
+    fixed for the agent's lifetime ({tools}, {tool_names}); everything else,
+    including {agent_scratchpad}, belongs in `dynamic` or in the message
+    templates passed as `after` (e.g. a scratchpad MessagesPlaceholder).
+    """
+    prompt = CachedPrefixPrompt(
+        messages=[SystemMessagePromptTemplate.from_template(static),
+                  HumanMessagePromptTemplate.from_template(dynamic), *after],
+        agent=agent,
+    )
+    return prompt.partial(**partials) if partials else prompt
+
+
+# ------------------------- Reporting -------------------------
+def take_render() -> Optional[Dict[str, Any]]:
+    """The cache estimate for the prompt this thread rendered last (cleared on read)."""
+    return _local.__dict__.pop("pending", None)
+
+
+def prompt_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Estimated cached and uncached prompt tokens per agent since start-up."""
+    with _lock:
+        return {agent: dict(totals) for agent, totals in _totals.items()}
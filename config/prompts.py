@@ -1,16 +1,16 @@
-from langchain.prompts.chat import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain.prompts.chat import MessagesPlaceholder
+from config.schema import schema_digest
+from config.prompt_cache import build_prompt
+
+# Each ReAct prompt is static instructions, then the tool specs (fixed per
+# agent), then the dynamic part (context, input, scratchpad) in the human
+# message, so the rendered prefix is identical on every step and cacheable.
 
 # ------------------- Sales Agent Prompt -------------------
 def get_sales_prompt():
     SALES_AGENT_SYSTEM = """
 You are a Sales & CRM Agent. You handle customers, leads, orders, and support tickets.
 
-TOOLS AVAILABLE:
-{tools}
-
-TOOL NAMES:
-{tool_names}
-
 OUTPUT FORMAT:
 You must format your response as follows:
 Thought: Your reasoning for the next step.
@@ -21,24 +21,21 @@ Action:
   "action_input": "input to the tool"
 }}
 Always use the tools appropriately.
-Use {agent_scratchpad} for reasoning steps.
+Your reasoning steps so far follow the user's request.
 Think step by step before generating actions.
-"""
-    return ChatPromptTemplate.from_messages([
-SystemMessagePromptTemplate.from_template(SALES_AGENT_SYSTEM),
-HumanMessagePromptTemplate.from_template("{input}")
-])
-
-#------------------- Analytics Agent Prompt -------------------
-def get_analytics_prompt():
-    ANALYTICS_AGENT_SYSTEM = """
-You are an Analytics Agent. You provide insights, KPIs, and reports on sales, customers, and products.
 
 TOOLS AVAILABLE:
 {tools}
 
 TOOL NAMES:
 {tool_names}
+"""
+    return build_prompt("sales", SALES_AGENT_SYSTEM, "{input}\n\n{agent_scratchpad}")
+
+#------------------- Analytics Agent Prompt -------------------
+def get_analytics_prompt():
+    ANALYTICS_AGENT_SYSTEM = """
+You are an Analytics Agent. You provide insights, KPIs, and reports on sales, customers, and products.
 
 OUTPUT FORMAT:
 You must format your response as follows:
@@ -52,13 +49,26 @@ Copy code
   "action_input": "input to the tool"
 }}
 Always use the tools appropriately.
-Use {agent_scratchpad} for reasoning steps.
+Only use the tables and columns of the DATABASE SCHEMA given with the request in SQL.
+Results that come with a snapshot notice must be reported with the snapshot time.
+Your reasoning steps so far follow the user's request.
 Think step by step before generating actions.
+
+TOOLS AVAILABLE:
+{tools}
+
+TOOL NAMES:
+{tool_names}
 """
-    return ChatPromptTemplate.from_messages([
-SystemMessagePromptTemplate.from_template(ANALYTICS_AGENT_SYSTEM),
-HumanMessagePromptTemplate.from_template("{input}")
-])
+    ANALYTICS_AGENT_REQUEST = """DATABASE SCHEMA (only use these tables and columns in SQL):
+{schema}
+
+{input}
+
+{agent_scratchpad}"""
+    # Callers may pass a question-specific "schema" input; otherwise the full digest is used
+    return build_prompt("analytics", ANALYTICS_AGENT_SYSTEM, ANALYTICS_AGENT_REQUEST,
+                        schema=lambda: schema_digest())
 
 #------------------- Smart Router Agent Prompt -------------------
 def get_router_prompt():
@@ -71,21 +81,15 @@ RESPONSIBILITIES:
 3- Provide system information when requested.
 4- Handle general queries and provide guidance.
 
-TOOLS AVAILABLE:
-{tools}
-
-TOOL NAMES:
-{tool_names}
-
 IMPORTANT ROUTING LOGIC:
 
-For questions about customers, orders, leads, sales -> Use execute_with_sales_agent
+For questions about customers, orders, leads, sales -> Use excute_with_sales_agent
 
-For questions about finances, invoices, payments, money -> Use execute_with_finance_agent
+For questions about finances, invoices, payments, money -> Use excute_with_analytics_agent (there is no finance agent yet)
 
-For questions about products, stock, inventory, warehouse -> Use execute_with_inventory_agent
+For questions about products, stock, inventory, warehouse -> Use excute_with_analytics_agent (there is no inventory agent yet)
 
-For questions about reports, analytics, insights, trends -> Use execute_with_analytics_agent
+For questions about reports, analytics, insights, trends -> Use excute_with_analytics_agent
 
 For general system questions -> Use get_system_info
 
@@ -103,10 +107,105 @@ Copy code
   "action_input": "input to the tool_or_agent"
 }}
 Always try to automatically route and execute the request rather than just providing guidance.
-Use {agent_scratchpad} for reasoning steps.
+Use the conversation history given with the request to resolve follow-up questions.
+Your reasoning steps so far follow the user's request.
 Think step by step before generating actions.
+
+TOOLS AVAILABLE:
+{tools}
+
+TOOL NAMES:
+{tool_names}
 """
-    return ChatPromptTemplate.from_messages([
-SystemMessagePromptTemplate.from_template(ROUTER_AGENT_SYSTEM),
-HumanMessagePromptTemplate.from_template("{input}")
-])
\ No newline at end of file
+    ROUTER_AGENT_REQUEST = """CONVERSATION HISTORY:
+{chat_history}
+
+{input}
+
+{agent_scratchpad}"""
+    return build_prompt("router", ROUTER_AGENT_SYSTEM, ROUTER_AGENT_REQUEST, chat_history="")
+#------------------- Flat Router Prompt -------------------
+def get_flat_router_prompt():
+    FLAT_ROUTER_SYSTEM = """
+You are the Smart Router Agent. The request has already been routed to one domain, and you call that domain's tools yourself.
+
+RESPONSIBILITIES:
+1- Answer the request with the domain tools listed below, usually in a single call.
+2- Use the excute_with_sales_agent or excute_with_analytics_agent tool only for multi-step work the direct tools cannot do (e.g. custom SQL or chained lookups).
+3- Use get_system_info for questions about the system itself.
+
+OUTPUT FORMAT:
+You must format your response as follows:
+Thought: Your reasoning for the next step.
+Action:
+
+json
+Copy code
+{{
+  "action": "tool_name",
+  "action_input": "input to the tool"
+}}
+Use the conversation history given with the request to resolve follow-up questions.
+Your reasoning steps so far follow the user's request.
+Think step by step before generating actions.
+
+TOOLS AVAILABLE:
+{tools}
+
+TOOL NAMES:
+{tool_names}
+"""
+    FLAT_ROUTER_REQUEST = """CONVERSATION HISTORY:
+{chat_history}
+
+{input}
+
+{agent_scratchpad}"""
+    return build_prompt("flat_router", FLAT_ROUTER_SYSTEM, FLAT_ROUTER_REQUEST, chat_history="")
+#------------------- Tool-Calling Agent Prompts -------------------
+# Native function calling needs no Thought/Action format: the tool schemas
+# travel with the request and the model answers with structured tool calls.
+# As above, per-request context goes in the human message, after the static system prompt.
+TOOL_CALLING_SYSTEM = {
+    "sales": """
+You are a Sales & CRM Agent. You handle customers, leads, orders, and support tickets.
+Call the tools to look up or change data; never invent records.
+When you have enough information, answer the user directly and concisely.
+""",
+    "analytics": """
+You are an Analytics Agent. You provide insights, KPIs, and reports on sales, customers, and products.
+Only use the tables and columns of the DATABASE SCHEMA given with the request in SQL.
+Prefer the report tools and saved reports; write SQL with run_custom_query only when they do not cover the question.
+Figures marked approximate must be reported as approximate, with their error bounds.
+Results that come with a snapshot notice must be reported with the snapshot time.
+When you have enough information, answer the user directly and concisely.
+""",
+    "router": """
+You are the Smart Router Agent, an intelligent coordinator that automatically routes requests to specialized agents.
+Use the conversation history given with the request to resolve follow-up questions.
+Call the tool that fits the request and return its result to the user.
+Always try to execute the request rather than just providing guidance.
+""",
+    "flat_router": """
+You are the Smart Router Agent. The request has already been routed to one domain, and you call that domain's tools yourself.
+Answer with the direct domain tools, usually in a single call; use the excute_with_sales_agent or excute_with_analytics_agent tool only for multi-step work they cannot do.
+Use the conversation history given with the request to resolve follow-up questions.
+""",
+}
+TOOL_CALLING_REQUEST = {
+    "sales": "{input}",
+    "analytics": "DATABASE SCHEMA (only use these tables and columns in SQL):\n{schema}\n\n{input}",
+    "router": "CONVERSATION HISTORY:\n{chat_history}\n\n{input}",
+    "flat_router": "CONVERSATION HISTORY:\n{chat_history}\n\n{input}",
+}
+
+
+def get_tool_calling_prompt(agent: str):
+    """Prompt for create_tool_calling_agent; `agent` is "sales", "analytics", "router" or "flat_router"."""
+    prompt = build_prompt(agent, TOOL_CALLING_SYSTEM[agent], TOOL_CALLING_REQUEST[agent],
+                          MessagesPlaceholder("agent_scratchpad"))
+    if agent == "analytics":
+        return prompt.partial(schema=lambda: schema_digest())
+    if agent in ("router", "flat_router"):
+        return prompt.partial(chat_history="")
+    return prompt
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# (requests per second, burst) allowed per LLM provider
+BACKEND_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "openai": (5.0, 10),
+    "gemini": (2.0, 4),
+    # Local server; config.ollama_pool batches concurrent calls, so let them through together
+    "ollama": (8.0, 8),
+}
+DEFAULT_RATE_LIMIT = (2.0, 4)
+# Adaptive limits: halve the rate on a throttling response, creep back up on success.
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.1
+MIN_RATE = 0.1
+
+
+# ------------------------- Token Bucket -------------------------
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` if available and return 0, else return the seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until `tokens` are available. Returns False if `timeout` runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def throttle(self) -> None:
+        """The provider pushed back (e.g. HTTP 429): slow down."""
+        with self._lock:
+            self._refill()
+            self.rate = max(MIN_RATE, self.rate * THROTTLE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+
+    def recover(self) -> None:
+        """A call succeeded: move the rate back towards its configured maximum."""
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + RECOVERY_STEP)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(backend: str) -> TokenBucket:
+    """Process-wide bucket for one LLM provider (e.g. "openai")."""
+    with _buckets_lock:
+        if backend not in _buckets:
+            _buckets[backend] = TokenBucket(*BACKEND_RATE_LIMITS.get(backend, DEFAULT_RATE_LIMIT))
+        return _buckets[backend]
+
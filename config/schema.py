@@ -0,0 +1,179 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DB_PATH = "erp.db"
+
+# How often the cached schema re-checks PRAGMA schema_version.
+SCHEMA_CHECK_INTERVAL_SECONDS = 5.0
+# Text columns with at most this many distinct values get them listed in the digest.
+MAX_SAMPLE_VALUES = 8
+SAMPLE_SCAN_ROWS = 1000
+# Rough chars-per-token used to keep the digest inside its token budget.
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 600
+# Business tables listed first in the full digest, which is also the fallback
+# when no table looks relevant to a question ("How much did we make last month?").
+CORE_TABLES = ("orders", "order_items", "customers", "products", "invoices", "payments",
+               "leads", "stock", "suppliers", "purchase_orders", "tickets")
+# Bookkeeping tables never worth prompt space (change feed, full-text index shadows).
+DIGEST_EXCLUDE = re.compile(r"^change_(log|cursors)$|_fts(_\w+)?$")
+# A table linked by foreign key to a relevant table scores this share of its score.
+NEIGHBOR_WEIGHT = 0.5
+
+_cache: Dict[str, Any] = {"version": None, "tables": {}, "checked_at": 0.0}
+_lock = threading.Lock()
+
+
+# ------------------------- Introspection -------------------------
+def _introspect(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    tables = {}
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name;"
+    )]
+    for table in names:
+        columns = [
+            {"name": r[1], "type": r[2] or "", "notnull": bool(r[3]), "pk": bool(r[5])}
+            for r in conn.execute(f'PRAGMA table_info("{table}");')
+        ]
+        fks = {r[3]: (r[2], r[4]) for r in conn.execute(f'PRAGMA foreign_key_list("{table}");')}
+        samples = {}
+        for col in columns:
+            if "TEXT" not in col["type"].upper() or col["pk"]:
+                continue
+            values = [r[0] for r in conn.execute(
+                f'SELECT DISTINCT "{col["name"]}" FROM (SELECT "{col["name"]}" FROM "{table}" '
+                f'LIMIT {SAMPLE_SCAN_ROWS}) WHERE "{col["name"]}" IS NOT NULL LIMIT {MAX_SAMPLE_VALUES + 1};'
+            )]
+            if 0 < len(values) <= MAX_SAMPLE_VALUES and all(len(str(v)) <= 24 for v in values):
+                samples[col["name"]] = values
+        tables[table] = {"columns": columns, "foreign_keys": fks, "samples": samples}
+    return tables
+
+
+def get_schema(conn: Optional[sqlite3.Connection] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Return {table: {"columns", "foreign_keys", "samples"}} for the ERP database.
+    Introspected once and reused until PRAGMA schema_version changes.
+    """
+    now = time.time()
+    if _cache["tables"] and now - _cache["checked_at"] < SCHEMA_CHECK_INTERVAL_SECONDS:
+        return _cache["tables"]
+
+    own_conn = conn is None
+    conn = conn or sqlite3.connect(DB_PATH)
+    try:
+        with _lock:
+            version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+            if version != _cache["version"]:
+                _cache["tables"] = _introspect(conn)
+                _cache["version"] = version
+            _cache["checked_at"] = now
+            return _cache["tables"]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def get_columns(table: str) -> List[str]:
+    """Column names of `table`, or [] if it does not exist."""
+    info = get_schema().get(table)
+    return [c["name"] for c in info["columns"]] if info else []
+
+
+# ------------------------- Digest -------------------------
+def _table_line(table: str, info: Dict[str, Any]) -> str:
+    parts = []
+    for col in info["columns"]:
+        text = col["name"]
+        if col["pk"]:
+            text += " PK"
+        if col["name"] in info["foreign_keys"]:
+            ref_table, ref_col = info["foreign_keys"][col["name"]]
+            text += f"->{ref_table}.{ref_col or 'id'}"
+        elif col["type"] and not col["pk"]:
+            text += f" {col['type'].split('(')[0]}"
+        if col["name"] in info["samples"]:
+            text += "[" + "|".join(str(v) for v in info["samples"][col["name"]]) + "]"
+        parts.append(text)
+    return f"{table}({', '.join(parts)})"
+
+
+def _relevance(question: str, table: str, info: Dict[str, Any]) -> float:
+    words = set(re.findall(r"[a-z]+", question.lower()))
+    stems = {w.rstrip("s") for w in words}
+    score = 0.0
+    for token in table.lower().split("_"):
+        if token in words or token.rstrip("s") in stems:
+            score += 3.0
+    for col in info["columns"]:
+        for token in col["name"].lower().split("_"):
+            if len(token) > 2 and (token in words or token.rstrip("s") in stems):
+                score += 1.0
+    for values in info["samples"].values():
+        if any(str(v).lower() in words for v in values):
+            score += 1.0
+    return score
+
+
+def _default_order(tables: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Core tables first, then the rest by how many tables reference them."""
+    referenced: Dict[str, int] = {}
+    for info in tables.values():
+        for ref_table, _ in info["foreign_keys"].values():
+            referenced[ref_table] = referenced.get(ref_table, 0) + 1
+    core = [t for t in CORE_TABLES if t in tables]
+    rest = sorted((t for t in tables if t not in core), key=lambda t: (-referenced.get(t, 0), t))
+    return core + rest
+
+
+def _ranked_for(question: str, tables: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Tables relevant to `question`, most relevant first. Tables linked to a
+    relevant one by foreign key, in either direction, inherit part of its
+    score, so "top selling products" also brings order_items and orders.
+    """
+    own = {t: _relevance(question, t, i) for t, i in tables.items()}
+    scores = dict(own)
+    for t, info in tables.items():
+        for ref_table, _ in info["foreign_keys"].values():
+            if ref_table not in tables:
+                continue
+            scores[t] = max(scores[t], own[t] + NEIGHBOR_WEIGHT * own[ref_table])  # t references a relevant table
+            scores[ref_table] = max(scores[ref_table], own[ref_table] + NEIGHBOR_WEIGHT * own[t])
+    # Second hop through the link tables (products <- order_items -> orders)
+    for t, info in tables.items():
+        for ref_table, _ in info["foreign_keys"].values():
+            if ref_table in tables and own[ref_table] == 0 and own[t] == 0:
+                scores[ref_table] = max(scores[ref_table], NEIGHBOR_WEIGHT * scores[t])
+    return [t for t in sorted(tables, key=lambda t: (-scores[t], t)) if scores[t] > 0]
+
+
+def schema_digest(question: Optional[str] = None, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """
+    Compact one-line-per-table schema description for prompts, with foreign
+    keys (col->table.col) and enumerated sample values (col[a|b|c]).
+    With a question, the relevant tables (and the tables linked to them) are
+    included, most relevant first; without one, or when nothing looks
+    relevant, the core business tables come first. Tables that do not fit the
+    token budget are named on a last line rather than dropped silently.
+    """
+    tables = {t: i for t, i in get_schema().items() if not DIGEST_EXCLUDE.search(t)}
+    ordered = _ranked_for(question, tables) if question else []
+    if not ordered:
+        ordered = _default_order(tables)
+
+    budget = token_budget * CHARS_PER_TOKEN
+    lines, omitted = [], []
+    for t in ordered:
+        line = _table_line(t, tables[t])
+        if len(line) > budget:
+            omitted.append(t)
+            continue
+        lines.append(line)
+        budget -= len(line) + 1
+    if omitted:
+        lines.append("-- over budget, not shown: " + ", ".join(omitted))
+    return "\n".join(lines)
@@ -0,0 +1,335 @@
+# -------------------- Headless Serving Mode ---------------------------
+# Local HTTP/JSON API in front of a pool of worker processes.
+# Each worker imports the agents once and keeps their executors warm.
+#
+#   python server.py --workers 4 --port 8000
+#   curl -X POST localhost:8000/v1/ask -d '{"question": "Show me customers", "agent": "sales"}'
+
+import argparse
+import importlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+DB_PATH = "erp.db"
+
+AGENT_MODULES = {
+    "router": "agents.router_agent",
+    "sales": "agents.sales_agent",
+    "analytics": "agents.analytics_agent",
+}
+
+# --------------------------
+# Limits
+# --------------------------
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# Jobs allowed to be queued or running at once; beyond this requests get 429.
+MAX_PENDING_JOBS = 64
+# How long a synchronous /v1/ask waits before returning the job id instead.
+SYNC_WAIT_SECONDS = 120
+# How long a drain waits for in-flight jobs on shutdown.
+DRAIN_TIMEOUT_SECONDS = 60
+# Finished job results kept for GET /v1/jobs/<id>.
+RESULT_TTL_SECONDS = 600
+# How often the broker checks that every worker process is still alive.
+WORKER_CHECK_SECONDS = 1.0
+
+
+# --------------------------
+# Worker Process
+# --------------------------
+def _worker_main(worker_id: int, jobs: mp.Queue, results: mp.Queue) -> None:
+    """Serve jobs until a None sentinel arrives. Executors are imported once and reused."""
+    # The parent drives shutdown (a drain), also when SIGTERM hits the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    executors: Dict[str, Any] = {}
+
+    from config.budget import run_with_budget
+    from config.memory import get_memory
+    from config.schema import schema_digest
+    from tools.report_library import save_pending_report, set_current_question
+    memory = get_memory()
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        started = time.time()
+        try:
+            agent = job["agent"]
+            if agent not in executors:
+                executors[agent] = importlib.import_module(AGENT_MODULES[agent]).executor
+            question = job["question"]
+            session_id = job.get("session_id")
+
+            inputs = {"input": question}
+            if agent == "router" and session_id is not None:
+                inputs["chat_history"] = memory.history(session_id)
+            if agent == "analytics":
+                inputs["schema"] = schema_digest(question)
+                set_current_question(question)
+
+            result = run_with_budget(executors[agent], inputs)
+            output = result.get("output", "No output generated.")
+            if agent == "analytics" and not result["budget"]["exceeded"] and "Agent stopped" not in output:
+                save_pending_report()  # only the query behind a final answer is kept
+            if session_id is not None:
+                memory.add_turn(session_id, question, output)
+            results.put({"id": job["id"], "status": "done", "output": output, "budget": result["budget"],
+                         "worker": worker_id, "seconds": round(time.time() - started, 3)})
+        except Exception as e:
+            results.put({"id": job["id"], "status": "error", "error": str(e),
+                         "worker": worker_id, "seconds": round(time.time() - started, 3)})
+    memory.flush()
+
+
+# --------------------------
+# Job Broker
+# --------------------------
+class JobBroker:
+    """
+    Owns the worker pool. Each worker has its own queue so jobs of one session
+    always land on the same worker (its conversation memory stays warm);
+    session-less jobs go round-robin. A worker that dies is replaced in the
+    same slot (so sessions stay pinned) and the jobs it held are failed.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self._ctx = mp.get_context("spawn")
+        self.results: mp.Queue = self._ctx.Queue()
+        self.queues = [self._ctx.Queue() for _ in range(workers)]
+        self.procs = [self._spawn(i, q) for i, q in enumerate(self.queues)]
+        self.max_pending = max_pending
+        self.draining = False
+        self.restarts = 0
+        self._pending: Dict[str, threading.Event] = {}
+        self._assigned: Dict[str, int] = {}  # pending job id -> worker slot
+        self._done: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._round_robin = itertools.cycle(range(workers))
+        threading.Thread(target=self._collect, daemon=True).start()
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _spawn(self, worker_id: int, jobs: mp.Queue):
+        proc = self._ctx.Process(target=_worker_main, args=(worker_id, jobs, self.results), daemon=True)
+        proc.start()
+        return proc
+
+    def _monitor(self) -> None:
+        """Replace dead workers and fail the jobs that were queued on or running in them."""
+        while True:
+            time.sleep(WORKER_CHECK_SECONDS)
+            for worker_id, proc in enumerate(list(self.procs)):
+                if proc.is_alive() or proc.exitcode is None:
+                    continue
+                # A fresh queue, so jobs the dead worker never picked up are not run twice
+                jobs = self._ctx.Queue()
+                replacement = None if self.draining else self._spawn(worker_id, jobs)
+                with self._lock:
+                    lost = [j for j, w in self._assigned.items() if w == worker_id]
+                    if replacement is not None:
+                        self.queues[worker_id], self.procs[worker_id] = jobs, replacement
+                        self.restarts += 1
+                for job_id in lost:
+                    self._finish({"id": job_id, "status": "error", "worker": worker_id,
+                                  "error": f"worker {worker_id} exited (code {proc.exitcode}) before finishing"})
+
+    def _finish(self, res: Dict[str, Any]) -> None:
+        res["finished_at"] = time.time()
+        with self._lock:
+            self._done[res["id"]] = res
+            self._assigned.pop(res["id"], None)
+            event = self._pending.pop(res["id"], None)
+        if event:
+            event.set()
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                res = self.results.get(timeout=1)
+            except queue.Empty:
+                self._expire()
+                continue
+            self._finish(res)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - RESULT_TTL_SECONDS
+        with self._lock:
+            for job_id in [j for j, r in self._done.items() if r["finished_at"] < cutoff]:
+                del self._done[job_id]
+
+    def submit(self, question: str, agent: str, session_id: Optional[int]) -> Optional[str]:
+        """Queue a job and return its id, or None when the broker is full or draining."""
+        with self._lock:
+            if self.draining or len(self._pending) >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            self._pending[job_id] = threading.Event()
+            worker = session_id % len(self.queues) if session_id is not None else next(self._round_robin)
+            self._assigned[job_id] = worker
+            # Under the lock, so a worker being replaced cannot swap the queue in between
+            self.queues[worker].put({"id": job_id, "question": question, "agent": agent, "session_id": session_id})
+        return job_id
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            event = self._pending.get(job_id)
+        if event:
+            event.wait(timeout)
+        with self._lock:
+            return self._done.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if job_id in self._done:
+                return self._done[job_id]
+            if job_id in self._pending:
+                return {"id": job_id, "status": "pending"}
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"workers": len(self.procs), "alive": sum(p.is_alive() for p in self.procs),
+                    "restarts": self.restarts, "pending": len(self._pending),
+                    "max_pending": self.max_pending, "draining": self.draining}
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """Stop accepting jobs, let in-flight ones finish, then stop the workers."""
+        with self._lock:
+            self.draining = True
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if not self._pending:
+                    break
+            time.sleep(0.2)
+        with self._lock:
+            queues, procs = list(self.queues), list(self.procs)
+        for q in queues:
+            q.put(None)
+        for p in procs:
+            p.join(max(0.0, deadline - time.time()) + 5)
+            if p.is_alive():
+                p.terminate()
+
+
+# --------------------------
+# HTTP API
+# --------------------------
+class ERPRequestHandler(BaseHTTPRequestHandler):
+    broker: JobBroker = None  # set by serve()
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            stats = self.broker.stats()
+            return self._send(503 if stats["draining"] else 200, stats)
+        if self.path.startswith("/v1/jobs/"):
+            res = self.broker.status(self.path.rsplit("/", 1)[-1])
+            return self._send(200 if res else 404, res or {"error": "unknown job"})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/v1/ask":
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            return self._send(400, {"error": "invalid JSON body"})
+        if not isinstance(body, dict):
+            return self._send(400, {"error": "the JSON body must be an object"})
+
+        question = body.get("question") or ""
+        agent = body.get("agent", "router")
+        if not isinstance(question, str) or not question.strip():
+            return self._send(400, {"error": "'question' is required"})
+        question = question.strip()
+        if not isinstance(agent, str) or agent not in AGENT_MODULES:
+            return self._send(400, {"error": f"unknown agent '{agent}', use one of {sorted(AGENT_MODULES)}"})
+
+        try:
+            session_id = int(body["session_id"]) if body.get("session_id") is not None else None
+        except (TypeError, ValueError):
+            return self._send(400, {"error": "'session_id' must be an integer"})
+        if session_id is not None and session_id < 1:
+            # Session ids are conversation row ids, so they start at 1
+            return self._send(400, {"error": "'session_id' must be a positive integer"})
+
+        job_id = self.broker.submit(question, agent, session_id)
+        if job_id is None:
+            status = 503 if self.broker.draining else 429
+            return self._send(status, {"error": "server busy, retry later"}, {"Retry-After": "2"})
+        if body.get("async"):
+            return self._send(202, {"id": job_id, "status": "pending"})
+
+        res = self.broker.wait(job_id, SYNC_WAIT_SECONDS)
+        if res is None:
+            return self._send(202, {"id": job_id, "status": "pending"})
+        self._send(200 if res["status"] == "done" else 500, res)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def enable_wal(db_path: str = DB_PATH) -> None:
+    """WAL lets the workers read concurrently while one of them writes."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL;")
+    finally:
+        conn.close()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = DEFAULT_WORKERS,
+          max_pending: int = MAX_PENDING_JOBS) -> None:
+    enable_wal()
+    broker = JobBroker(workers=workers, max_pending=max_pending)
+    ERPRequestHandler.broker = broker
+    httpd = ThreadingHTTPServer((host, port), ERPRequestHandler)
+    httpd.daemon_threads = True
+
+    def shutdown(signum, frame):
+        print("Draining in-flight jobs...")
+        threading.Thread(target=lambda: (broker.drain(), httpd.shutdown()), daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"ERP agent server on http://{host}:{port} with {workers} workers")
+    httpd.serve_forever()
+    httpd.server_close()
+    print("Server stopped.")
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-worker ERP agent server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_JOBS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_pending)
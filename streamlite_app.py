@@ -10,6 +10,7 @@ from agents.sales_agent import executor as sales_executor
 from agents.finance_agent import executor as finance_executor
 from agents.inventory_agent import executor as inventory_executor
 from agents.analytics_agent import executor as analytics_executor
+from config.budget import run_with_budget
 
 
 # Add current directory to path
@@ -121,7 +122,7 @@ st.markdown(
 # --------------------------
 def run_agent(agent_executor, query):
     try:
-        result = agent_executor.invoke({"user_input": query})
+        result = run_with_budget(agent_executor, {"input": query})
         return result.get("output", "No output generated.")
     except Exception as e:
         return f"❌ Error: {str(e)}"
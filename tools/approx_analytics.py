@@ -0,0 +1,396 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from langchain.tools import tool
+
+DB_PATH = "erp.db"
+SKETCH_PATH = os.path.join("data", "approx", "sketches.npz")
+
+# ANALYTICS_APPROX=off|on|auto; "auto" switches to sketches once order_items
+# has more than APPROX_MIN_ROWS rows.
+ANALYTICS_APPROX = os.getenv("ANALYTICS_APPROX", "off")
+APPROX_MIN_ROWS = 5_000_000
+# Rows read per chunk while folding new rows into the sketches.
+CHUNK_ROWS = 500_000
+# A process folds in new rows at most this often.
+REFRESH_SECONDS = 60.0
+
+HLL_PRECISION = 14          # 16384 registers, ~0.8% standard error
+TOP_K_CAPACITY = 256        # Space-Saving counters
+TDIGEST_DELTA = 200         # compression: more centroids, tighter quantiles
+RESERVOIR_SIZE = 10_000
+
+
+def _hash64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: well-mixed 64-bit hashes of integer ids."""
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+# ------------------------- Sketches -------------------------
+class HyperLogLog:
+    """Distinct count in 2^p one-byte registers; standard error 1.04 / sqrt(2^p)."""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, ids: np.ndarray) -> None:
+        if len(ids) == 0:
+            return
+        h = _hash64(ids)
+        index = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = h & np.uint64((1 << (64 - self.p)) - 1)
+        # rank = leading zeros in the remaining 64-p bits + 1
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)  # linear counting for small sets
+        return float(estimate)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+
+class SpaceSaving:
+    """
+    Weighted top-k heavy hitters with `capacity` counters. Each reported count
+    overestimates the true one by at most its `error`, itself at most total/capacity;
+    any item heavier than total/capacity is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[int, float] = {}
+        self.errors: Dict[int, float] = {}
+        self.total = 0.0
+
+    def add(self, items: np.ndarray, weights: np.ndarray) -> None:
+        # Pre-aggregate the chunk so each distinct item costs one update
+        frame = pd.DataFrame({"item": items, "weight": weights}).groupby("item")["weight"].sum()
+        for item, weight in frame.sort_values(ascending=False).items():
+            item, weight = int(item), float(weight)
+            self.total += weight
+            if item in self.counts:
+                self.counts[item] += weight
+            elif len(self.counts) < self.capacity:
+                self.counts[item], self.errors[item] = weight, 0.0
+            else:
+                victim = min(self.counts, key=self.counts.get)
+                floor = self.counts.pop(victim)
+                self.errors.pop(victim)
+                self.counts[item], self.errors[item] = floor + weight, floor
+
+    def top(self, n: int) -> List[Dict[str, float]]:
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [{"item": item, "count": count, "error": self.errors[item]} for item, count in ranked]
+
+    def to_arrays(self) -> np.ndarray:
+        return np.array([[k, self.counts[k], self.errors[k]] for k in self.counts], dtype=np.float64).reshape(-1, 3)
+
+    @classmethod
+    def from_arrays(cls, rows: np.ndarray, total: float, capacity: int = TOP_K_CAPACITY) -> "SpaceSaving":
+        sketch = cls(capacity)
+        for item, count, error in rows:
+            sketch.counts[int(item)], sketch.errors[int(item)] = float(count), float(error)
+        sketch.total = float(total)
+        return sketch
+
+
+class TDigest:
+    """
+    Merging t-digest: sorted centroids whose size shrinks towards the tails
+    (k1 scale function), so extreme percentiles stay accurate. Compression is
+    vectorized: points are bucketed by floor(k(q)).
+    """
+
+    def __init__(self, delta: int = TDIGEST_DELTA, means: Optional[np.ndarray] = None,
+                 weights: Optional[np.ndarray] = None):
+        self.delta = delta
+        self.means = means if means is not None else np.empty(0)
+        self.weights = weights if weights is not None else np.empty(0)
+
+    @property
+    def total(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values: np.ndarray) -> None:
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        means = np.concatenate([self.means, values.astype(np.float64)])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.delta / (2 * math.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k - k.min()).astype(np.int64)
+        sums = np.bincount(group, weights=means * weights)
+        counts = np.bincount(group, weights=weights)
+        used = counts > 0
+        self.means, self.weights = sums[used] / counts[used], counts[used]
+
+    def quantile(self, q: float) -> Dict[str, float]:
+        """Value at quantile q, with the range covered by the centroid it falls in."""
+        cumulative = np.cumsum(self.weights)
+        mids = cumulative - self.weights / 2
+        rank = q * cumulative[-1]
+        value = float(np.interp(rank, mids, self.means))
+        i = int(min(np.searchsorted(cumulative, rank), len(self.weights) - 1))
+        half = self.weights[i] / 2
+        low = float(np.interp(max(rank - half, 0), mids, self.means))
+        high = float(np.interp(min(rank + half, cumulative[-1]), mids, self.means))
+        return {"value": value, "low": low, "high": high, "rank_error": float(half / cumulative[-1])}
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream (Algorithm R, vectorized per chunk)."""
+
+    def __init__(self, size: int = RESERVOIR_SIZE, sample: Optional[np.ndarray] = None, seen: int = 0, seed: int = 7):
+        self.size = size
+        self.sample = sample if sample is not None else np.empty(0)
+        self.seen = seen
+        self._rng = np.random.default_rng(seed + seen)
+
+    def add(self, values: np.ndarray) -> None:
+        values = values.astype(np.float64)
+        room = self.size - len(self.sample)
+        if room > 0:
+            self.sample = np.concatenate([self.sample, values[:room]])
+            self.seen += min(room, len(values))
+            values = values[room:]
+        if len(values) == 0:
+            return
+        positions = self.seen + np.arange(len(values))
+        slots = self._rng.integers(0, positions + 1)
+        keep = slots < self.size
+        self.sample[slots[keep]] = values[keep]  # later rows win, as in the sequential algorithm
+        self.seen += len(values)
+
+    def mean(self) -> Dict[str, float]:
+        """Sample mean with a 95% confidence half-width (finite-population corrected)."""
+        n = len(self.sample)
+        if n == 0:
+            return {"value": 0.0, "margin": 0.0}
+        fpc = math.sqrt(max(self.seen - n, 0) / (self.seen - 1)) if self.seen > 1 else 0.0
+        margin = 1.96 * float(self.sample.std(ddof=1) if n > 1 else 0.0) / math.sqrt(n) * fpc
+        return {"value": float(self.sample.mean()), "margin": margin}
+
+
+# ------------------------- Maintained Store -------------------------
+class ApproxStore:
+    """
+    Sketches over orders (distinct customers, order value percentiles and a
+    sample) and order_items (top products by units and revenue), folded in
+    incrementally by id watermark and saved to data/approx/. Like the feature
+    store, updates and deletes of existing rows need refresh(full=True).
+    """
+
+    def __init__(self, path: str = SKETCH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._refreshed = 0.0
+        self._reset()
+        if os.path.exists(path):
+            self._load()
+
+    def _reset(self) -> None:
+        self.customers = HyperLogLog()
+        self.order_values = TDigest()
+        self.order_sample = Reservoir()
+        self.product_units = SpaceSaving()
+        self.product_revenue = SpaceSaving()
+        self.order_count = 0
+        self.item_count = 0
+        self.watermarks = {"orders": 0, "order_items": 0}
+
+    def _load(self) -> None:
+        data = np.load(self.path)
+        self.customers = HyperLogLog(registers=data["hll"])
+        self.order_values = TDigest(means=data["td_means"], weights=data["td_weights"])
+        self.order_sample = Reservoir(sample=data["sample"], seen=int(data["counts"][0]))
+        self.product_units = SpaceSaving.from_arrays(data["units"], float(data["totals"][0]))
+        self.product_revenue = SpaceSaving.from_arrays(data["revenue"], float(data["totals"][1]))
+        self.order_count, self.item_count = int(data["counts"][0]), int(data["counts"][1])
+        self.watermarks = {"orders": int(data["watermarks"][0]), "order_items": int(data["watermarks"][1])}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, hll=self.customers.registers, td_means=self.order_values.means,
+                 td_weights=self.order_values.weights, sample=self.order_sample.sample,
+                 units=self.product_units.to_arrays(), revenue=self.product_revenue.to_arrays(),
+                 totals=np.array([self.product_units.total, self.product_revenue.total]),
+                 counts=np.array([self.order_count, self.item_count]),
+                 watermarks=np.array([self.watermarks["orders"], self.watermarks["order_items"]]))
+        os.replace(tmp, self.path)  # readers never see a half-written file
+
+    def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """Fold rows added since the last refresh into the sketches (all rows with `full`)."""
+        started = time.time()
+        with self._lock:
+            if full:
+                self._reset()
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                new_orders = new_items = 0
+                for chunk in pd.read_sql("SELECT id, customer_id, total FROM orders WHERE id > ? ORDER BY id",
+                                         conn, params=(self.watermarks["orders"],), chunksize=CHUNK_ROWS):
+                    if chunk.empty:
+                        continue
+                    self.customers.add(chunk["customer_id"].dropna().to_numpy(dtype=np.int64))
+                    totals = chunk["total"].to_numpy(dtype=np.float64)
+                    self.order_values.add(totals)
+                    self.order_sample.add(totals)
+                    self.order_count += len(chunk)
+                    self.watermarks["orders"] = int(chunk["id"].iloc[-1])
+                    new_orders += len(chunk)
+                for chunk in pd.read_sql("SELECT id, product_id, quantity, price FROM order_items WHERE id > ? "
+                                         "ORDER BY id", conn, params=(self.watermarks["order_items"],),
+                                         chunksize=CHUNK_ROWS):
+                    if chunk.empty:
+                        continue
+                    products = chunk["product_id"].to_numpy(dtype=np.int64)
+                    quantity = chunk["quantity"].to_numpy(dtype=np.float64)
+                    self.product_units.add(products, quantity)
+                    self.product_revenue.add(products, quantity * chunk["price"].to_numpy(dtype=np.float64))
+                    self.item_count += len(chunk)
+                    self.watermarks["order_items"] = int(chunk["id"].iloc[-1])
+                    new_items += len(chunk)
+            finally:
+                conn.close()
+            if new_orders or new_items or full:
+                self._save()
+            self._refreshed = time.time()
+        return {"new_orders": new_orders, "new_order_items": new_items, "seconds": round(time.time() - started, 3)}
+
+    def ensure_fresh(self) -> None:
+        if time.time() - self._refreshed >= REFRESH_SECONDS:
+            self.refresh()
+
+
+_store: Optional[ApproxStore] = None
+_store_lock = threading.Lock()
+
+
+def get_approx_store() -> ApproxStore:
+    """Process-wide sketch store, folded up to date at most every REFRESH_SECONDS."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ApproxStore()
+    _store.ensure_fresh()
+    return _store
+
+
+def use_approx(mode: Optional[str] = None) -> bool:
+    """Whether analytics should answer from sketches under ANALYTICS_APPROX."""
+    mode = (mode or ANALYTICS_APPROX).lower()
+    if mode == "on":
+        return True
+    if mode != "auto":
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        # MAX(id) is one index seek; COUNT(*) would scan
+        return (conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]) > APPROX_MIN_ROWS
+    finally:
+        conn.close()
+
+
+# ------------------------- Approximate Answers -------------------------
+def approx_top_products(n: int = 10) -> List[Dict[str, Any]]:
+    """Top products by units sold, in the shape of products.top_by_sales plus error bounds."""
+    store = get_approx_store()
+    top = store.product_units.top(n)
+    revenue = store.product_revenue
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        names = dict(conn.execute(
+            f"SELECT id, name FROM products WHERE id IN ({','.join('?' * len(top))})", [t["item"] for t in top]
+        ).fetchall()) if top else {}
+    finally:
+        conn.close()
+    return [{
+        "product_name": names.get(t["item"], f"product {t['item']}"),
+        "total_sold": round(t["count"]),
+        "total_sold_min": round(t["count"] - t["error"]),
+        "total_revenue": round(revenue.counts.get(t["item"], 0.0), 2),
+        "approximate": True,
+    } for t in top]
+
+
+def approx_order_summary() -> Dict[str, Any]:
+    """Distinct customers, order value percentiles and average order value, each with its error bound."""
+    store = get_approx_store()
+    distinct = store.customers.count()
+    summary = {
+        "orders": store.order_count,
+        "distinct_customers": round(distinct),
+        "distinct_customers_error": round(distinct * store.customers.relative_error * 2),  # ~95%
+        "approximate": True,
+    }
+    if store.order_values.total:
+        for label, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            estimate = store.order_values.quantile(q)
+            summary[f"order_value_{label}"] = round(estimate["value"], 2)
+            summary[f"order_value_{label}_range"] = [round(estimate["low"], 2), round(estimate["high"], 2)]
+        mean = store.order_sample.mean()
+        summary["average_order_value"] = round(mean["value"], 2)
+        summary["average_order_value_margin"] = round(mean["margin"], 2)
+    return summary
+
+
+def approx_report() -> str:
+    summary = approx_order_summary()
+    lines = [
+        "APPROXIMATE ANALYTICS (from maintained sketches; report figures as approximate)",
+        "========================",
+        f"Orders: {summary['orders']}",
+        f"Distinct customers: approximately {summary['distinct_customers']} "
+        f"(+/- {summary['distinct_customers_error']})",
+    ]
+    if "average_order_value" in summary:
+        lines.append(f"Average order value: approximately ${summary['average_order_value']:.2f} "
+                     f"(+/- ${summary['average_order_value_margin']:.2f}, 95%)")
+        for label in ("p50", "p90", "p99"):
+            low, high = summary[f"order_value_{label}_range"]
+            lines.append(f"Order value {label}: approximately ${summary[f'order_value_{label}']:.2f} "
+                         f"(between ${low:.2f} and ${high:.2f})")
+    lines.append("TOP 10 PRODUCTS BY UNITS SOLD:")
+    lines.extend(f"- {p['product_name']}: approximately {p['total_sold']} sold (at least {p['total_sold_min']}), "
+                 f"${p['total_revenue']:.2f}" for p in approx_top_products())
+    return "\n".join(lines)
+
+
+# ------------------------- Tools -------------------------
+@tool
+def get_approximate_analytics(request: str = "") -> dict:
+    """
+    Fast approximate sales metrics for very large data, answered from maintained sketches:
+    distinct customers, order value percentiles (p50/p90/p99), average order value and
+    top products by units sold, each with an error bound.
+    Use when exact analytics are too slow or the user asks for a quick estimate;
+    always say the figures are approximate.
+    """
+    try:
+        return {"summary": approx_order_summary(), "top_products": approx_top_products(), "report": approx_report()}
+    except Exception as e:
+        return {"error": str(e)}
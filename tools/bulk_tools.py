@@ -0,0 +1,416 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain.tools import tool
+
+DB_PATH = "erp.db"
+
+# Rows per executemany() call. Big enough to amortise the Python -> SQLite
+# round trip, small enough that a failing chunk is cheap to replay row by row.
+CHUNK_SIZE = 5000
+
+# Cap on the per-row errors returned to the agent, so a bad 50k-row file does
+# not flood the LLM context.
+MAX_REPORTED_ERRORS = 50
+
+RowsInput = Union[str, List[Dict[str, Any]]]
+
+
+# ------------------------- Connection -------------------------
+def get_bulk_connection() -> sqlite3.Connection:
+    """Open a connection tuned for large write batches (WAL, relaxed fsync)."""
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-65536;")
+    return conn
+
+
+# ------------------------- Migration -------------------------
+# Keys the bulk tools upsert on. Their UNIQUE indexes are a schema change, so
+# they are created by migrate_unique_indexes(), never as a side effect of a tool call:
+#   python -m tools.bulk_tools migrate
+UNIQUE_KEYS = {"customers": "email", "leads": "contact_email"}
+
+
+def _has_unique_index(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """True if a single-column UNIQUE index on `column` exists (ON CONFLICT can target it)."""
+    for _, name, unique, *_ in conn.execute(f"PRAGMA index_list({table});"):
+        if unique and [r[2] for r in conn.execute(f'PRAGMA index_info("{name}");')] == [column]:
+            return True
+    return False
+
+
+def migrate_unique_indexes() -> Dict[str, str]:
+    """
+    Create the UNIQUE indexes in UNIQUE_KEYS. Where existing duplicates block
+    one, a plain index is created instead (so the NOT EXISTS fallback stays
+    indexed) and the table is reported as "duplicates".
+    """
+    conn = sqlite3.connect(DB_PATH)
+    result = {}
+    try:
+        for table, column in UNIQUE_KEYS.items():
+            try:
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_{column} ON {table}({column});")
+                result[table] = "unique"
+            except sqlite3.IntegrityError:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column});")
+                result[table] = "duplicates"
+        conn.commit()
+    finally:
+        conn.close()
+    return result
+
+
+def migrate() -> Dict[str, Any]:
+    """
+    Run every schema migration the tools rely on. Request paths never run DDL;
+    they check for these objects and fall back or report the missing migration.
+    """
+    from tools.change_feed import migrate_change_feed
+    from tools.customer_search import migrate_customer_index
+    from tools.report_library import migrate_report_library
+    from tools.rollups import migrate_rollups
+    from tools.text_search import TEXT_INDEXES, migrate_text_index
+
+    result: Dict[str, Any] = {"unique_indexes": migrate_unique_indexes()}
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        result["saved_reports"] = migrate_report_library(conn)
+        result["change_feed"] = migrate_change_feed(conn)
+        result["customers_fts"] = migrate_customer_index(conn)
+        for source in TEXT_INDEXES:
+            result[f"{source}_fts"] = migrate_text_index(conn, source)
+        result["kpi_rollups"] = migrate_rollups(conn)
+    finally:
+        conn.close()
+    return result
+
+
+# ------------------------- Input Readers -------------------------
+def _iter_rows(rows: RowsInput) -> Iterator[Dict[str, Any]]:
+    """
+    Yield row dicts from a list, a JSON string, or a .csv/.jsonl/.json file path.
+    Files are streamed so a large import never sits in memory as a whole.
+    """
+    if isinstance(rows, list):
+        yield from rows
+        return
+
+    text = rows.strip()
+    if text.startswith("[") or text.startswith("{"):
+        data = json.loads(text)
+        yield from (data if isinstance(data, list) else [data])
+        return
+
+    if not os.path.exists(text):
+        raise FileNotFoundError(f"No such file: {text}")
+
+    ext = os.path.splitext(text)[1].lower()
+    with open(text, newline="", encoding="utf-8") as f:
+        if ext == ".csv":
+            yield from csv.DictReader(f)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == ".json":
+            data = json.load(f)
+            yield from (data if isinstance(data, list) else [data])
+        else:
+            raise ValueError(f"Unsupported file type '{ext}', use .csv, .jsonl or .json")
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ------------------------- Validators -------------------------
+# Each validator turns a raw row into the parameter tuple for its statement,
+# or raises ValueError with a message that ends up in the per-row report.
+def _clean(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _validate_customer(row: Dict[str, Any]) -> Tuple:
+    name = _clean(row.get("name"))
+    email = _clean(row.get("email"))
+    if not name:
+        raise ValueError("name is required")
+    if not email or "@" not in email:
+        raise ValueError(f"invalid email: {row.get('email')!r}")
+    phone = _clean(row.get("phone")) or "N/A"
+    return (name, email.lower(), phone)
+
+
+LEAD_STATUSES = {"new", "contacted", "qualified", "won", "lost"}
+
+def _validate_lead(row: Dict[str, Any]) -> Tuple:
+    """The status is passed twice: new leads default to "new", existing ones keep theirs when it is omitted."""
+    email = _clean(row.get("contact_email"))
+    if not email or "@" not in email:
+        raise ValueError(f"invalid contact_email: {row.get('contact_email')!r}")
+    status = _clean(row.get("status"))
+    status = status.lower() if status else None
+    if status is not None and status not in LEAD_STATUSES:
+        raise ValueError(f"invalid status {status!r}, expected one of {sorted(LEAD_STATUSES)}")
+    score = _clean(row.get("score"))
+    if score is not None:
+        score = float(score)
+        if not 0.0 <= score <= 1.0:
+            raise ValueError("score must be between 0 and 1")
+    return (_clean(row.get("customer_name")), email.lower(), _clean(row.get("message")), score, status, status)
+
+
+def _validate_movement(row: Dict[str, Any], product_ids: set) -> Tuple:
+    try:
+        product_id = int(row.get("product_id"))
+        change_qty = int(row.get("change_qty"))
+    except (TypeError, ValueError):
+        raise ValueError("product_id and change_qty must be integers")
+    if product_id not in product_ids:
+        raise ValueError(f"unknown product_id {product_id}")
+    if change_qty == 0:
+        raise ValueError("change_qty must not be 0")
+    ref_id = _clean(row.get("ref_id"))
+    return (product_id, change_qty, _clean(row.get("reason")) or "adjustment",
+            int(ref_id) if ref_id is not None else None)
+
+
+# ------------------------- Core Writer -------------------------
+def _write_chunk(conn: sqlite3.Connection, sql: str, chunk: List[Tuple[int, Tuple]],
+                 errors: List[Dict[str, Any]]) -> Tuple[List[Tuple], int]:
+    """
+    executemany() a validated chunk. If SQLite rejects it, replay the chunk row
+    by row inside a savepoint so only the offending rows are reported.
+    Returns the parameter tuples that executed and the number of rows they
+    actually changed; rows skipped by NOT EXISTS / ON CONFLICT DO NOTHING run
+    without error but change nothing.
+    """
+    params = [p for _, p in chunk]
+    conn.execute("SAVEPOINT bulk_chunk;")
+    try:
+        # rowcount sums sqlite3_changes() over the batch; unlike a total_changes
+        # delta it leaves out the rows the change-feed triggers write.
+        changed = conn.executemany(sql, params).rowcount
+        conn.execute("RELEASE bulk_chunk;")
+        return params, max(changed, 0)
+    except sqlite3.DatabaseError:
+        conn.execute("ROLLBACK TO bulk_chunk;")
+
+    written, changed = [], 0
+    for row_no, p in chunk:
+        try:
+            changed += max(conn.execute(sql, p).rowcount, 0)
+            written.append(p)
+        except sqlite3.DatabaseError as e:
+            errors.append({"row": row_no, "error": str(e)})
+    conn.execute("RELEASE bulk_chunk;")
+    return written, changed
+
+
+def bulk_write(rows: RowsInput, sql: str, validate, after_chunk=None,
+               conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    Validate `rows` and stream them through `sql` in CHUNK_SIZE batches inside a
+    single transaction. `after_chunk(conn, params)` runs after each chunk for
+    dependent writes (e.g. stock levels). Returns counts and per-row errors;
+    "accepted" counts rows actually written, "skipped" the valid rows the
+    statement left alone (duplicates).
+    """
+    own_conn = conn is None
+    conn = conn or get_bulk_connection()
+    errors: List[Dict[str, Any]] = []
+    received = executed = written = 0
+    started = time.perf_counter()
+
+    def validated() -> Iterator[Tuple[int, Tuple]]:
+        nonlocal received
+        for row_no, row in enumerate(_iter_rows(rows), start=1):
+            received += 1
+            try:
+                yield row_no, validate(row)
+            except (ValueError, TypeError, AttributeError) as e:
+                errors.append({"row": row_no, "error": str(e)})
+
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        for chunk in _chunks(validated(), CHUNK_SIZE):
+            params, changed = _write_chunk(conn, sql, chunk, errors)
+            executed += len(params)
+            written += changed
+            if after_chunk and params:
+                after_chunk(conn, params)
+        conn.execute("COMMIT;")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        return {"error": str(e), "received": received, "accepted": 0, "skipped": 0}
+    finally:
+        if own_conn:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "received": received,
+        "accepted": written,
+        "skipped": max(executed - written, 0),
+        "failed": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": int(received / elapsed) if elapsed > 0 else received,
+    }
+
+
+# ====================== Bulk Customer Tools =========================
+def _validate_customer_with_probe(row: Dict[str, Any]) -> Tuple:
+    name, email, phone = _validate_customer(row)
+    return (name, email, phone, email)
+
+
+def bulk_insert_customers(rows: RowsInput) -> Dict[str, Any]:
+    """Insert customers, skipping emails that already exist."""
+    conn = get_bulk_connection()
+    try:
+        if _has_unique_index(conn, "customers", "email"):
+            sql = ("INSERT INTO customers (name, email, phone, created_at) "
+                   "VALUES (?, ?, ?, datetime('now')) ON CONFLICT(email) DO NOTHING")
+            validate = _validate_customer
+        else:
+            # Without the migrated UNIQUE index (e.g. existing duplicate emails),
+            # skip known emails with a NOT EXISTS probe instead.
+            sql = ("INSERT INTO customers (name, email, phone, created_at) "
+                   "SELECT ?, ?, ?, datetime('now') "
+                   "WHERE NOT EXISTS (SELECT 1 FROM customers WHERE email = ?)")
+            validate = _validate_customer_with_probe
+        return bulk_write(rows, sql, validate, conn=conn)
+    finally:
+        conn.close()
+
+
+@tool
+def create_customers_bulk(rows: str) -> Dict[str, Any]:
+    """
+    Create many customers in one transaction.
+    Input: a JSON list of {"name", "email", "phone"} objects, or a path to a
+    .csv/.jsonl/.json file with those columns. Existing emails are skipped.
+    Returns counts and per-row validation errors.
+    """
+    try:
+        return bulk_insert_customers(rows)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ====================== Bulk Lead Tools =========================
+def bulk_upsert_leads(rows: RowsInput) -> Dict[str, Any]:
+    """Insert leads, updating the existing lead when contact_email already exists."""
+    conn = get_bulk_connection()
+    try:
+        if not _has_unique_index(conn, "leads", "contact_email"):
+            return {"error": "leads.contact_email has no UNIQUE index; run `python -m tools.bulk_tools migrate` "
+                             "(deduplicate the leads first if it reports duplicates)"}
+        # excluded.status is already defaulted to 'new', so the raw status (last parameter) decides
+        sql = """
+        INSERT INTO leads (customer_name, contact_email, message, score, status, created_at)
+        VALUES (?, ?, ?, ?, COALESCE(?, 'new'), datetime('now'))
+        ON CONFLICT(contact_email) DO UPDATE SET
+            customer_name = COALESCE(excluded.customer_name, leads.customer_name),
+            message       = COALESCE(excluded.message, leads.message),
+            score         = COALESCE(excluded.score, leads.score),
+            status        = COALESCE(?, leads.status)
+        """
+        return bulk_write(rows, sql, _validate_lead, conn=conn)
+    finally:
+        conn.close()
+
+
+@tool
+def upsert_leads(rows: str) -> Dict[str, Any]:
+    """
+    Insert or update many leads in one transaction, keyed by contact_email.
+    Input: a JSON list of {"customer_name", "contact_email", "message", "score", "status"}
+    objects, or a path to a .csv/.jsonl/.json file with those columns.
+    Returns counts and per-row validation errors.
+    """
+    try:
+        return bulk_upsert_leads(rows)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ====================== Bulk Stock Tools =========================
+def _apply_stock_deltas(conn: sqlite3.Connection, params: List[Tuple]) -> None:
+    """Roll a chunk of movements into stock.qty_on_hand with one UPDATE per product."""
+    deltas: Dict[int, int] = {}
+    for product_id, change_qty, _, _ in params:
+        deltas[product_id] = deltas.get(product_id, 0) + change_qty
+    conn.executemany(
+        "INSERT INTO stock (product_id, qty_on_hand) SELECT ?, 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM stock WHERE product_id = ?)",
+        [(pid, pid) for pid in deltas]
+    )
+    conn.executemany(
+        "UPDATE stock SET qty_on_hand = qty_on_hand + ? WHERE product_id = ?",
+        [(delta, pid) for pid, delta in deltas.items()]
+    )
+
+
+def bulk_record_stock_movements(rows: RowsInput) -> Dict[str, Any]:
+    """Append stock movements and apply them to stock levels in the same transaction."""
+    conn = get_bulk_connection()
+    try:
+        product_ids = {r[0] for r in conn.execute("SELECT id FROM products;")}
+        sql = ("INSERT INTO stock_movements (product_id, change_qty, reason, ref_id, created_at) "
+               "VALUES (?, ?, ?, ?, datetime('now'))")
+        return bulk_write(
+            rows, sql,
+            lambda row: _validate_movement(row, product_ids),
+            after_chunk=_apply_stock_deltas,
+            conn=conn
+        )
+    finally:
+        conn.close()
+
+
+@tool
+def record_stock_movements(rows: str) -> Dict[str, Any]:
+    """
+    Record many stock movements and update on-hand quantities in one transaction.
+    Input: a JSON list of {"product_id", "change_qty", "reason", "ref_id"} objects
+    (negative change_qty for outgoing stock), or a path to a .csv/.jsonl/.json file.
+    Returns counts and per-row validation errors.
+    """
+    try:
+        return bulk_record_stock_movements(rows)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+BULK_TOOLS = [create_customers_bulk, upsert_leads, record_stock_movements]
+INVENTORY_TOOLS = [record_stock_movements]
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["migrate"]:
+        print(migrate())
+    else:
+        print("usage: python -m tools.bulk_tools migrate")
@@ -0,0 +1,236 @@
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+DB_PATH = "erp.db"
+
+# ERP tables whose inserts, updates and deletes are captured.
+CDC_TABLES = (
+    "customers", "leads", "products", "orders", "order_items", "tickets",
+    "invoices", "invoice_lines", "payments", "payment_allocations",
+    "stock", "stock_movements", "suppliers", "purchase_orders", "po_items", "po_receipts",
+    "ledger_entries", "ledger_lines",
+)
+OPS = {"INSERT": "I", "UPDATE": "U", "DELETE": "D"}
+DEFAULT_BATCH_SIZE = 1000
+POLL_SECONDS = 1.0
+# Entries older than this are pruned even if a consumer never caught up.
+RETENTION_DAYS = 30
+# prune_if_due() prunes at most this often (it runs on every feature-store refresh).
+PRUNE_INTERVAL_SECONDS = 600
+
+MIGRATE_HINT = "run `python -m tools.bulk_tools migrate`"
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+# ------------------------- Capture -------------------------
+def migrate_change_feed(conn: sqlite3.Connection) -> str:
+    """
+    Create change_log, change_cursors and one AFTER INSERT/UPDATE/DELETE
+    trigger per captured table (run by `python -m tools.bulk_tools migrate`).
+    Each change is one compact row (table, op, rowid); consumers read the
+    current row themselves. seq comes from AUTOINCREMENT, so it only grows and
+    is never reused, even after pruning.
+    """
+    statements = ["""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+            row_id INTEGER NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""", """
+        CREATE TABLE IF NOT EXISTS change_cursors (
+            consumer TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON change_log (table_name, seq)"]
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in CDC_TABLES:
+        if table not in existing:
+            continue
+        for event, op in OPS.items():
+            row = "old" if event == "DELETE" else "new"
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS change_log_{table}_{op.lower()} AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO change_log (table_name, op, row_id) VALUES ('{table}', '{op}', {row}.rowid); END"
+            )
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    return "ok"
+
+
+def has_change_feed(conn: sqlite3.Connection) -> bool:
+    """Whether the migration created change_log (and its triggers)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'").fetchone() is not None
+
+
+def head_seq(conn: sqlite3.Connection) -> int:
+    """Sequence number of the latest change (0 when the log is empty)."""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+
+def prune_change_log() -> Dict[str, int]:
+    """
+    Drop entries every consumer has processed, plus anything older than
+    RETENTION_DAYS. Returns how many were removed.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not has_change_feed(conn):
+            return {"removed": 0}
+        floor = conn.execute("SELECT MIN(seq) FROM change_cursors").fetchone()[0]
+        removed = conn.execute(
+            "DELETE FROM change_log WHERE seq <= ? OR changed_at < datetime('now', ?)",
+            (floor if floor is not None else 0, f"-{RETENTION_DAYS} days")
+        ).rowcount
+        conn.commit()
+        return {"removed": removed}
+    finally:
+        conn.close()
+
+
+def prune_if_due() -> Optional[Dict[str, int]]:
+    """prune_change_log() unless it already ran in the last PRUNE_INTERVAL_SECONDS."""
+    global _last_prune
+    with _prune_lock:
+        if _last_prune and time.monotonic() - _last_prune < PRUNE_INTERVAL_SECONDS:
+            return None
+        _last_prune = time.monotonic()
+    return prune_change_log()
+
+
+# ------------------------- Subscribe -------------------------
+class ChangeSubscriber:
+    """
+    A named consumer of change_log. poll() returns the next batch after the
+    consumer's cursor without moving it; commit(seq) moves it once the batch is
+    applied, so a crash between the two replays the batch (at-least-once).
+    Consumers should apply changes idempotently, e.g. by re-reading the row.
+
+        sub = ChangeSubscriber("search_index", tables=["customers"])
+        for batch in sub.batches():
+            ...
+            sub.commit(batch[-1]["seq"])
+
+    A new consumer starts at the current head (start="latest") or replays the
+    whole retained log (start="earliest"). Raises RuntimeError when the
+    change feed has not been migrated in.
+    """
+
+    def __init__(self, consumer: str, tables: Optional[Sequence[str]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, start: str = "latest"):
+        self.consumer = consumer
+        self.tables = list(tables) if tables else None
+        self.batch_size = batch_size
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            if not has_change_feed(conn):
+                raise RuntimeError(f"change feed is not installed; {MIGRATE_HINT}")
+            conn.execute("INSERT OR IGNORE INTO change_cursors (consumer, seq) VALUES (?, ?)",
+                         (consumer, head_seq(conn) if start == "latest" else 0))
+            conn.commit()
+        finally:
+            conn.close()
+
+    @property
+    def position(self) -> int:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            return conn.execute("SELECT seq FROM change_cursors WHERE consumer = ?", (self.consumer,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def poll(self, limit: Optional[int] = None, after: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Up to `limit` (default batch_size) changes after the cursor (or `after`), oldest first."""
+        where, params = ["seq > ?"], [self.position if after is None else after]
+        if self.tables:
+            where.append(f"table_name IN ({','.join('?' * len(self.tables))})")
+            params.extend(self.tables)
+        params.append(limit or self.batch_size)
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(
+                f"SELECT seq, table_name, op, row_id, changed_at FROM change_log "
+                f"WHERE {' AND '.join(where)} ORDER BY seq LIMIT ?", params
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(r) for r in rows]
+
+    def commit(self, seq: int) -> None:
+        """Mark everything up to `seq` as processed; the cursor never moves backwards."""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.execute("UPDATE change_cursors SET seq = MAX(seq, ?), updated_at = CURRENT_TIMESTAMP "
+                         "WHERE consumer = ?", (seq, self.consumer))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def seek_to_head(self) -> int:
+        """Skip all pending changes (e.g. right after a full rebuild); returns the new position."""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            seq = head_seq(conn)
+        finally:
+            conn.close()
+        self.commit(seq)
+        return seq
+
+    def batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """Pending batches until caught up. Commit each one to advance past it."""
+        while True:
+            batch = self.poll()
+            if not batch:
+                return
+            yield batch
+            if self.position < batch[-1]["seq"]:
+                return  # caller did not commit; stop instead of re-yielding the same batch
+
+    def tail(self, handler: Callable[[List[Dict[str, Any]]], None], stop: Optional[threading.Event] = None,
+             poll_seconds: float = POLL_SECONDS) -> None:
+        """
+        Call handler(batch) for every batch as it appears, committing after each
+        successful call, until `stop` is set. A handler exception propagates and
+        leaves the batch uncommitted.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            batch = self.poll()
+            if batch:
+                handler(batch)
+                self.commit(batch[-1]["seq"])
+            else:
+                stop.wait(poll_seconds)
+
+
+def rows_by_table(batch: List[Dict[str, Any]]) -> Dict[str, Dict[str, set]]:
+    """Collapse a batch to {table: {"upserted": ids, "deleted": ids}} (last op per row wins)."""
+    latest: Dict[tuple, str] = {}
+    for change in batch:
+        latest[(change["table_name"], change["row_id"])] = change["op"]
+    grouped: Dict[str, Dict[str, set]] = {}
+    for (table, row_id), op in latest.items():
+        kind = "deleted" if op == "D" else "upserted"
+        grouped.setdefault(table, {"upserted": set(), "deleted": set()})[kind].add(row_id)
+    return grouped
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    if sys.argv[1:] == ["prune"]:
+        # Maintenance: python -m tools.change_feed prune
+        print(prune_change_log())
+    else:
+        # Print changes as they happen: python -m tools.change_feed
+        subscriber = ChangeSubscriber("console")
+        subscriber.tail(lambda batch: [print(change) for change in batch])
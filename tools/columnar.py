@@ -0,0 +1,336 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from tools.change_feed import MIGRATE_HINT, ChangeSubscriber, has_change_feed, head_seq
+from tools.query_sandbox import (MAX_ROWS, QUERY_TIMEOUT_SECONDS, UNKNOWN_TABLE_ROWS, _alias_map,
+                                 _strip_sql, _table_rows, get_readonly_connection)
+
+DB_PATH = "erp.db"
+COLUMNAR_DIR = os.path.join("data", "columnar")
+MANIFEST_PATH = os.path.join(COLUMNAR_DIR, "manifest.json")
+
+# Append-mostly tables exported incrementally as id-range Parquet parts.
+FACT_TABLES = ("orders", "order_items", "invoices", "stock_movements", "ledger_lines")
+# Small lookup tables rewritten in full on every export so offloaded joins work.
+DIMENSION_TABLES = ("customers", "products", "suppliers", "chart_of_accounts", "ledger_entries")
+# Rows per Parquet part (and per chunk read from SQLite).
+PART_ROWS = 1_000_000
+
+# Offload when SQLite's plan would scan at least this many rows...
+OFFLOAD_MIN_ROWS = 250_000
+# ...and the snapshot is missing at most this share of each fact table's rows.
+OFFLOAD_MAX_LAG = 0.01
+
+# A stale snapshot triggers a background re-export at most this often.
+EXPORT_MIN_INTERVAL_SECONDS = 300
+# change_cursors consumer that pins the change_log entries newer than the snapshot.
+COLUMNAR_CONSUMER = "columnar"
+
+SQLITE_TO_DUCKDB = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "NUMERIC": "DOUBLE"}
+# Make DuckDB follow SQLite semantics: integer / integer truncates, NULLs sort first ascending.
+DUCKDB_SQLITE_SETTINGS = ("SET integer_division = true",
+                          "SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+# Offloaded SQL must not reach files or settings through DuckDB's table functions.
+DUCKDB_DENY = re.compile(r"\b(read_\w+|\w+_scan|glob|sniff_csv|getenv|attach|copy|install|load|export|"
+                         r"import|pragma|set|query_table|query)\s*\(|\b(attach|copy|install|load|pragma)\b", re.I)
+
+_lock = threading.Lock()
+_local = threading.local()
+_export_started = 0.0
+_schedule_lock = threading.Lock()
+
+
+def _duckdb():
+    """DuckDB is optional; without it export is unavailable and every query stays on SQLite."""
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+# ------------------------- Export -------------------------
+def _read_manifest() -> Dict[str, Any]:
+    if not os.path.exists(MANIFEST_PATH):
+        return {"tables": {}, "exported_at": None}
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest: Dict[str, Any]) -> None:
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _select_typed(conn: sqlite3.Connection, table: str) -> str:
+    """SELECT over the registered chunk casting every column to its SQLite declared type."""
+    columns = []
+    for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        kind = SQLITE_TO_DUCKDB.get((declared or "").upper(), "VARCHAR")
+        columns.append(f'CAST("{name}" AS {kind}) AS "{name}"')
+    return f"SELECT {', '.join(columns)} FROM chunk"
+
+
+def _write_part(duck, conn: sqlite3.Connection, table: str, frame: pd.DataFrame, path: str) -> None:
+    duck.register("chunk", frame)
+    try:
+        duck.execute(f"COPY ({_select_typed(conn, table)}) TO '{path}' (FORMAT parquet)")
+    finally:
+        duck.unregister("chunk")
+
+
+def export_tables(full: bool = False) -> Dict[str, Any]:
+    """
+    Snapshot fact tables to data/columnar/<table>/part-<first>-<last>.parquet.
+    Incremental by default: only rows past each table's id watermark are
+    written, as new parts. Updates and deletes of exported rows need full=True
+    (refresh_snapshot() decides). Dimension tables are rewritten whole every time.
+    """
+    duckdb = _duckdb()
+    if duckdb is None:
+        return {"error": "columnar export needs the optional 'duckdb' package (pip install duckdb)"}
+
+    started = time.time()
+    with _lock:
+        manifest = {"tables": {}, "exported_at": None} if full else _read_manifest()
+        if full and os.path.exists(COLUMNAR_DIR):
+            shutil.rmtree(COLUMNAR_DIR)
+        os.makedirs(COLUMNAR_DIR, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH)
+        duck = duckdb.connect()
+        stats = {}
+        try:
+            # Changes after this point are what the snapshot misses (see _changed_since);
+            # without the change feed the snapshot's freshness cannot be tracked
+            tracked = has_change_feed(conn)
+            change_seq = head_seq(conn) if tracked else None
+            for table in FACT_TABLES:
+                entry = manifest["tables"].setdefault(table, {"watermark": 0, "rows": 0, "parts": 0})
+                folder = os.path.join(COLUMNAR_DIR, table)
+                os.makedirs(folder, exist_ok=True)
+                written = 0
+                for frame in pd.read_sql(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", conn,
+                                         params=(entry["watermark"],), chunksize=PART_ROWS):
+                    if frame.empty:
+                        continue
+                    first, last = int(frame["id"].iloc[0]), int(frame["id"].iloc[-1])
+                    _write_part(duck, conn, table, frame, os.path.join(folder, f"part-{first:012d}-{last:012d}.parquet"))
+                    entry["watermark"], entry["rows"], entry["parts"] = last, entry["rows"] + len(frame), entry["parts"] + 1
+                    written += len(frame)
+                stats[table] = written
+
+            for table in DIMENSION_TABLES:
+                folder = os.path.join(COLUMNAR_DIR, table)
+                os.makedirs(folder, exist_ok=True)
+                frame = pd.read_sql(f"SELECT * FROM {table}", conn)
+                tmp = os.path.join(folder, "full.parquet.tmp")
+                _write_part(duck, conn, table, frame, tmp)
+                os.replace(tmp, os.path.join(folder, "full.parquet"))
+                manifest["tables"][table] = {"rows": len(frame), "parts": 1, "dimension": True}
+                stats[table] = len(frame)
+
+            manifest["exported_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            manifest["change_seq"] = change_seq
+            _write_manifest(manifest)
+            # A change-feed cursor at the snapshot point, so pruning keeps what _changed_since reads
+            if tracked:
+                ChangeSubscriber(COLUMNAR_CONSUMER, start="earliest").commit(change_seq)
+        finally:
+            duck.close()
+            conn.close()
+    _local.__dict__.pop("duck", None)  # this thread's views pick up the new parts
+    return {"rows_written": stats, "seconds": round(time.time() - started, 3)}
+
+
+def _changed_since(conn: sqlite3.Connection, manifest: Dict[str, Any], tables) -> Dict[str, str]:
+    """
+    Tables in `tables` whose snapshot misses changes, from the change feed:
+    "updated" when fact rows were updated or deleted, "changed" for any
+    change to a dimension table. New fact rows are judged by the lag instead.
+    """
+    if not has_change_feed(conn):
+        return {table: "untracked" for table in tables}
+    seq = manifest.get("change_seq")
+    oldest = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+    if seq is not None and oldest is not None and oldest > seq + 1:
+        seq = None  # entries after the snapshot were pruned by retention: cannot tell
+    stale = {}
+    for table in tables:
+        if seq is None:
+            stale[table] = "untracked"
+            continue
+        ops = "('U', 'D')" if table in FACT_TABLES else "('I', 'U', 'D')"
+        if conn.execute(f"SELECT 1 FROM change_log WHERE table_name = ? AND seq > ? AND op IN {ops} LIMIT 1",
+                        (table, seq)).fetchone():
+            stale[table] = "updated" if table in FACT_TABLES else "changed"
+    return stale
+
+
+def refresh_snapshot() -> Dict[str, Any]:
+    """Re-export: in full when exported fact rows were updated or deleted, else incrementally."""
+    manifest = _read_manifest()
+    if not manifest["exported_at"]:
+        return export_tables(full=True)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        stale = _changed_since(conn, manifest, FACT_TABLES)
+    finally:
+        conn.close()
+    return export_tables(full=bool(stale))
+
+
+def _schedule_refresh() -> None:
+    """Start refresh_snapshot() in the background, at most once per EXPORT_MIN_INTERVAL_SECONDS."""
+    global _export_started
+    with _schedule_lock:
+        if time.monotonic() - _export_started < EXPORT_MIN_INTERVAL_SECONDS and _export_started:
+            return
+        _export_started = time.monotonic()
+    threading.Thread(target=refresh_snapshot, name="columnar-export", daemon=True).start()
+
+
+# ------------------------- Offload -------------------------
+def _offload_connection(manifest: Dict[str, Any]):
+    """This thread's in-memory DuckDB with one view per exported table, rebuilt after each export."""
+    duck = getattr(_local, "duck", None)
+    if duck is not None and _local.exported_at == manifest["exported_at"]:
+        return duck
+    duckdb = _duckdb()
+    duck = duckdb.connect()
+    for setting in DUCKDB_SQLITE_SETTINGS:
+        duck.execute(setting)
+    for table in manifest["tables"]:
+        pattern = os.path.join(os.path.abspath(COLUMNAR_DIR), table, "*.parquet").replace("'", "''")
+        duck.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{pattern}')")
+    _local.duck, _local.exported_at = duck, manifest["exported_at"]
+    return duck
+
+
+def _to_duckdb_sql(sql: str) -> str:
+    """
+    SQLite strftime(fmt, ts) -> DuckDB strftime(ts, fmt), with text timestamps
+    cast first; LIKE -> ILIKE, since SQLite's LIKE ignores (ASCII) case.
+    """
+    sql = re.sub(r"strftime\(\s*('[^']*')\s*,\s*([\w.]+)\s*\)", r"strftime(CAST(\2 AS TIMESTAMP), \1)", sql, flags=re.I)
+    parts = re.split(r"('(?:[^']|'')*')", sql)  # leave string literals alone
+    return "".join(p if i % 2 else re.sub(r"\bLIKE\b", "ILIKE", p, flags=re.I) for i, p in enumerate(parts))
+
+
+def offload_plan(sql: str, params: tuple = ()) -> Dict[str, Any]:
+    """
+    Decide where `sql` should run. SQLite's query plan gives the full scans it
+    would do (and index searches repeated inside them); the estimate is the
+    sum of those tables' sizes. Offload when it
+    passes OFFLOAD_MIN_ROWS, every table is in the columnar snapshot, no
+    fact table lags SQLite by more than OFFLOAD_MAX_LAG and the change feed
+    shows no updates/deletes of exported fact rows and no dimension changes
+    since the export. A stale snapshot schedules a background re-export.
+    """
+    if _duckdb() is None:
+        return {"engine": "sqlite", "reason": "duckdb not installed"}
+    manifest = _read_manifest()
+    if not manifest["exported_at"]:
+        return {"engine": "sqlite", "reason": "no columnar snapshot"}
+    if DUCKDB_DENY.search(sql):
+        return {"engine": "sqlite", "reason": "query uses functions not allowed on the offload engine"}
+
+    conn = get_readonly_connection()
+    known = _table_rows(conn)
+    aliases = _alias_map(sql, known)
+    referenced = set(aliases.values())
+    missing = referenced - set(manifest["tables"])
+    if missing:
+        return {"engine": "sqlite", "reason": f"not in snapshot: {sorted(missing)}"}
+
+    scanned, outer_scan = 0, set()
+    for _, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        m = re.match(r"(SCAN|SEARCH) (\w+)", detail)
+        if not m:
+            continue
+        # A SEARCH nested inside a full scan's loop is repeated for every outer row
+        if m.group(1) == "SCAN" or parent in outer_scan:
+            table = aliases.get(m.group(2).lower())
+            scanned += known.get(table, UNKNOWN_TABLE_ROWS) if table else UNKNOWN_TABLE_ROWS
+        if m.group(1) == "SCAN":
+            outer_scan.add(parent)
+    if scanned < OFFLOAD_MIN_ROWS:
+        return {"engine": "sqlite", "estimated_rows": scanned, "reason": "small scan"}
+    if not has_change_feed(conn):
+        # A re-export would not help: freshness stays unknown until the feed exists
+        return {"engine": "sqlite", "estimated_rows": scanned,
+                "reason": f"change feed not installed, snapshot freshness unknown; {MIGRATE_HINT}"}
+
+    stale = {}
+    for table in referenced & set(FACT_TABLES):
+        current = known.get(table, 0)
+        lag = current - manifest["tables"][table]["watermark"]
+        if current and lag / current > OFFLOAD_MAX_LAG:
+            stale[table] = "lagging"
+    stale.update(_changed_since(conn, manifest, referenced))
+    if stale:
+        _schedule_refresh()
+        return {"engine": "sqlite", "estimated_rows": scanned, "reason": f"snapshot is stale: {stale}"}
+    return {"engine": "duckdb", "estimated_rows": scanned, "snapshot_at": manifest["exported_at"]}
+
+
+def run_offloaded_query(sql: str, params: tuple = (), max_rows: int = MAX_ROWS,
+                        timeout: float = QUERY_TIMEOUT_SECONDS) -> Optional[List[Dict[str, Any]]]:
+    """
+    Run `sql` on the columnar snapshot when offload_plan() picks DuckDB.
+    Returns None when the query should (or, after a DuckDB error, must) run on
+    SQLite instead. Results follow run_sandboxed_query (at most max_rows rows,
+    a trailing {"truncated": True} row), led by a {"notice": ...} row saying
+    the figures come from the snapshot and ending with
+    {"offloaded": "duckdb", "snapshot_at": ...}.
+    """
+    sql = _strip_sql(sql)
+    try:
+        plan = offload_plan(sql, params)
+    except sqlite3.Error:
+        return None
+    if plan["engine"] != "duckdb":
+        return None
+
+    duck = _offload_connection(_read_manifest())
+    expired = threading.Event()
+
+    def interrupt() -> None:
+        expired.set()
+        duck.interrupt()
+
+    timer = threading.Timer(timeout, interrupt)
+    timer.start()
+    try:
+        cursor = duck.execute(f"SELECT * FROM ({_to_duckdb_sql(sql)}) LIMIT {int(max_rows) + 1}", list(params))
+        names = [d[0] for d in cursor.description]
+        rows = [dict(zip(names, r)) for r in cursor.fetchall()]
+    except Exception:
+        if expired.is_set():
+            return [{"error": "Query aborted: exceeded the sandbox time limit. Narrow it with filters or aggregates."}]
+        return None  # dialect gaps: SQLite is always the fallback
+    finally:
+        timer.cancel()
+
+    notice = {"notice": f"Computed on the columnar snapshot taken at {plan['snapshot_at']}; "
+                         f"mention the snapshot time in the answer."}
+    result = [notice] + rows[:max_rows]
+    if len(rows) > max_rows:
+        result.append({"truncated": True, "limit": max_rows})
+    result.append({"offloaded": "duckdb", "snapshot_at": plan["snapshot_at"]})
+    return result
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    import sys
+    print(export_tables(full="--full" in sys.argv))
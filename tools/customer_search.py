@@ -0,0 +1,293 @@
+import difflib
+import re
+import sqlite3
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain.tools import tool
+
+DB_PATH = "erp.db"
+
+SEARCH_FIELDS = ("name", "email", "phone")
+# Candidates pulled from the index before similarity re-ranking.
+FUZZY_CANDIDATES = 200
+MAX_QUERY_TRIGRAMS = 32
+# Dedup: pairs at or above this similarity are clustered; larger blocks are skipped.
+DEDUP_THRESHOLD = 0.88
+MAX_BLOCK_SIZE = 50
+
+COMPANY_SUFFIXES = {"ltd", "inc", "llc", "co", "corp", "company", "group", "solutions", "the", "plc", "gmbh"}
+
+
+# ------------------------- Index -------------------------
+def migrate_customer_index(conn: sqlite3.Connection) -> str:
+    """
+    Create the trigram FTS5 index over customers (external content, kept in
+    sync by triggers) and fill it the first time (run by
+    `python -m tools.bulk_tools migrate`).
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'customers_fts'").fetchone()
+    conn.executescript("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            name, email, phone, content='customers', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone);
+        END;
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+            VALUES ('delete', old.id, old.name, old.email, old.phone);
+        END;
+        CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE ON customers BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, name, email, phone)
+            VALUES ('delete', old.id, old.name, old.email, old.phone);
+            INSERT INTO customers_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone);
+        END;
+    """)
+    if not exists:
+        conn.execute("INSERT INTO customers_fts(customers_fts) VALUES ('rebuild')")
+    conn.commit()
+    return "ok" if exists else "created"
+
+
+def _has_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'customers_fts'").fetchone() is not None
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _trigrams(text: str) -> List[str]:
+    text = text.lower()
+    return list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
+
+
+def _normalize(field: str, value: str) -> str:
+    value = (value or "").strip().lower()
+    if field == "phone":
+        return re.sub(r"\D", "", value)
+    return value
+
+
+# ------------------------- Search -------------------------
+def search_customers(query: str, field: Optional[str] = None, limit: int = 10,
+                     conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """
+    Ranked customer matches for `query` over name, email and phone (or one
+    `field`). Substring matches come first ("match": "exact"); if there are
+    none, misspellings are matched by shared trigrams and re-ranked by string
+    similarity ("match": "fuzzy"). Until the index is migrated in, both
+    steps use LIKE scans instead.
+    """
+    query = (query or "").strip()
+    if len(query) < 3:
+        return [{"error": "search text must be at least 3 characters"}]
+    if field is not None and field not in SEARCH_FIELDS:
+        return [{"error": f"field must be one of {SEARCH_FIELDS}"}]
+
+    own_conn = conn is None
+    conn = conn or sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        lookup = _index_customers if _has_index(conn) else _scan_customers
+        rows, candidates = lookup(conn, query, field, limit)
+    finally:
+        if own_conn:
+            conn.close()
+    if rows or candidates is None:
+        return rows
+
+    wanted = query.lower()
+    fields = [field] if field else list(SEARCH_FIELDS)
+    scored = []
+    for row in candidates:
+        best = max(difflib.SequenceMatcher(None, _normalize(f, wanted), _normalize(f, row[f])).ratio()
+                   for f in fields)
+        scored.append((best, dict(row)))
+    scored.sort(key=lambda s: s[0], reverse=True)
+    return [dict(row, match="fuzzy", score=round(score, 3)) for score, row in scored[:limit]]
+
+
+def _query_trigrams(query: str, field: Optional[str]) -> List[str]:
+    return _trigrams(_normalize(field or "name", query) if field == "phone" else query)[:MAX_QUERY_TRIGRAMS]
+
+
+def _index_customers(conn: sqlite3.Connection, query: str, field: Optional[str], limit: int):
+    """(exact rows, fuzzy candidates or None) from customers_fts."""
+    scope = f"{field} : " if field else ""
+    rows = conn.execute(
+        "SELECT c.*, bm25(customers_fts) AS rank FROM customers_fts "
+        "JOIN customers c ON c.id = customers_fts.rowid "
+        "WHERE customers_fts MATCH ? ORDER BY rank LIMIT ?",
+        (f"{scope}{_quote(query)}", limit)
+    ).fetchall()
+    if rows:
+        return [dict(r, match="exact", score=round(-r.pop("rank"), 3)) for r in map(dict, rows)], None
+
+    grams = _query_trigrams(query, field)
+    if not grams:
+        return [], None
+    expression = scope + "(" + " OR ".join(_quote(g) for g in grams) + ")"
+    candidates = conn.execute(
+        "SELECT c.* FROM customers_fts JOIN customers c ON c.id = customers_fts.rowid "
+        "WHERE customers_fts MATCH ? ORDER BY bm25(customers_fts) LIMIT ?",
+        (expression, FUZZY_CANDIDATES)
+    ).fetchall()
+    return [], candidates
+
+
+def _scan_customers(conn: sqlite3.Connection, query: str, field: Optional[str], limit: int):
+    """Unindexed (exact rows, fuzzy candidates or None) with LIKE; exact rows come without a score."""
+    fields = [field] if field else list(SEARCH_FIELDS)
+    rows = conn.execute(
+        f"SELECT * FROM customers WHERE {' OR '.join(f'{f} LIKE ?' for f in fields)} ORDER BY id LIMIT ?",
+        [f"%{query}%"] * len(fields) + [limit]
+    ).fetchall()
+    if rows:
+        return [dict(r, match="exact", score=None) for r in rows], None
+    grams = _query_trigrams(query, field)
+    if not grams:
+        return [], None
+    candidates = conn.execute(
+        f"SELECT * FROM customers WHERE {' OR '.join(f'{f} LIKE ?' for f in fields for _ in grams)} LIMIT ?",
+        [f"%{g}%" for _ in fields for g in grams] + [FUZZY_CANDIDATES]
+    ).fetchall()
+    return [], candidates
+
+
+def find_customers(name: Optional[str] = None, email: Optional[str] = None,
+                   phone: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Index-backed equivalent of the name/email/phone substring filters
+    (all given filters must match), best matches first. Exact only: fuzzy
+    matching is search_customers(). Returns None when a filter is too short
+    for trigrams or the index is not migrated in, so the caller can use LIKE instead.
+    """
+    terms = {f: v.strip() for f, v in (("name", name), ("email", email), ("phone", phone)) if v and v.strip()}
+    if not terms or any(len(v) < 3 for v in terms.values()):
+        return None
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _has_index(conn):
+            return None
+        expression = " AND ".join(f"{f} : {_quote(v)}" for f, v in terms.items())
+        rows = conn.execute(
+            "SELECT c.* FROM customers_fts JOIN customers c ON c.id = customers_fts.rowid "
+            "WHERE customers_fts MATCH ? ORDER BY bm25(customers_fts)", (expression,)
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+# ------------------------- Dedup -------------------------
+def _name_key(name: str) -> str:
+    tokens = [t for t in re.findall(r"[a-z0-9]+", (name or "").lower()) if t not in COMPANY_SUFFIXES]
+    return " ".join(tokens)
+
+
+def _blocking_keys(row: Tuple[int, str, str, str]) -> Iterable[str]:
+    _, name, email, phone = row
+    key = _name_key(name)
+    if key:
+        yield "n:" + key[:6]
+        yield "n2:" + "".join(sorted(key.split()))[:6]
+    local = (email or "").lower().split("@")[0]
+    if local:
+        yield "e:" + re.sub(r"[^a-z]", "", local)
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) >= 7:
+        yield "p:" + digits[-7:]
+
+
+def _similarity(a: Tuple[int, str, str, str], b: Tuple[int, str, str, str]) -> float:
+    if a[2] and b[2] and a[2].strip().lower() == b[2].strip().lower():
+        return 1.0
+    name = difflib.SequenceMatcher(None, _name_key(a[1]), _name_key(b[1])).ratio()
+    da, db = re.sub(r"\D", "", a[3] or ""), re.sub(r"\D", "", b[3] or "")
+    same_phone = len(da) >= 7 and da[-7:] == db[-7:]
+    return min(1.0, name + 0.2) if same_phone else name
+
+
+def find_duplicate_customers(threshold: float = DEDUP_THRESHOLD, write: bool = True) -> Dict[str, Any]:
+    """
+    Cluster near-duplicate customers. Customers are grouped into blocks by
+    cheap keys (name prefix, sorted-name prefix, email local part, last 7
+    phone digits), only pairs inside a block are compared, and matching pairs
+    are merged with union-find. With `write`, clusters are stored in
+    customer_duplicates (cluster_id = lowest customer id, the canonical one).
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        rows = conn.execute("SELECT id, name, email, phone FROM customers").fetchall()
+        blocks: Dict[str, List[int]] = defaultdict(list)
+        for i, row in enumerate(rows):
+            for key in _blocking_keys(row):
+                blocks[key].append(i)
+
+        parent = list(range(len(rows)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        compared = set()
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    a, b = members[x], members[y]
+                    if (a, b) in compared:
+                        continue
+                    compared.add((a, b))
+                    score = _similarity(rows[a], rows[b])
+                    if score >= threshold:
+                        parent[find(a)] = find(b)
+
+        clusters: Dict[int, List[int]] = defaultdict(list)
+        for i in range(len(rows)):
+            clusters[find(i)].append(i)
+        groups = [sorted(rows[i][0] for i in members) for members in clusters.values() if len(members) > 1]
+        groups.sort()
+
+        if write:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS customer_duplicates (
+                    customer_id INTEGER PRIMARY KEY,
+                    cluster_id INTEGER NOT NULL,
+                    detected_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                DELETE FROM customer_duplicates;
+            """)
+            conn.executemany("INSERT INTO customer_duplicates (customer_id, cluster_id) VALUES (?, ?)",
+                             [(cid, group[0]) for group in groups for cid in group])
+            conn.commit()
+    finally:
+        conn.close()
+
+    return {"customers": len(rows), "blocks": len(blocks), "pairs_compared": len(compared),
+            "clusters": len(groups), "duplicates": sum(len(g) - 1 for g in groups), "sample": groups[:10]}
+
+
+# ------------------------- Tools -------------------------
+@tool
+def search_customers_tool(query: str) -> List[Dict[str, Any]]:
+    """
+    Fuzzy customer search over name, email and phone, tolerant of misspellings.
+    Input: the text to look for (at least 3 characters), e.g. "Ahmed Nabl" or "+2012695".
+    Returns the best matches with a score.
+    """
+    try:
+        return search_customers(query)
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+# ------------------------------------ MAIN -----------------------------------------
+if __name__ == "__main__":
+    print(find_duplicate_customers())
@@ -1,6 +1,9 @@
 import sqlite3
 from typing import List, Dict, Optional
 from langchain.tools import tool
+from tools.query_validator import run_validated_query
+from tools.query_catalog import run_query
+from tools.customer_search import find_customers
 
 DB_PATH = "erp.db"
 
@@ -199,6 +202,12 @@ def get_table_names() -> List[str]:
         return [f"Error fetching tables: {str(e)}"]
 
 # ====================== Customer Tools =========================
+def _contains_all(row: Dict, filters: Dict[str, Optional[str]]) -> bool:
+    """Substring filters on a row fetched by id, matching the catalogue's LIKE '%x%'."""
+    if "error" in row:
+        return True
+    return all(not value or value.lower() in str(row.get(key) or "").lower() for key, value in filters.items())
+
 @tool
 def get_customers(
     name: Optional[str] = None,
@@ -206,31 +215,23 @@ def get_customers(
     phone: Optional[str] = None,
     customer_id: Optional[int] = None
 ) -> List[Dict]:
-    """Return all customers or filter by name, email, phone, or customer_id."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM customers WHERE 1=1"
-    params = []
-
+    """
+    Return all customers or filter by name, email, phone, or customer_id (exact substring matches).
+    Returns [] when nothing matches; look for close spellings with search_customers_tool.
+    """
+    if not customer_id and (name or email or phone):
+        # Trigram index instead of a '%x%' table scan
+        matches = find_customers(name=name, email=email, phone=phone)
+        if matches is not None:
+            return matches
     if customer_id:
-        query += " AND id = ?"
-        params.append(customer_id)
-    if name:
-        query += " AND name LIKE ?"
-        params.append(f"%{name}%")
-    if email:
-        query += " AND email LIKE ?"
-        params.append(f"%{email}%")
-    if phone:
-        query += " AND phone LIKE ?"
-        params.append(f"%{phone}%")
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+        rows = run_query("customers.by_id", (customer_id,))
+        return [r for r in rows if _contains_all(r, {"name": name, "email": email, "phone": phone})]
+    return run_query("customers.search", {
+        "name": name or None,
+        "email": email or None,
+        "phone": phone or None,
+    })
 
 @tool
 def create_customer(name: str, email: str, phone: Optional[str] = None) -> str:
@@ -251,23 +252,15 @@ def create_customer(name: str, email: str, phone: Optional[str] = None) -> str:
 @tool
 def get_orders(customer_id: Optional[int] = None, order_id: Optional[int] = None) -> List[Dict]:
     """Return all orders, or filter by customer_id or order_id."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM orders WHERE 1=1"
-    params = []
-    if customer_id:
-        query += " AND customer_id = ?"
-        params.append(customer_id)
+    # Separate catalogue entries keep each lookup on its index
     if order_id:
-        query += " AND id = ?"
-        params.append(order_id)
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+        rows = run_query("orders.by_id", (order_id,))
+        if customer_id:
+            rows = [r for r in rows if r.get("customer_id") == customer_id]
+        return rows
+    if customer_id:
+        return run_query("orders.by_customer", (customer_id,))
+    return run_query("orders.all")
 
 # ====================== Leads Tools =========================
 @tool
@@ -277,27 +270,25 @@ def get_leads(
     status: Optional[str] = None
 ) -> List[Dict]:
     """Return all leads or filter by lead_id, contact_email, or status."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM leads WHERE 1=1"
-    params = []
-
     if lead_id:
-        query += " AND id = ?"
-        params.append(lead_id)
-    if contact_email:
-        query += " AND contact_email LIKE ?"
-        params.append(f"%{contact_email}%")
-    if status:
-        query += " AND status = ?"
-        params.append(status)
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+        rows = run_query("leads.by_id", (lead_id,))
+        return [r for r in rows if _contains_all(r, {"contact_email": contact_email})
+                and (not status or r.get("status") == status)]
+    return run_query("leads.search", {
+        "contact_email": contact_email or None,
+        "status": status or None,
+    })
+
+# ====================== Inventory Tools =========================
+@tool
+def get_stock_levels(product_id: Optional[int] = None) -> List[Dict]:
+    """
+    Return stock on hand and reorder point for one product (product_id),
+    or every product at or below its reorder point when no id is given.
+    """
+    if product_id:
+        return run_query("stock.by_product", (product_id,))
+    return run_query("stock.below_reorder")
 
 # ====================== Clarification Tool =========================
 @tool
@@ -310,12 +301,10 @@ def ask_clarification(question: str) -> str:
 def get_financial_summary() -> Dict[str, float]:
     """Return total revenue, total cost, and total profit."""
     try:
-        revenue_query = "SELECT SUM(total) as total_revenue FROM orders;"
-        revenue_res = execute_query(revenue_query)
+        revenue_res = run_query("finance.total_revenue")
         total_revenue = revenue_res[0].get('total_revenue', 0) if revenue_res else 0
 
-        cost_query = "SELECT SUM(cost) as total_cost FROM products;"
-        cost_res = execute_query(cost_query)
+        cost_res = run_query("finance.total_cost")
         total_cost = cost_res[0].get('total_cost', 0) if cost_res else 0
 
         total_profit = (total_revenue or 0) - (total_cost or 0)
@@ -332,9 +321,11 @@ def get_financial_summary() -> Dict[str, float]:
 @tool
 def execute_custom_query(query: str, params: tuple = ()) -> List[Dict]:
     """
-    Execute any custom SQL query and return results as a list of dictionaries.
+    Execute a custom read-only SQL query and return results as a list of dictionaries.
+    Validated (with automatic repair of misspelled names) and then run in the
+    query sandbox: SELECT/WITH only, row limit, time and cost limits.
     """
-    return execute_query(query, params)
+    return run_validated_query(query, params)
 
 
 @tool
@@ -346,12 +337,10 @@ def get_financial_summary() -> Dict[str, float]:
     - total profit
     """
     try:
-        revenue_query = "SELECT SUM(total) as total_revenue FROM orders;"
-        revenue_res = execute_query(revenue_query)
+        revenue_res = run_query("finance.total_revenue")
         total_revenue = revenue_res[0].get('total_revenue', 0) if revenue_res else 0
 
-        cost_query = "SELECT SUM(cost) as total_cost FROM products;"
-        cost_res = execute_query(cost_query)
+        cost_res = run_query("finance.total_cost")
         total_cost = cost_res[0].get('total_cost', 0) if cost_res else 0
 
         total_profit = (total_revenue or 0) - (total_cost or 0)
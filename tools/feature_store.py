@@ -0,0 +1,384 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from tools.change_feed import ChangeSubscriber, has_change_feed, head_seq, prune_if_due, rows_by_table
+
+DB_PATH = "erp.db"
+FEATURE_DIR = os.path.join("data", "feature_store")
+# Feature set versions kept on disk; older files and manifests are deleted.
+KEEP_VERSIONS = 2
+
+EPOCH = pd.Timestamp("1970-01-01")
+
+# Stored columns. Dates are kept as absolute epoch days so rows refreshed at
+# different times stay comparable; age-like features are derived at lookup.
+CUSTOMER_COLUMNS = [
+    "order_count", "order_total", "avg_order_value", "cancelled_ratio",
+    "first_order_day", "last_order_day", "ticket_count", "open_ticket_count",
+    "payment_count", "avg_payment_delay_days", "late_payment_ratio",
+    "unpaid_invoice_total", "created_day",
+]
+CUSTOMER_DERIVED = ["recency_days", "tenure_days", "orders_per_month"]
+
+LEAD_COLUMNS = [
+    "message_words", "intent_pricing", "intent_demo", "intent_purchase",
+    "intent_support", "created_day", "customer_id",
+]
+LEAD_DERIVED = ["age_days", "is_customer"]
+# Customer features appended to every lead (NaN when the lead is not a customer).
+LEAD_CUSTOMER_FEATURES = ["order_count", "order_total", "recency_days", "ticket_count", "avg_payment_delay_days"]
+
+INTENT_PATTERNS = {
+    "intent_pricing": r"pric|quote|cost|discount|budget",
+    "intent_demo": r"demo|trial|walkthrough|presentation",
+    "intent_purchase": r"purchas|buy|order|bulk|contract|licen",
+    "intent_support": r"support|training|help|issue|integrat",
+}
+
+# Source tables whose new rows trigger an incremental refresh, per entity.
+WATERMARK_TABLES = {
+    "customer": ["customers", "orders", "tickets", "payments", "invoices"],
+    "lead": ["leads"],
+}
+
+
+def _days(series: pd.Series) -> pd.Series:
+    """Datetime strings -> float epoch days (NaN where missing)."""
+    return (pd.to_datetime(series, errors="coerce") - EPOCH) / pd.Timedelta(days=1)
+
+
+def _today() -> float:
+    return time.time() / 86400.0
+
+
+def _id_filter(column: str, ids: Optional[Sequence[int]]) -> tuple:
+    if ids is None:
+        return "", ()
+    return f" WHERE {column} IN (SELECT value FROM json_each(?))", (json.dumps([int(i) for i in ids]),)
+
+
+# ------------------------- Vectorized Builds -------------------------
+def build_customer_features(conn: sqlite3.Connection, customer_ids: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    """
+    Customer features (RFM, order frequency, tickets, payment delay) for all
+    customers, or only `customer_ids`, in one grouped pass per source table.
+    """
+    where, params = _id_filter("id", customer_ids)
+    customers = pd.read_sql(f"SELECT id AS customer_id, created_at FROM customers{where}", conn, params=params)
+    frame = pd.DataFrame(index=customers["customer_id"])
+    frame["created_day"] = _days(customers["created_at"]).values
+
+    where, params = _id_filter("customer_id", customer_ids)
+    orders = pd.read_sql(f"SELECT customer_id, total, status, created_at FROM orders{where}", conn, params=params)
+    orders["day"] = _days(orders["created_at"])
+    orders["cancelled"] = (orders["status"] == "cancelled").astype(float)
+    live = orders[orders["cancelled"] == 0]
+    grouped = orders.groupby("customer_id")
+    frame["order_count"] = live.groupby("customer_id").size()
+    frame["order_total"] = live.groupby("customer_id")["total"].sum()
+    frame["cancelled_ratio"] = grouped["cancelled"].mean()
+    frame["first_order_day"] = grouped["day"].min()
+    frame["last_order_day"] = grouped["day"].max()
+
+    tickets = pd.read_sql(f"SELECT customer_id, status FROM tickets{where}", conn, params=params)
+    frame["ticket_count"] = tickets.groupby("customer_id").size()
+    frame["open_ticket_count"] = tickets[tickets["status"] != "closed"].groupby("customer_id").size()
+
+    # Payment delay: allocation received date vs. the invoice due date
+    delays = pd.read_sql(
+        "SELECT i.customer_id, p.received_at, i.due_date FROM payment_allocations pa "
+        "JOIN payments p ON p.id = pa.payment_id JOIN invoices i ON i.id = pa.invoice_id"
+        + where.replace("customer_id", "i.customer_id"), conn, params=params)
+    delays["delay"] = _days(delays["received_at"]) - _days(delays["due_date"])
+    frame["payment_count"] = delays.groupby("customer_id").size()
+    frame["avg_payment_delay_days"] = delays.groupby("customer_id")["delay"].mean()
+    frame["late_payment_ratio"] = (delays["delay"] > 0).groupby(delays["customer_id"]).mean()
+
+    invoices = pd.read_sql(f"SELECT customer_id, total_amount FROM invoices{where} "
+                           f"{'AND' if where else 'WHERE'} status != 'paid'", conn, params=params)
+    frame["unpaid_invoice_total"] = invoices.groupby("customer_id")["total_amount"].sum()
+
+    counts = ["order_count", "order_total", "ticket_count", "open_ticket_count", "payment_count", "unpaid_invoice_total"]
+    frame[counts] = frame[counts].fillna(0.0)
+    frame["avg_order_value"] = np.where(frame["order_count"] > 0,
+                                        frame["order_total"] / frame["order_count"].where(frame["order_count"] > 0), 0.0)
+    return frame[CUSTOMER_COLUMNS].astype(np.float32)
+
+
+def build_lead_features(conn: sqlite3.Connection, lead_ids: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    """Lead features from the message text, plus the matching customer id (-1 if none)."""
+    where, params = _id_filter("id", lead_ids)
+    leads = pd.read_sql(f"SELECT id AS lead_id, customer_name, contact_email, message, created_at FROM leads{where}",
+                        conn, params=params)
+    # Match leads to customers by email, then by name (hash joins, not per-lead lookups)
+    customers = pd.read_sql("SELECT id, lower(name) AS name, lower(email) AS email FROM customers", conn)
+    by_email = customers.dropna(subset=["email"]).groupby("email")["id"].min()
+    by_name = customers.dropna(subset=["name"]).groupby("name")["id"].min()
+    leads["customer_id"] = leads["contact_email"].str.lower().map(by_email).fillna(
+        leads["customer_name"].str.lower().map(by_name))
+    message = leads["message"].fillna("").str.lower()
+    frame = pd.DataFrame(index=leads["lead_id"])
+    frame["message_words"] = message.str.split().str.len().fillna(0).values
+    for column, pattern in INTENT_PATTERNS.items():
+        frame[column] = message.str.contains(pattern, regex=True).astype(float).values
+    frame["created_day"] = _days(leads["created_at"]).values
+    frame["customer_id"] = leads["customer_id"].fillna(-1).values
+    return frame[LEAD_COLUMNS].astype(np.float32)
+
+
+BUILDERS = {"customer": build_customer_features, "lead": build_lead_features}
+STORED_COLUMNS = {"customer": CUSTOMER_COLUMNS, "lead": LEAD_COLUMNS}
+
+
+# ------------------------- Feature Sets -------------------------
+class FeatureSet:
+    """
+    One version of an entity's features: a sorted int64 id index and a
+    float32 matrix (rows aligned with ids), both memory-mapped .npy files.
+    """
+
+    def __init__(self, entity_type: str, manifest: Dict[str, Any]):
+        self.entity_type = entity_type
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.columns: List[str] = manifest["columns"]
+        self.ids = np.load(manifest["ids_path"], mmap_mode="r")
+        self.matrix = np.load(manifest["matrix_path"], mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, ids: Sequence[int]) -> np.ndarray:
+        """Stored feature rows for `ids` in order; unknown ids get NaN rows."""
+        ids = np.asarray(ids, dtype=np.int64)
+        out = np.full((len(ids), len(self.columns)), np.nan, dtype=np.float32)
+        if len(self.ids) == 0:
+            return out
+        pos = np.clip(np.searchsorted(self.ids, ids), 0, len(self.ids) - 1)
+        found = self.ids[pos] == ids
+        out[found] = self.matrix[pos[found]]
+        return out
+
+    def column(self, name: str) -> int:
+        return self.columns.index(name)
+
+
+class FeatureStore:
+    """
+    Versioned feature store. Matrices live under data/feature_store/; each
+    version's manifest (columns, files, source watermarks) is one row in
+    ml_features_cache with entity_id = version, so readers find the latest
+    version with a single indexed query and never see a half-written file.
+    """
+
+    def __init__(self, root: str = FEATURE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._sets: Dict[str, FeatureSet] = {}
+        self._lock = threading.RLock()
+
+    # ---------- manifests ----------
+    def _manifest(self, conn: sqlite3.Connection, entity_type: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT feature_json FROM ml_features_cache WHERE entity_type = ? "
+            "ORDER BY entity_id DESC LIMIT 1", (f"featureset:{entity_type}",)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _watermarks(conn: sqlite3.Connection, entity_type: str) -> Dict[str, int]:
+        return {t: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()[0]
+                for t in WATERMARK_TABLES[entity_type]}
+
+    @staticmethod
+    def _feed(entity_type: str) -> ChangeSubscriber:
+        return ChangeSubscriber(f"feature_store:{entity_type}", tables=WATERMARK_TABLES[entity_type])
+
+    @staticmethod
+    def _updated_ids(conn: sqlite3.Connection, entity_type: str, feed: ChangeSubscriber, head: int) -> List[int]:
+        """
+        Entities touched by updates (e.g. an order status change) per the change
+        feed, up to `head`. Deleted child rows can no longer be traced to their
+        customer; those still need full=True.
+        """
+        changes, position = [], feed.position
+        while position < head:
+            batch = [c for c in feed.poll(after=position) if c["seq"] <= head]
+            if not batch:
+                break
+            changes.extend(batch)
+            position = batch[-1]["seq"]
+        ids = set()
+        for table, rows in rows_by_table(changes).items():
+            if table in ("customers", "leads"):
+                ids.update(rows["upserted"])
+            elif rows["upserted"]:
+                ids.update(r[0] for r in conn.execute(
+                    f"SELECT DISTINCT customer_id FROM {table} WHERE id IN (SELECT value FROM json_each(?)) "
+                    f"AND customer_id IS NOT NULL", (json.dumps(sorted(rows["upserted"])),)))
+        return sorted(ids)
+
+    def _changed_ids(self, conn: sqlite3.Connection, entity_type: str, marks: Dict[str, int]) -> List[int]:
+        """Entities touched by rows added since the watermarks were taken."""
+        if entity_type == "lead":
+            return [r[0] for r in conn.execute("SELECT id FROM leads WHERE id > ?", (marks["leads"],))]
+        ids = set()
+        ids.update(r[0] for r in conn.execute("SELECT id FROM customers WHERE id > ?", (marks["customers"],)))
+        for table in ("orders", "tickets", "payments", "invoices"):
+            ids.update(r[0] for r in conn.execute(
+                f"SELECT DISTINCT customer_id FROM {table} WHERE id > ? AND customer_id IS NOT NULL",
+                (marks[table],)))
+        return sorted(ids)
+
+    # ---------- refresh ----------
+    def refresh(self, entity_type: Optional[str] = None, full: bool = False) -> Dict[str, Any]:
+        """
+        Bring feature sets up to date. Incremental by default: only entities
+        with rows added since the last build (id watermarks) or updated since
+        (change feed) are recomputed and merged in. Before the change feed is
+        migrated in, only added rows are picked up and stats say "updates_tracked": False.
+        """
+        stats = {}
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            for entity in [entity_type] if entity_type else list(BUILDERS):
+                started = time.time()
+                with self._lock:
+                    stats[entity] = self._refresh_one(conn, entity, full)
+                stats[entity]["seconds"] = round(time.time() - started, 3)
+        finally:
+            conn.close()
+        # Cursors have advanced: drop change_log entries every consumer has processed
+        prune_if_due()
+        return stats
+
+    def _refresh_one(self, conn: sqlite3.Connection, entity: str, full: bool) -> Dict[str, Any]:
+        manifest = self._manifest(conn, entity)
+        if manifest and manifest["columns"] != STORED_COLUMNS[entity]:
+            full = True  # feature definitions changed
+        marks = self._watermarks(conn, entity)
+        tracked = has_change_feed(conn)
+        feed = self._feed(entity) if tracked else None
+        head = head_seq(conn) if tracked else 0
+
+        if full or manifest is None:
+            frame = BUILDERS[entity](conn)
+            ids = frame.index.to_numpy(dtype=np.int64)
+            matrix = frame.to_numpy(dtype=np.float32)
+            updated = len(ids)
+        else:
+            changed = set(self._changed_ids(conn, entity, manifest["watermarks"]))
+            if feed is not None:
+                changed |= set(self._updated_ids(conn, entity, feed, head))
+            changed = sorted(changed)
+            if not changed:
+                if feed is not None:
+                    feed.commit(head)
+                return {"version": manifest["version"], "rows": manifest["rows"], "updated": 0,
+                        "updates_tracked": tracked}
+            current = self.load(entity)
+            frame = BUILDERS[entity](conn, changed)
+            new_ids = frame.index.to_numpy(dtype=np.int64)
+            keep = ~np.isin(current.ids, new_ids)
+            ids = np.concatenate([np.asarray(current.ids)[keep], new_ids])
+            matrix = np.vstack([np.asarray(current.matrix)[keep], frame.to_numpy(dtype=np.float32)])
+            order = np.argsort(ids, kind="stable")
+            ids, matrix = ids[order], matrix[order]
+            updated = len(new_ids)
+
+        version = (manifest["version"] + 1) if manifest else 1
+        manifest = self._write(conn, entity, version, ids, matrix, marks)
+        if feed is not None:
+            feed.commit(head)
+        return {"version": version, "rows": manifest["rows"], "updated": updated, "updates_tracked": tracked}
+
+    def _write(self, conn, entity, version, ids, matrix, marks) -> Dict[str, Any]:
+        base = os.path.join(self.root, f"{entity}_v{version}")
+        np.save(base + "_ids.npy", ids)
+        np.save(base + "_x.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+        manifest = {
+            "version": version, "columns": STORED_COLUMNS[entity], "rows": int(len(ids)),
+            "ids_path": base + "_ids.npy", "matrix_path": base + "_x.npy",
+            "watermarks": marks, "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        kind = f"featureset:{entity}"
+        conn.execute("INSERT INTO ml_features_cache (entity_type, entity_id, feature_json) VALUES (?, ?, ?)",
+                     (kind, version, json.dumps(manifest)))
+        stale = conn.execute("SELECT id, feature_json FROM ml_features_cache WHERE entity_type = ? "
+                             "AND entity_id <= ?", (kind, version - KEEP_VERSIONS)).fetchall()
+        for row_id, text in stale:
+            old = json.loads(text)
+            for path in (old["ids_path"], old["matrix_path"]):
+                if os.path.exists(path):
+                    os.remove(path)
+            conn.execute("DELETE FROM ml_features_cache WHERE id = ?", (row_id,))
+        conn.commit()
+        self._sets.pop(entity, None)
+        return manifest
+
+    # ---------- reads ----------
+    def load(self, entity_type: str) -> FeatureSet:
+        """Latest feature set for `entity_type`, building it the first time."""
+        with self._lock:
+            cached = self._sets.get(entity_type)
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                manifest = self._manifest(conn, entity_type)
+            finally:
+                conn.close()
+            if manifest is None or not os.path.exists(manifest["matrix_path"]):
+                self.refresh(entity_type, full=True)
+                return self.load(entity_type)
+            if cached is None or cached.version != manifest["version"]:
+                self._sets[entity_type] = FeatureSet(entity_type, manifest)
+            return self._sets[entity_type]
+
+    def customer_features(self, customer_ids: Sequence[int], as_of: Optional[float] = None) -> pd.DataFrame:
+        """Stored plus derived customer features, one row per id."""
+        fs = self.load("customer")
+        x = fs.rows(customer_ids)
+        frame = pd.DataFrame(x, columns=fs.columns, index=pd.Index(customer_ids, name="customer_id"))
+        today = as_of or _today()
+        frame["recency_days"] = today - frame["last_order_day"]
+        frame["tenure_days"] = today - frame["created_day"]
+        frame["orders_per_month"] = frame["order_count"] / np.maximum(frame["tenure_days"] / 30.0, 1.0)
+        return frame
+
+    def lead_matrix(self, lead_ids: Optional[Sequence[int]] = None, as_of: Optional[float] = None):
+        """
+        (ids, matrix, columns) for leads (all leads if `lead_ids` is None):
+        lead features, derived age and linked customer features, as float32.
+        """
+        fs = self.load("lead")
+        ids = np.asarray(fs.ids if lead_ids is None else lead_ids, dtype=np.int64)
+        x = fs.rows(ids)
+        today = as_of or _today()
+        customer_id = x[:, fs.column("customer_id")]
+        age = today - x[:, fs.column("created_day")]
+        is_customer = (customer_id >= 0).astype(np.float32)
+        customers = self.customer_features(np.where(customer_id >= 0, customer_id, -1).astype(np.int64), today)
+        linked = customers[LEAD_CUSTOMER_FEATURES].to_numpy(dtype=np.float32)
+        own = [c for c in fs.columns if c not in ("created_day", "customer_id")]
+        matrix = np.column_stack([x[:, [fs.column(c) for c in own]], age, is_customer, linked]).astype(np.float32)
+        columns = own + ["age_days", "is_customer"] + [f"customer_{c}" for c in LEAD_CUSTOMER_FEATURES]
+        return ids, matrix, columns
+
+
+_store: Optional[FeatureStore] = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    """Return the process-wide feature store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore()
+        return _store
@@ -0,0 +1,252 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.tools import tool
+
+from tools.bulk_tools import get_bulk_connection
+from tools.feature_store import INTENT_PATTERNS, get_feature_store
+
+DB_PATH = "erp.db"
+MODEL_NAME = "lead_scoring"
+MODEL_DIR = os.path.join("nn", MODEL_NAME)
+
+# Lead statuses used as training labels; other statuses are only scored.
+POSITIVE_STATUSES = ("qualified", "won")
+NEGATIVE_STATUSES = ("lost",)
+MIN_TRAINING_ROWS = 10
+L2 = 1.0
+NEWTON_STEPS = 25
+# How often a process re-checks model_registry for a newer version.
+REGISTRY_CHECK_SECONDS = 30.0
+# Leads scored (and written back) per chunk.
+SCORE_CHUNK_ROWS = 50_000
+
+
+# ------------------------- Model -------------------------
+class LeadScoringModel:
+    """
+    L2-regularised logistic regression over the feature store's lead matrix.
+    Missing values are imputed with the training mean (0 after scaling).
+    The artifact is one .npz of float arrays plus the feature column names.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, mean: np.ndarray, scale: np.ndarray,
+                 columns: List[str], version: str = "unsaved"):
+        self.weights = weights.astype(np.float32)
+        self.bias = np.float32(bias)
+        self.mean = mean.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+        self.columns = list(columns)
+        self.version = version
+
+    @classmethod
+    def fit(cls, x: np.ndarray, y: np.ndarray, columns: List[str], l2: float = L2) -> "LeadScoringModel":
+        mean = np.nanmean(np.where(np.isfinite(x), x, np.nan), axis=0)
+        mean = np.nan_to_num(mean)
+        scale = np.nan_to_num(np.nanstd(np.where(np.isfinite(x), x, np.nan), axis=0))
+        scale[scale == 0] = 1.0
+        z = cls._standardize(x, mean, scale).astype(np.float64)
+        z = np.column_stack([z, np.ones(len(z))])
+        w = np.zeros(z.shape[1])
+        penalty = np.full(z.shape[1], l2)
+        penalty[-1] = 0.0  # no penalty on the bias
+        for _ in range(NEWTON_STEPS):
+            p = 1.0 / (1.0 + np.exp(-z @ w))
+            grad = z.T @ (p - y) + penalty * w
+            hess = (z * (p * (1 - p))[:, None]).T @ z + np.diag(penalty)
+            step = np.linalg.solve(hess, grad)
+            w -= step
+            if np.abs(step).max() < 1e-6:
+                break
+        return cls(w[:-1], w[-1], mean, scale, columns)
+
+    @staticmethod
+    def _standardize(x: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        z = (x - mean) / scale
+        z[~np.isfinite(z)] = 0.0
+        return z
+
+    def predict(self, x: np.ndarray, columns: Optional[List[str]] = None) -> np.ndarray:
+        """Probability of conversion for each row of `x` (float32)."""
+        if columns is not None and list(columns) != self.columns:
+            raise ValueError("Feature columns changed since the model was trained; retrain it.")
+        z = self._standardize(x.astype(np.float32), self.mean, self.scale)
+        return (1.0 / (1.0 + np.exp(-(z @ self.weights + self.bias)))).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale,
+                 columns=np.array(self.columns))
+
+    @classmethod
+    def load(cls, path: str, version: str) -> "LeadScoringModel":
+        data = np.load(path)
+        return cls(data["weights"], float(data["bias"]), data["mean"], data["scale"],
+                   [str(c) for c in data["columns"]], version)
+
+
+# ------------------------- Registry -------------------------
+def _latest_registration(conn: sqlite3.Connection) -> Optional[tuple]:
+    return conn.execute(
+        "SELECT version, path FROM model_registry WHERE name = ? "
+        "ORDER BY CAST(substr(version, 2) AS INTEGER) DESC LIMIT 1", (MODEL_NAME,)
+    ).fetchone()
+
+
+def train_lead_model() -> Dict[str, Any]:
+    """
+    Train on leads with a final status (qualified/won vs. lost), save the
+    artifact under nn/lead_scoring/<version>/ and register it.
+    """
+    store = get_feature_store()
+    store.refresh()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        labeled = conn.execute(
+            f"SELECT id, status IN ({','.join('?' * len(POSITIVE_STATUSES))}) FROM leads "
+            f"WHERE status IN ({','.join('?' * (len(POSITIVE_STATUSES) + len(NEGATIVE_STATUSES)))})",
+            POSITIVE_STATUSES + POSITIVE_STATUSES + NEGATIVE_STATUSES
+        ).fetchall()
+        if len(labeled) < MIN_TRAINING_ROWS:
+            return {"error": f"need at least {MIN_TRAINING_ROWS} qualified/won/lost leads, found {len(labeled)}"}
+        ids = np.array([r[0] for r in labeled], dtype=np.int64)
+        y = np.array([r[1] for r in labeled], dtype=np.float64)
+        _, x, columns = store.lead_matrix(ids)
+        model = LeadScoringModel.fit(x, y, columns)
+
+        latest = _latest_registration(conn)
+        version = f"v{int(latest[0][1:]) + 1}" if latest else "v1"
+        path = os.path.join(MODEL_DIR, version, "model.npz")
+        model.save(path)
+        conn.execute("INSERT INTO model_registry (name, version, path) VALUES (?, ?, ?)",
+                     (MODEL_NAME, version, path))
+        conn.commit()
+    finally:
+        conn.close()
+
+    accuracy = float(((model.predict(x) >= 0.5) == (y == 1)).mean())
+    return {"model": MODEL_NAME, "version": version, "path": path, "training_rows": len(y),
+            "training_accuracy": round(accuracy, 3)}
+
+
+_model: Optional[LeadScoringModel] = None
+_model_checked = 0.0
+_model_lock = threading.Lock()
+
+
+def get_lead_model() -> Optional[LeadScoringModel]:
+    """The latest registered model, loaded once per process and per version."""
+    global _model, _model_checked
+    with _model_lock:
+        if _model is not None and time.time() - _model_checked < REGISTRY_CHECK_SECONDS:
+            return _model
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            latest = _latest_registration(conn)
+        finally:
+            conn.close()
+        _model_checked = time.time()
+        if latest is None or not os.path.exists(latest[1]):
+            return None
+        if _model is None or _model.version != latest[0]:
+            _model = LeadScoringModel.load(latest[1], latest[0])
+        return _model
+
+
+# ------------------------- Batch Scoring -------------------------
+def score_leads(lead_ids: Optional[Sequence[int]] = None, write: bool = True) -> Dict[str, Any]:
+    """
+    Score leads (all of them if `lead_ids` is None) in vectorized chunks and,
+    with `write`, store the scores in leads.score in one transaction per chunk.
+    Trains a first model if none is registered yet. Requested ids with no
+    lead behind them are not scored and are listed under "unknown_ids".
+    """
+    started = time.time()
+    model = get_lead_model()
+    if model is None:
+        trained = train_lead_model()
+        if "error" in trained:
+            return trained
+        model = get_lead_model()
+
+    store = get_feature_store()
+    store.refresh()
+    known = store.load("lead").ids
+    if lead_ids is None:
+        all_ids, unknown = np.asarray(known, dtype=np.int64), []
+    else:
+        requested = np.unique(np.asarray(lead_ids, dtype=np.int64))
+        found = np.isin(requested, known)
+        all_ids, unknown = requested[found], requested[~found].tolist()
+    conn = get_bulk_connection() if write else None
+    scored: List[tuple] = []
+    written = 0
+    try:
+        for start in range(0, len(all_ids), SCORE_CHUNK_ROWS):
+            ids, x, columns = store.lead_matrix(all_ids[start:start + SCORE_CHUNK_ROWS])
+            scores = np.round(model.predict(x, columns).astype(np.float64), 4)
+            rows = list(zip(scores.tolist(), ids.tolist()))
+            if write:
+                conn.execute("BEGIN")
+                written += max(conn.executemany("UPDATE leads SET score = ? WHERE id = ?", rows).rowcount, 0)
+                conn.execute("COMMIT")
+            scored.extend(rows)
+    finally:
+        if conn is not None:
+            conn.close()
+
+    seconds = time.time() - started
+    top = sorted(scored, reverse=True)[:5]
+    return {
+        "model_version": model.version,
+        "scored": len(scored),
+        "written": written,
+        "unknown_ids": unknown[:20],
+        "seconds": round(seconds, 3),
+        "leads_per_sec": round(len(scored) / seconds) if seconds > 0 else None,
+        "top": [{"lead_id": i, "score": s} for s, i in top],
+    }
+
+
+def score_lead_text(message: str) -> Optional[float]:
+    """
+    Score a lead that is not in the database yet from its message alone
+    (new, no linked customer). Read-only; None when no model is registered.
+    """
+    model = get_lead_model()
+    if model is None:
+        return None
+    text = (message or "").lower()
+    features = {"message_words": len(text.split()), "age_days": 0.0, "is_customer": 0.0}
+    for column, pattern in INTENT_PATTERNS.items():
+        features[column] = float(bool(re.search(pattern, text)))
+    # Customer features stay NaN and are imputed with the training mean
+    x = np.array([[features.get(c, np.nan) for c in model.columns]], dtype=np.float32)
+    return round(float(model.predict(x)[0]), 4)
+
+
+# ------------------------- Tools -------------------------
+@tool
+def rescore_leads(lead_ids: str = "all") -> Dict[str, Any]:
+    """
+    Re-score leads with the lead-scoring model and save the scores to leads.score.
+    Input: "all", or lead ids separated by commas (e.g. "12, 15, 40").
+    Returns how many leads were scored and the highest scores.
+    """
+    text = (lead_ids or "all").strip().lower()
+    try:
+        ids = None if text in ("", "all") else [int(i) for i in text.replace(" ", "").split(",") if i]
+    except ValueError:
+        return {"error": "lead_ids must be 'all' or comma-separated integers"}
+    try:
+        return score_leads(ids)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+LEAD_SCORING_TOOLS = [rescore_leads]
@@ -0,0 +1,259 @@
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+DB_PATH = "erp.db"
+
+# Every catalogue entry stays compiled in the per-thread statement cache; the
+# headroom covers the sandbox / ad-hoc statements that share the connection.
+STATEMENT_CACHE_SIZE = 256
+
+Params = Union[Sequence[Any], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    name: str
+    sql: str
+    description: str = ""
+    tables: tuple = field(default_factory=tuple)
+
+
+QUERY_CATALOG: Dict[str, CatalogQuery] = {}
+
+_local = threading.local()
+
+
+# ------------------------- Registration -------------------------
+def _tables_in(sql: str) -> tuple:
+    found = re.findall(r"\b(?:from|join)\s+([A-Za-z_]\w*)", sql, flags=re.I)
+    return tuple(dict.fromkeys(t.lower() for t in found))
+
+
+def register_query(name: str, sql: str, description: str = "") -> CatalogQuery:
+    """
+    Register a fixed, parameterized query under `name`.
+    The SQL text must not change between calls: SQLite's statement cache is
+    keyed by the exact string, so literals belong in parameters.
+    """
+    if name in QUERY_CATALOG:
+        raise ValueError(f"Query '{name}' is already registered")
+    sql = "\n".join(line.strip() for line in sql.strip().splitlines())
+    entry = CatalogQuery(name=name, sql=sql, description=description, tables=_tables_in(sql))
+    QUERY_CATALOG[name] = entry
+    return entry
+
+
+# ------------------------- Execution -------------------------
+def get_catalog_connection() -> sqlite3.Connection:
+    """
+    Return this thread's long-lived catalogue connection.
+    Keeping it open is what lets compiled statements be reused across tool calls.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=5000;")
+        _local.conn = conn
+    return conn
+
+
+def run_query(name: str, params: Params = ()) -> List[Dict[str, Any]]:
+    """Execute a catalogue query and return rows as dicts, or [{"error": ...}] like execute_query()."""
+    try:
+        entry = QUERY_CATALOG[name]
+        conn = get_catalog_connection()
+        rows = conn.execute(entry.sql, params).fetchall()
+        return [dict(r) for r in rows]
+    except KeyError:
+        return [{"error": f"Unknown catalogue query '{name}'"}]
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+def run_query_one(name: str, params: Params = ()) -> Dict[str, Any]:
+    """Execute a catalogue query expected to return a single row."""
+    rows = run_query(name, params)
+    return rows[0] if rows else {}
+
+
+# ------------------------- Introspection -------------------------
+def list_queries() -> List[Dict[str, Any]]:
+    """Return every registered query (name, sql, description, tables)."""
+    return [
+        {"name": q.name, "sql": q.sql, "description": q.description, "tables": list(q.tables)}
+        for q in QUERY_CATALOG.values()
+    ]
+
+
+def explain_query(name: str, params: Optional[Params] = None) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN lines for a catalogue query."""
+    entry = QUERY_CATALOG[name]
+    if params is None:
+        params = {k: None for k in re.findall(r":(\w+)", entry.sql)} or [None] * entry.sql.count("?")
+    conn = get_catalog_connection()
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {entry.sql}", params)]
+
+
+# ====================== Sales Queries =========================
+# "(:x IS NULL OR id = :x)" cannot use the primary key, so by-id lookups get their own entries
+register_query("customers.by_id", "SELECT * FROM customers WHERE id = ?", "One customer by id")
+register_query("customers.search", """
+    SELECT * FROM customers
+    WHERE (:name IS NULL OR name LIKE '%' || :name || '%')
+      AND (:email IS NULL OR email LIKE '%' || :email || '%')
+      AND (:phone IS NULL OR phone LIKE '%' || :phone || '%')
+""", "Customers filtered by name, email, phone substrings")
+
+register_query("orders.all", "SELECT * FROM orders", "All orders")
+register_query("orders.by_id", "SELECT * FROM orders WHERE id = ?", "One order by id")
+register_query("orders.by_customer", "SELECT * FROM orders WHERE customer_id = ?", "Orders of one customer")
+
+register_query("leads.by_id", "SELECT * FROM leads WHERE id = ?", "One lead by id")
+register_query("leads.search", """
+    SELECT * FROM leads
+    WHERE (:contact_email IS NULL OR contact_email LIKE '%' || :contact_email || '%')
+      AND (:status IS NULL OR status = :status)
+""", "Leads filtered by contact_email substring and/or status")
+
+# ====================== Inventory Queries =========================
+register_query("stock.by_product", """
+    SELECT p.id AS product_id, p.sku, p.name AS product_name, s.qty_on_hand, s.reorder_point
+    FROM stock s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.product_id = ?
+""", "Stock on hand and reorder point of one product")
+
+register_query("stock.below_reorder", """
+    SELECT p.id AS product_id, p.sku, p.name AS product_name, s.qty_on_hand, s.reorder_point
+    FROM stock s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.qty_on_hand <= s.reorder_point
+    ORDER BY s.qty_on_hand - s.reorder_point ASC
+""", "Products at or below their reorder point, most short first")
+
+# ====================== Sales Analytics Queries =========================
+register_query("sales.top_customers", """
+    SELECT c.name AS customer_name,
+           COUNT(o.id) AS order_count,
+           SUM(o.total) AS total_value
+    FROM customers c
+    JOIN orders o ON c.id = o.customer_id
+    GROUP BY c.id, c.name
+    ORDER BY total_value DESC
+    LIMIT 10
+""", "Top 10 customers by total order value")
+
+register_query("sales.by_status", """
+    SELECT status,
+           COUNT(*) AS order_count,
+           SUM(total) AS total_value
+    FROM orders
+    GROUP BY status
+""", "Order count and value per order status")
+
+register_query("sales.monthly_since", """
+    SELECT strftime('%Y-%m', created_at) AS month,
+           COUNT(*) AS order_count,
+           SUM(total) AS total_value
+    FROM orders
+    WHERE created_at >= :since
+    GROUP BY month
+    ORDER BY month ASC
+""", "Monthly order count and value since a date")
+
+register_query("sales.avg_order_value", "SELECT AVG(total) AS avg_order_value FROM orders",
+               "Average order value")
+
+register_query("customers.new_monthly_since", """
+    SELECT strftime('%Y-%m', created_at) AS month,
+           COUNT(*) AS new_customers
+    FROM customers
+    WHERE created_at >= :since
+    GROUP BY month
+    ORDER BY month ASC
+""", "New customers per month since a date")
+
+# ====================== Product Analytics Queries =========================
+register_query("products.top_by_sales", """
+    SELECT p.name AS product_name,
+           SUM(oi.quantity) AS total_sold,
+           SUM(oi.price * oi.quantity) AS total_revenue
+    FROM products p
+    JOIN order_items oi ON p.id = oi.product_id
+    GROUP BY p.id, p.name
+    ORDER BY total_sold DESC
+    LIMIT 10
+""", "Top 10 products by units sold")
+
+register_query("products.top_by_reviews", """
+    SELECT p.name AS product_name,
+           COUNT(r.id) AS review_count,
+           AVG(r.rating) AS avg_rating
+    FROM products p
+    LEFT JOIN reviews r ON p.id = r.product_id
+    GROUP BY p.id, p.name
+    ORDER BY avg_rating DESC
+    LIMIT 10
+""", "Top 10 products by average review rating")
+
+register_query("products.inventory", """
+    SELECT p.name AS product_name, COALESCE(s.qty_on_hand, 0) AS stock_quantity
+    FROM products p
+    LEFT JOIN stock s ON s.product_id = p.id
+    ORDER BY stock_quantity ASC
+""", "Products ordered from lowest to highest stock on hand")
+
+# ====================== Customer Analytics Queries =========================
+register_query("customers.growth_monthly", """
+    SELECT strftime('%Y-%m', created_at) AS month,
+           COUNT(*) AS new_customers
+    FROM customers
+    GROUP BY month
+    ORDER BY month ASC
+""", "New customers per month, all time")
+
+register_query("customers.activity", """
+    SELECT c.name AS customer_name,
+           COUNT(o.id) AS order_count,
+           SUM(o.total) AS total_spent
+    FROM customers c
+    LEFT JOIN orders o ON c.id = o.customer_id
+    GROUP BY c.id, c.name
+    ORDER BY total_spent DESC
+""", "Orders placed and total spent per customer")
+
+register_query("leads.status_summary", """
+    SELECT status,
+           COUNT(*) AS count,
+           AVG(CASE WHEN score IS NOT NULL THEN score ELSE 0 END) AS avg_score
+    FROM leads
+    GROUP BY status
+""", "Lead count and average score per status")
+
+# ====================== Financial Queries =========================
+register_query("finance.total_revenue", "SELECT SUM(total) AS total_revenue FROM orders",
+               "Total order revenue")
+
+# products has no cost column; unit cost is the average supplier default_cost
+register_query("finance.total_cost", """
+    SELECT SUM(oi.quantity * COALESCE(pc.unit_cost, 0)) AS total_cost
+    FROM order_items oi
+    LEFT JOIN (SELECT product_id, AVG(default_cost) AS unit_cost
+               FROM supplier_products GROUP BY product_id) pc ON pc.product_id = oi.product_id
+""", "Cost of goods sold across all order items")
+
+register_query("finance.summary_excluding_status", """
+    SELECT
+        SUM(oi.price * oi.quantity) AS total_revenue,
+        SUM(COALESCE(pc.unit_cost, 0) * oi.quantity) AS total_cost,
+        SUM(oi.price * oi.quantity) - SUM(COALESCE(pc.unit_cost, 0) * oi.quantity) AS total_profit
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.id
+    LEFT JOIN (SELECT product_id, AVG(default_cost) AS unit_cost
+               FROM supplier_products GROUP BY product_id) pc ON pc.product_id = oi.product_id
+    WHERE o.status != :excluded_status
+""", "Revenue, cost and profit of order items, excluding orders with a given status")
@@ -0,0 +1,181 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DB_PATH = "erp.db"
+
+# ------------------------- Sandbox Limits -------------------------
+# Rows returned to the agent. One extra row is fetched to detect truncation.
+MAX_ROWS = 200
+# Wall-clock budget for one query, in seconds.
+QUERY_TIMEOUT_SECONDS = 5.0
+# SQLite VM instruction budget for one query.
+MAX_VM_STEPS = 50_000_000
+# How often (in VM instructions) the progress handler runs.
+PROGRESS_INTERVAL = 10_000
+# A join whose unindexed full scans multiply past this many row visits is rejected.
+MAX_SCAN_PRODUCT = 5_000_000
+# Size assumed for plan nodes that don't map to a real table (CTEs, subqueries).
+UNKNOWN_TABLE_ROWS = 1_000
+
+ALLOWED_PREFIXES = ("select", "with")
+
+_local = threading.local()
+_table_rows_cache: Dict[str, int] = {}
+_table_rows_checked_at = 0.0
+TABLE_ROWS_TTL_SECONDS = 60.0
+
+
+class QueryRejected(Exception):
+    """Raised when a query is refused before it reaches the database."""
+
+
+# ------------------------- Connection -------------------------
+def get_readonly_connection() -> sqlite3.Connection:
+    """
+    Return this thread's read-only connection to the ERP database.
+    Opened with mode=ro so LLM-generated SQL can never write or take a write lock.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        uri = f"file:{os.path.abspath(DB_PATH)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=ON;")
+        _local.conn = conn
+    return conn
+
+
+# ------------------------- Guards -------------------------
+# String literals / quoted identifiers, then comments. Matching them in one
+# alternation keeps "--" inside a literal and a quote inside a comment intact.
+_SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|--[^\n]*|/\*.*?(?:\*/|$)""", re.S)
+
+
+def _strip_sql(query: str) -> str:
+    query = _SQL_TOKENS.sub(lambda m: m.group(1) or " ", query)
+    return query.strip().rstrip(";").strip()
+
+
+def _check_statement(query: str) -> None:
+    if not query:
+        raise QueryRejected("Empty query.")
+    if not query.lower().startswith(ALLOWED_PREFIXES):
+        raise QueryRejected("Only SELECT / WITH queries are allowed in the query sandbox.")
+
+
+def _table_rows(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Approximate row counts per table from MAX(rowid), cached for a minute."""
+    global _table_rows_checked_at
+    if _table_rows_cache and time.time() - _table_rows_checked_at < TABLE_ROWS_TTL_SECONDS:
+        return _table_rows_cache
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
+    )]
+    counts = {}
+    for t in tables:
+        try:
+            counts[t.lower()] = conn.execute(f'SELECT MAX(rowid) FROM "{t}";').fetchone()[0] or 0
+        except sqlite3.DatabaseError:
+            # WITHOUT ROWID tables / virtual tables
+            counts[t.lower()] = UNKNOWN_TABLE_ROWS
+    _table_rows_cache.clear()
+    _table_rows_cache.update(counts)
+    _table_rows_checked_at = time.time()
+    return _table_rows_cache
+
+
+def _alias_map(query: str, known_tables: Dict[str, int]) -> Dict[str, str]:
+    """Map aliases used in FROM/JOIN clauses back to table names."""
+    aliases = {}
+    pattern = r"\b(?:from|join)\s+([A-Za-z_][\w]*)(?:\s+(?:as\s+)?([A-Za-z_][\w]*))?"
+    for table, alias in re.findall(pattern, query, flags=re.I):
+        table = table.lower()
+        if table not in known_tables:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in ("on", "join", "where", "group", "order", "limit",
+                                          "left", "right", "inner", "outer", "cross", "natural", "using"):
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def _check_plan(conn: sqlite3.Connection, query: str, params: tuple) -> None:
+    """
+    Reject cartesian-style plans: two or more unindexed full scans nested in the
+    same loop whose estimated row visits multiply past MAX_SCAN_PRODUCT.
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    known = _table_rows(conn)
+    aliases = _alias_map(query, known)
+
+    scans_by_parent: Dict[int, List[int]] = {}
+    for node_id, parent, _, detail in plan:
+        m = re.match(r"SCAN (\S+)$", detail)
+        if not m:
+            # "SCAN x USING INDEX ..." and "SEARCH ..." are bounded by an index
+            continue
+        table = aliases.get(m.group(1).lower())
+        rows = known.get(table, UNKNOWN_TABLE_ROWS) if table else UNKNOWN_TABLE_ROWS
+        scans_by_parent.setdefault(parent, []).append(max(rows, 1))
+
+    for parent, sizes in scans_by_parent.items():
+        if len(sizes) < 2:
+            continue
+        product = 1
+        for s in sizes:
+            product *= s
+        if product > MAX_SCAN_PRODUCT:
+            raise QueryRejected(
+                f"Query plan joins {len(sizes)} tables by full scans (~{product:,} row visits). "
+                "Add a join condition on an indexed column (e.g. an id foreign key) or filter first."
+            )
+
+
+# ------------------------- Execution -------------------------
+def run_sandboxed_query(query: str, params: tuple = (), max_rows: int = MAX_ROWS,
+                        timeout: float = QUERY_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Execute an untrusted SELECT on the read-only connection with an instruction
+    budget, a wall-clock timeout, an injected LIMIT and a cartesian-plan check.
+    Returns rows as dicts, or [{"error": ...}] like execute_query().
+    A trailing {"truncated": True, ...} row marks results cut at max_rows.
+    """
+    try:
+        query = _strip_sql(query)
+        _check_statement(query)
+        conn = get_readonly_connection()
+        _check_plan(conn, query, params)
+
+        deadline = time.monotonic() + timeout
+        steps = 0
+
+        def progress() -> int:
+            nonlocal steps
+            steps += PROGRESS_INTERVAL
+            # Non-zero aborts the statement with "interrupted"
+            return 1 if steps > MAX_VM_STEPS or time.monotonic() > deadline else 0
+
+        limited = f"SELECT * FROM ({query}) LIMIT {int(max_rows) + 1}"
+        conn.set_progress_handler(progress, PROGRESS_INTERVAL)
+        try:
+            rows = conn.execute(limited, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                reason = "time limit" if time.monotonic() > deadline else "instruction budget"
+                return [{"error": f"Query aborted: exceeded the sandbox {reason}. Narrow it with filters or aggregates."}]
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        result = [dict(r) for r in rows[:max_rows]]
+        if len(rows) > max_rows:
+            result.append({"truncated": True, "limit": max_rows})
+        return result
+    except QueryRejected as e:
+        return [{"error": f"Query rejected: {e}"}]
+    except Exception as e:
+        return [{"error": str(e)}]
@@ -0,0 +1,275 @@
+import difflib
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.schema import get_schema
+from tools.query_sandbox import get_readonly_connection, run_sandboxed_query
+from tools.columnar import run_offloaded_query
+
+# Repair passes before giving up; each pass fixes one error SQLite reports.
+MAX_REPAIR_PASSES = 4
+FUZZY_CUTOFF = 0.75
+
+# Names LLMs commonly guess for this schema, mapped to where the data really lives.
+# These change what is being asked, so they are only suggested (with the SQL
+# they would give), never applied; only misspellings are repaired automatically.
+COLUMN_SYNONYMS = {
+    "stock_quantity": "stock.qty_on_hand",
+    "quantity_on_hand": "stock.qty_on_hand",
+    "stock_level": "stock.qty_on_hand",
+    "reorder_level": "stock.reorder_point",
+    "unit_price": "price",
+    "cost": "supplier_products.default_cost",
+    "unit_cost": "supplier_products.default_cost",
+    "order_date": "created_at",
+    "amount": "total",
+    "customer_email": "email",
+}
+
+KEYWORD_TYPOS = {
+    "SELCT": "SELECT", "SLECT": "SELECT", "FORM": "FROM", "FRON": "FROM",
+    "WHRE": "WHERE", "WEHRE": "WHERE", "GROUPBY": "GROUP BY", "ORDERBY": "ORDER BY",
+}
+
+
+# ------------------------- Helpers -------------------------
+def _aliases(sql: str, tables: Dict[str, Any]) -> Dict[str, str]:
+    """alias/table name -> table for every known table in FROM/JOIN clauses."""
+    found = {}
+    pattern = r"\b(?:from|join)\s+([A-Za-z_]\w*)(?:\s+(?:as\s+)?([A-Za-z_]\w*))?"
+    for table, alias in re.findall(pattern, sql, flags=re.I):
+        if table in tables:
+            found[table] = table
+            if alias and alias.lower() not in _RESERVED:
+                found[alias] = table
+    return found
+
+
+_RESERVED = {"on", "join", "where", "group", "order", "limit", "left", "right", "inner",
+             "outer", "cross", "natural", "using", "having", "union"}
+
+
+def _prepare(conn: sqlite3.Connection, sql: str, params: tuple) -> Optional[str]:
+    """Compile `sql` without running it. Returns SQLite's error message, or None."""
+    try:
+        conn.execute(f"EXPLAIN {sql}", params or [None] * sql.count("?"))
+        return None
+    except sqlite3.Error as e:
+        return str(e)
+
+
+def _closest(name: str, candidates: List[str]) -> Optional[str]:
+    match = difflib.get_close_matches(name.lower(), [c.lower() for c in candidates], n=1, cutoff=FUZZY_CUTOFF)
+    if not match:
+        return None
+    return next(c for c in candidates if c.lower() == match[0])
+
+
+def _close_all(name: str, candidates: List[str]) -> List[str]:
+    lowered = [c.lower() for c in candidates]
+    return [candidates[lowered.index(m)] for m in
+            difflib.get_close_matches(name.lower(), lowered, n=len(candidates), cutoff=FUZZY_CUTOFF)]
+
+
+def _replace_ref(sql: str, old: str, new: str) -> str:
+    """
+    Replace the column reference `old` with `new` where it is used as a column:
+    not inside string literals, not as an alias (AS old, FROM t old), a
+    qualifier (old.x) or a function name.
+    """
+    def used_as_column(prefix: str) -> bool:
+        return not (re.search(r"\bas\s+$", prefix, flags=re.I) or
+                    re.search(r"\b(?:from|join)\s+\w+\s+$", prefix, flags=re.I))
+
+    pattern = re.compile(rf"(?<![\w.]){re.escape(old)}(?![\w.(])")
+    parts = re.split(r"('(?:[^']|'')*')", sql)  # leave string literals alone
+    for i in range(0, len(parts), 2):
+        text, before = parts[i], "".join(parts[:i])
+        parts[i] = pattern.sub(lambda m: new if used_as_column(before + text[:m.start()]) else m.group(0), text)
+    return "".join(parts)
+
+
+# ------------------------- Repairs -------------------------
+def _repair_table(sql: str, missing: str, tables: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    target = _closest(missing, list(tables)) or (missing + "s" if missing + "s" in tables else None)
+    if not target:
+        return None
+    fixed = re.sub(rf"(\b(?:from|join)\s+){re.escape(missing)}\b", rf"\g<1>{target}", sql, flags=re.I)
+    return fixed, f"table {missing} -> {target}"
+
+
+def _join_for(sql: str, owner: str, target: str, tables: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Add `LEFT JOIN target` right after `FROM owner [alias]` when one of the two
+    tables references the other by foreign key. Returns (new_sql, join_alias).
+    """
+    matches = list(re.finditer(rf"\bfrom\s+{re.escape(owner)}\b(?:\s+(?:as\s+)?([A-Za-z_]\w*))?",
+                               sql, flags=re.I))
+    if len(matches) != 1:
+        return None
+    m = matches[0]
+    alias = m.group(1)
+    if alias and alias.lower() in _RESERVED:
+        alias, end = None, m.start(1)
+    else:
+        end = m.end()
+    owner_ref = alias or owner
+    join_alias = f"{target}_j"
+
+    to_owner = [(c, rc) for c, (t, rc) in tables[target]["foreign_keys"].items() if t == owner]
+    to_target = [(c, rc) for c, (t, rc) in tables[owner]["foreign_keys"].items() if t == target]
+    if to_owner:
+        condition = f"{join_alias}.{to_owner[0][0]} = {owner_ref}.{to_owner[0][1] or 'id'}"
+    elif to_target:
+        condition = f"{join_alias}.{to_target[0][1] or 'id'} = {owner_ref}.{to_target[0][0]}"
+    else:
+        return None
+    sql = f"{sql[:end].rstrip()} LEFT JOIN {target} {join_alias} ON {condition} {sql[end:].lstrip()}".rstrip()
+    return sql, join_alias
+
+
+def _repair_column(sql: str, missing: str, tables: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Fix a misspelt column, but only when exactly one column of the queried tables is close to it."""
+    qualifier, _, column = missing.rpartition(".")
+    aliases = _aliases(sql, tables)
+    in_query = [aliases[qualifier]] if qualifier in aliases else list(dict.fromkeys(aliases.values()))
+    targets = {c for table in in_query for c in _close_all(column, [c["name"] for c in tables[table]["columns"]])}
+    if len(targets) != 1:
+        return None
+    new_ref = f"{qualifier}.{targets.pop()}" if qualifier else targets.pop()
+    return _replace_ref(sql, missing, new_ref), f"column {missing} -> {new_ref}"
+
+
+def _synonym_fix(sql: str, missing: str, tables: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """The query with a COLUMN_SYNONYMS substitution (joining the owning table if needed), for suggestions."""
+    qualifier, _, column = missing.rpartition(".")
+    aliases = _aliases(sql, tables)
+    in_query = [qualifier] if qualifier in aliases else list(dict.fromkeys(aliases))
+
+    # 1. Same table(s)
+    for ref in in_query:
+        columns = [c["name"] for c in tables[aliases[ref]]["columns"]]
+        synonym = COLUMN_SYNONYMS.get(column.lower())
+        if synonym in columns:
+            new_ref = f"{qualifier}.{synonym}" if qualifier else synonym
+            return _replace_ref(sql, missing, new_ref), f"column {missing} -> {new_ref}"
+
+    # 2. Column lives in a related table: join it in
+    synonym = COLUMN_SYNONYMS.get(column.lower(), "")
+    if "." in synonym:
+        target_table, target_col = synonym.split(".")
+        if target_table in aliases.values():
+            refs = [a for a, t in aliases.items() if t == target_table and a != t]
+            new_ref = f"{refs[0] if refs else target_table}.{target_col}"
+            return _replace_ref(sql, missing, new_ref), f"column {missing} -> {new_ref}"
+        for table in dict.fromkeys(aliases[ref] for ref in in_query):
+            joined = _join_for(sql, table, target_table, tables)
+            if joined:
+                new_sql, join_alias = joined
+                return _replace_ref(new_sql, missing, f"{join_alias}.{target_col}"), \
+                    f"column {missing} -> {target_table}.{target_col} (joined {target_table})"
+    return None
+
+
+def _repair_keywords(sql: str) -> Optional[Tuple[str, str]]:
+    fixed, notes = sql, []
+    for typo, keyword in KEYWORD_TYPOS.items():
+        fixed, n = re.subn(rf"\b{typo}\b", keyword, fixed, flags=re.I)
+        if n:
+            notes.append(f"keyword {typo} -> {keyword}")
+    return (fixed, ", ".join(notes)) if notes else None
+
+
+def _suggestions(error: str, sql: str, tables: Dict[str, Any]) -> List[str]:
+    m = re.search(r"no such column: ([\w.]+)", error)
+    if m:
+        column = m.group(1).rpartition(".")[2]
+        owners = [f"{t}.{c['name']}" for t, info in tables.items() for c in info["columns"]
+                  if difflib.SequenceMatcher(None, column.lower(), c["name"].lower()).ratio() >= 0.6]
+        synonym = COLUMN_SYNONYMS.get(column.lower())
+        if synonym:
+            owners.insert(0, synonym if "." in synonym else next(
+                (f"{t}.{synonym}" for t in dict.fromkeys(_aliases(sql, tables).values())
+                 if any(c["name"] == synonym for c in tables[t]["columns"])), synonym))
+        return list(dict.fromkeys(owners))[:5]
+    m = re.search(r"no such table: (\w+)", error)
+    if m:
+        return difflib.get_close_matches(m.group(1), list(tables), n=3, cutoff=0.5)
+    return []
+
+
+# ------------------------- Validation -------------------------
+def validate_sql(sql: str, params: tuple = ()) -> Dict[str, Any]:
+    """
+    Compile `sql` against the read-only connection and try deterministic repairs
+    of unambiguous misspellings (table and column names, keyword typos).
+    Returns {"ok", "sql", "repairs", "error", "suggestions"}; when a column was
+    guessed under another name (COLUMN_SYNONYMS), a failure also carries
+    "suggested_sql" and "suggested_change" for the caller to accept or not.
+    """
+    tables = get_schema()
+    conn = get_readonly_connection()
+    repairs: List[str] = []
+    current = sql.strip().rstrip(";")
+    error = None
+
+    for _ in range(MAX_REPAIR_PASSES + 1):
+        error = _prepare(conn, current, params)
+        if error is None:
+            return {"ok": True, "sql": current, "repairs": repairs}
+        if len(repairs) >= MAX_REPAIR_PASSES:
+            break
+
+        fix = None
+        column = re.search(r"no such column: ([\w.]+)", error)
+        table = re.search(r"no such table: (?:main\.)?(\w+)", error)
+        if column:
+            fix = _repair_column(current, column.group(1), tables)
+        elif table:
+            fix = _repair_table(current, table.group(1), tables)
+        elif "syntax error" in error:
+            fix = _repair_keywords(current)
+        if not fix or fix[0] == current:
+            break
+        current, note = fix
+        repairs.append(note)
+
+    result = {
+        "ok": False,
+        "sql": current,
+        "repairs": repairs,
+        "error": error,
+        "suggestions": _suggestions(error or "", current, tables),
+    }
+    column = re.search(r"no such column: ([\w.]+)", error or "")
+    suggested = _synonym_fix(current, column.group(1), tables) if column else None
+    if suggested and _prepare(conn, suggested[0], params) is None:
+        result["suggested_sql"], result["suggested_change"] = suggested
+    return result
+
+
+def run_validated_query(sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    """
+    Validate (and auto-repair) `sql`, then run it in the query sandbox, or on
+    the columnar snapshot when the cost estimate favours it (tools/columnar.py).
+    Invalid SQL returns [{"error", "suggestions"}] (plus "suggested_sql" when a
+    renamed column would fix it) without touching the data; repaired SQL gets
+    a trailing {"auto_repaired": [...], "sql": ...} row.
+    """
+    result = validate_sql(sql, params)
+    if not result["ok"]:
+        diagnostic = {"error": result["error"], "suggestions": result["suggestions"]}
+        if result["repairs"]:
+            diagnostic["partial_repairs"] = result["repairs"]
+        if "suggested_sql" in result:
+            diagnostic["suggested_sql"] = result["suggested_sql"]
+            diagnostic["suggested_change"] = result["suggested_change"]
+        return [diagnostic]
+    # Large scans go to the columnar snapshot when one is fresh enough
+    rows = run_offloaded_query(result["sql"], params)
+    if rows is None:
+        rows = run_sandboxed_query(result["sql"], params)
+    if result["repairs"] and not (rows and "error" in rows[0]):
+        rows.append({"auto_repaired": result["repairs"], "sql": result["sql"]})
+    return rows
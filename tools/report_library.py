@@ -0,0 +1,220 @@
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain.tools import tool
+
+from config.schema import get_columns
+from tools.query_sandbox import run_sandboxed_query
+from tools.vector_index import embed, get_vector_index
+
+DB_PATH = "erp.db"
+
+# Title similarity needed to offer a saved report to the agent...
+MATCH_THRESHOLD = 0.5
+# ...and to answer straight from the library without running the agent at all.
+DIRECT_ANSWER_THRESHOLD = 0.75
+RESULT_CACHE_TTL_SECONDS = 300
+MAX_CACHED_RESULTS = 256
+
+# The user question being served, so generated SQL can be saved under it.
+current_question: ContextVar[Optional[str]] = ContextVar("current_question", default=None)
+# The latest successful generated SQL of that request. A mutable holder,
+# because tools run in a copy of the caller's context.
+_pending_sql: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar("pending_sql", default=None)
+
+_result_cache: Dict[int, Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+# One connection whose PRAGMA data_version stamps the cache: the counter is
+# per connection, so values read on different threads' connections don't compare.
+_version_conn: Optional[sqlite3.Connection] = None
+
+
+def set_current_question(question: Optional[str]) -> None:
+    """Record the question being answered on this thread/task."""
+    current_question.set(question.strip() if question else None)
+    _pending_sql.set({"sql": None})
+
+
+def migrate_report_library(conn: sqlite3.Connection) -> str:
+    """
+    Add saved_reports.validated (run by `python -m tools.bulk_tools migrate`).
+    Reports written by people are validated (1); reports saved automatically
+    from generated SQL are not (0) and are only offered to the agent, never
+    used to answer without it.
+    """
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(saved_reports)")}
+    if "validated" not in columns:
+        conn.execute("ALTER TABLE saved_reports ADD COLUMN validated INTEGER NOT NULL DEFAULT 1")
+        conn.commit()
+        return "added validated"
+    return "ok"
+
+
+def _has_validated_column() -> bool:
+    return "validated" in get_columns("saved_reports")
+
+
+def _normalize_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql.strip().rstrip(";")).lower()
+
+
+# ------------------------- Matching -------------------------
+def _validated_ids(ids: List[int]) -> set:
+    if not _has_validated_column():
+        return set(ids)  # not migrated yet: nothing has been auto-saved, every report is hand-written
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        marks = ",".join("?" * len(ids))
+        return {r[0] for r in conn.execute(
+            f"SELECT id FROM saved_reports WHERE validated = 1 AND id IN ({marks})", ids)}
+    finally:
+        conn.close()
+
+
+def match_report(question: str, threshold: float = MATCH_THRESHOLD,
+                 validated_only: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Find the saved report whose title best matches `question`.
+    Candidates come from the vector index; the winner is re-scored by cosine
+    similarity of title vectors so the threshold is comparable across queries.
+    With validated_only, auto-saved (unvalidated) reports are ignored.
+    """
+    hits = get_vector_index().search(question, k=3, source="saved_reports")
+    if hits and validated_only:
+        allowed = _validated_ids([int(h["source_id"]) for h in hits])
+        hits = [h for h in hits if int(h["source_id"]) in allowed]
+    if not hits:
+        return None
+    q = embed(question)
+    best = None
+    for h in hits:
+        title, _, sql = h["text"].partition("\n")
+        score = float(q @ embed(title))
+        if best is None or score > best["score"]:
+            best = {"id": int(h["source_id"]), "title": title, "sql": sql, "score": round(score, 4)}
+    return best if best and best["score"] >= threshold else None
+
+
+# ------------------------- Execution -------------------------
+def run_report(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Run a saved report's SQL in the query sandbox, caching results until the
+    database changes (PRAGMA data_version) or the TTL expires.
+    """
+    global _version_conn
+    now = time.time()
+    with _cache_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        data_version = _version_conn.execute("PRAGMA data_version;").fetchone()[0]
+        cached = _result_cache.get(report["id"])
+        if cached and cached["data_version"] == data_version and now - cached["at"] < RESULT_CACHE_TTL_SECONDS:
+            return cached["rows"]
+
+    rows = run_sandboxed_query(report["sql"])
+    if rows and "error" in rows[0]:
+        return rows
+    with _cache_lock:
+        if len(_result_cache) >= MAX_CACHED_RESULTS:
+            _result_cache.pop(next(iter(_result_cache)))
+        _result_cache[report["id"]] = {"rows": rows, "data_version": data_version, "at": now}
+    return rows
+
+
+def _format_rows(rows: List[Dict[str, Any]], max_rows: int = 50) -> str:
+    if not rows:
+        return "(no rows)"
+    lines = [" | ".join(str(k) for k in rows[0].keys())]
+    lines += [" | ".join(str(v) for v in r.values()) for r in rows[:max_rows]]
+    if len(rows) > max_rows:
+        lines.append(f"... {len(rows) - max_rows} more rows")
+    return "\n".join(lines)
+
+
+def answer_from_library(question: str) -> Optional[str]:
+    """
+    Return a formatted answer if a validated saved report matches `question`
+    closely enough to skip the LLM entirely, else None.
+    """
+    report = match_report(question, threshold=DIRECT_ANSWER_THRESHOLD, validated_only=True)
+    if not report:
+        return None
+    rows = run_report(report)
+    if rows and "error" in rows[0]:
+        return None
+    return f"Saved report '{report['title']}':\n{_format_rows(rows)}"
+
+
+# ------------------------- Save Back -------------------------
+def note_generated_query(sql: str) -> None:
+    """Remember `sql` as the current request's latest successful generated query."""
+    holder = _pending_sql.get()
+    if holder is not None:
+        holder["sql"] = sql
+
+
+def save_pending_report() -> Optional[int]:
+    """
+    After the agent has answered, save the request's last successful
+    generated query (the one behind the final answer, not the exploratory
+    ones before it) as an unvalidated report.
+    """
+    holder = _pending_sql.get()
+    if not holder or not holder["sql"]:
+        return None
+    sql, holder["sql"] = holder["sql"], None
+    return save_generated_report(sql)
+
+
+def save_generated_report(sql: str, title: Optional[str] = None, validated: bool = False) -> Optional[int]:
+    """
+    Store a successfully executed generated query in saved_reports under the
+    current question (or `title`), unless the same SQL is already saved.
+    Returns the new report id, or None when nothing was saved.
+    """
+    title = (title or current_question.get() or "").strip()
+    if not title:
+        return None
+    if not _has_validated_column():
+        # Unmigrated: the report could not be marked unvalidated, so don't save it
+        return None
+    normalized = _normalize_sql(sql)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        for (existing,) in conn.execute("SELECT sql FROM saved_reports"):
+            if _normalize_sql(existing) == normalized:
+                return None
+        cur = conn.execute(
+            "INSERT INTO saved_reports (title, sql, validated, created_at) VALUES (?, ?, ?, datetime('now'))",
+            (title[:200], sql.strip(), int(validated))
+        )
+        conn.commit()
+        report_id = cur.lastrowid
+    finally:
+        conn.close()
+    get_vector_index().upsert_many([("saved_reports", report_id, f"{title[:200]}\n{sql.strip()}")])
+    return report_id
+
+
+# ====================== Saved Report Tool =========================
+@tool
+def run_saved_report(question: str) -> str:
+    """
+    Look up a saved report that answers the question and run its stored SQL.
+    Use this BEFORE writing SQL with run_custom_query.
+    Input: the user's question in plain words.
+    """
+    try:
+        report = match_report(question)
+        if not report:
+            return "No saved report matches this question. Write SQL with run_custom_query."
+        rows = run_report(report)
+        if rows and "error" in rows[0]:
+            return f"Saved report '{report['title']}' failed: {rows[0]['error']}"
+        return f"Saved report '{report['title']}' (match {report['score']}):\n{_format_rows(rows)}"
+    except Exception as e:
+        return f"Saved report error: {str(e)}"
@@ -0,0 +1,171 @@
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.tools import tool
+
+DB_PATH = "erp.db"
+
+# Bucket start date for each grain (weeks start on Monday); {c} is the timestamp.
+GRAINS = {
+    "day": "date({c})",
+    "week": "date({c}, 'weekday 0', '-6 days')",
+    "month": "date({c}, 'start of month')",
+}
+# metric -> (source table, value expression, dimension expression) over a row alias.
+# Lead counts are kept per status, so "leads" yields leads_<status> per bucket.
+METRICS = {
+    "revenue": ("orders", "{r}.total", "''"),
+    "order_count": ("orders", "1", "''"),
+    "new_customers": ("customers", "1", "''"),
+    "leads": ("leads", "1", "COALESCE({r}.status, '')"),
+}
+# Columns whose change moves a row between buckets or dimensions.
+WATCHED_COLUMNS = {"orders": "total, created_at", "customers": "created_at", "leads": "status, created_at"}
+
+
+# ------------------------- Maintenance -------------------------
+def _bump(grain: str, metric: str, row: str, sign: str = "") -> str:
+    table, value, dimension = METRICS[metric]
+    bucket = GRAINS[grain].format(c=f"{row}.created_at")
+    return (f"INSERT INTO kpi_rollups (grain, metric, bucket, dimension, value) "
+            f"SELECT '{grain}', '{metric}', b, {dimension.format(r=row)}, {sign}{value.format(r=row)} "
+            f"FROM (SELECT {bucket} AS b) WHERE b IS NOT NULL "
+            f"ON CONFLICT (grain, metric, bucket, dimension) DO UPDATE SET value = value + excluded.value;")
+
+
+def _trigger_sql(table: str) -> List[str]:
+    metrics = [m for m, spec in METRICS.items() if spec[0] == table]
+    add = "\n".join(_bump(g, m, "new") for g in GRAINS for m in metrics)
+    remove = "\n".join(_bump(g, m, "old", "-") for g in GRAINS for m in metrics)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS kpi_rollups_{table}_ai AFTER INSERT ON {table} BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS kpi_rollups_{table}_ad AFTER DELETE ON {table} BEGIN {remove} END",
+        f"CREATE TRIGGER IF NOT EXISTS kpi_rollups_{table}_au AFTER UPDATE OF {WATCHED_COLUMNS[table]} "
+        f"ON {table} BEGIN {remove} {add} END",
+    ]
+
+
+def _aggregate_sql(grain: str, metric: str) -> str:
+    """SELECT grain, metric, bucket, dimension, value over the source table, one row per bucket."""
+    table, value, dimension = METRICS[metric]
+    bucket = GRAINS[grain].format(c="t.created_at")
+    return (f"SELECT '{grain}' AS grain, '{metric}' AS metric, {bucket} AS bucket, "
+            f"{dimension.format(r='t')} AS dimension, SUM({value.format(r='t')}) AS value "
+            f"FROM {table} t WHERE {bucket} IS NOT NULL GROUP BY 3, 4")
+
+
+def _backfill(conn: sqlite3.Connection) -> None:
+    for grain in GRAINS:
+        for metric in METRICS:
+            conn.execute(f"INSERT INTO kpi_rollups (grain, metric, bucket, dimension, value) "
+                         f"{_aggregate_sql(grain, metric)}")
+
+
+def _has_rollups(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'kpi_rollups'").fetchone() is not None
+
+
+def migrate_rollups(conn: sqlite3.Connection) -> str:
+    """
+    Create kpi_rollups and the triggers that keep it current on every insert,
+    update and delete of orders, customers and leads; backfill it from history
+    (in the same transaction, so no write is missed or counted twice).
+    Run by `python -m tools.bulk_tools migrate`; `conn` must be in autocommit mode.
+    """
+    exists = _has_rollups(conn)
+    if not exists:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE kpi_rollups (
+                    grain TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    dimension TEXT NOT NULL DEFAULT '',
+                    value REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (grain, metric, bucket, dimension)
+                ) WITHOUT ROWID
+            """)
+            _backfill(conn)
+            for table in WATCHED_COLUMNS:
+                for statement in _trigger_sql(table):
+                    conn.execute(statement)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return "ok" if exists else "created"
+
+
+def rebuild_rollups() -> Dict[str, int]:
+    """Recompute every bucket from the source tables (repair after bulk edits with triggers off)."""
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        if not _has_rollups(conn):
+            migrate_rollups(conn)  # creating it backfills from scratch
+            return {"buckets": conn.execute("SELECT COUNT(*) FROM kpi_rollups").fetchone()[0]}
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM kpi_rollups")
+        _backfill(conn)
+        conn.execute("COMMIT")
+        return {"buckets": conn.execute("SELECT COUNT(*) FROM kpi_rollups").fetchone()[0]}
+    finally:
+        conn.close()
+
+
+# ------------------------- Queries -------------------------
+def kpi_trend(metrics: Sequence[str], grain: str = "month", since: Optional[str] = None,
+              until: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    One row per bucket between `since` and `until` (dates, inclusive; the
+    buckets containing them count) with a column per metric, read from
+    kpi_rollups. "leads" adds one leads_<status> column per status.
+    Until kpi_rollups is migrated in, the buckets are aggregated from the
+    source tables on each call (same result, slower).
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"grain must be one of {tuple(GRAINS)}")
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"unknown metrics {unknown}; use {tuple(METRICS)}")
+
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        source = "kpi_rollups" if _has_rollups(conn) else \
+            "(" + " UNION ALL ".join(_aggregate_sql(grain, m) for m in dict.fromkeys(metrics)) + ")"
+        where, params = ["grain = ?", f"metric IN ({','.join('?' * len(metrics))})"], [grain, *metrics]
+        if since:
+            where.append(f"bucket >= {GRAINS[grain].format(c='?')}")
+            params.append(since)
+        if until:
+            where.append(f"bucket <= {GRAINS[grain].format(c='?')}")
+            params.append(until)
+        rows = conn.execute(
+            f"SELECT bucket, metric, dimension, value FROM {source} WHERE {' AND '.join(where)} "
+            f"ORDER BY bucket", params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for bucket, metric, dimension, value in rows:
+        row = buckets.setdefault(bucket, {"bucket": bucket, **{m: 0 for m in metrics if m != "leads"}})
+        row[f"{metric}_{dimension}" if dimension else metric] = round(value, 2) if metric == "revenue" else int(value)
+    return list(buckets.values())
+
+
+# ------------------------- Tools -------------------------
+@tool
+def get_kpi_trend(metric: str = "revenue", grain: str = "month", since: str = "", until: str = "") -> List[Dict[str, Any]]:
+    """
+    KPI trend from pre-aggregated daily/weekly/monthly buckets (fast for any date range).
+    Input: metric ("revenue", "order_count", "new_customers" or "leads" for lead counts per status;
+    several may be comma-separated), grain ("day", "week" or "month"),
+    optional since/until as YYYY-MM-DD.
+    Returns one row per bucket with its start date and the metric values.
+    """
+    try:
+        metrics = [m.strip() for m in (metric or "revenue").split(",") if m.strip()]
+        return kpi_trend(metrics, grain or "month", since or None, until or None)
+    except Exception as e:
+        return [{"error": str(e)}]
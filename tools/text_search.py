@@ -0,0 +1,178 @@
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from langchain.tools import tool
+
+DB_PATH = "erp.db"
+
+# Free-text sources: FTS5 table <source>_fts over `columns` of `table`, with
+# BM25 column weights and the fields returned with each hit.
+TEXT_INDEXES = {
+    "tickets": {
+        "table": "tickets",
+        "columns": ("subject", "body"),
+        "weights": (2.0, 1.0),
+        "fields": ("id", "customer_id", "subject", "status", "created_at"),
+    },
+    "leads": {
+        "table": "leads",
+        "columns": ("message",),
+        "weights": (1.0,),
+        "fields": ("id", "customer_name", "contact_email", "status", "score", "created_at"),
+    },
+}
+DEFAULT_LIMIT = 10
+SNIPPET_TOKENS = 12
+STOPWORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "about", "with",
+             "find", "show", "me", "all", "any", "tickets", "ticket", "leads", "lead", "messages"}
+
+
+# ------------------------- Index -------------------------
+def migrate_text_index(conn: sqlite3.Connection, source: str) -> str:
+    """
+    Create <source>_fts (external content, porter-stemmed) with the triggers
+    that keep it in sync with its table, and fill it the first time
+    (run by `python -m tools.bulk_tools migrate`).
+    """
+    spec = TEXT_INDEXES[source]
+    table, fts = spec["table"], f"{source}_fts"
+    cols = ", ".join(spec["columns"])
+    new = ", ".join(f"new.{c}" for c in spec["columns"])
+    old = ", ".join(f"old.{c}" for c in spec["columns"])
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+    conn.executescript(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='id', tokenize='porter unicode61'
+        );
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});
+        END;
+    """)
+    if not exists:
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    conn.commit()
+    return "ok" if exists else "created"
+
+
+def _has_text_index(conn: sqlite3.Connection, source: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{source}_fts",)).fetchone() is not None
+
+
+def _search_words(text: str) -> List[str]:
+    return list(dict.fromkeys(w for w in re.findall(r"\w+", (text or "").lower()) if w not in STOPWORDS))
+
+
+def _match_expressions(text: str) -> List[str]:
+    """All-terms expression first, then any-term as the looser fallback."""
+    words = _search_words(text)
+    if not words:
+        return []
+    terms = [f'"{w}"' for w in words]
+    return [" AND ".join(terms)] + ([" OR ".join(terms)] if len(terms) > 1 else [])
+
+
+# ------------------------- Search -------------------------
+def search_text(source: str, text: str, status: Optional[str] = None, since: Optional[str] = None,
+                until: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    """
+    BM25-ranked hits for `text` in one source ("tickets" or "leads"), each
+    with a highlighted snippet. Optional filters: exact status and created_at
+    between `since` and `until` (YYYY-MM-DD, inclusive). Until the FTS index
+    is migrated in, an unranked substring search answers instead.
+    """
+    if source not in TEXT_INDEXES:
+        return [{"error": f"source must be one of {tuple(TEXT_INDEXES)}"}]
+    expressions = _match_expressions(text)
+    if not expressions:
+        return [{"error": "search text has no searchable words"}]
+
+    spec = TEXT_INDEXES[source]
+    fts = f"{source}_fts"
+    where, params = [], []
+    if status:
+        where.append("t.status = ?")
+        params.append(status)
+    if since:
+        where.append("t.created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("t.created_at < date(?, '+1 day')")
+        params.append(until)
+    fields = ", ".join(f"t.{f}" for f in spec["fields"])
+
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _has_text_index(conn, source):
+            return _search_like(conn, spec, _search_words(text), fields, where, params, limit)
+        weights = ", ".join(str(w) for w in spec["weights"])
+        sql = (f"SELECT {fields}, snippet({fts}, -1, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet, "
+               f"bm25({fts}, {weights}) AS rank FROM {fts} JOIN {spec['table']} t ON t.id = {fts}.rowid "
+               f"WHERE {' AND '.join([f'{fts} MATCH ?'] + where)} ORDER BY rank LIMIT ?")
+        for expression in expressions:
+            rows = conn.execute(sql, [expression] + params + [limit]).fetchall()
+            if rows:
+                return [dict(r, rank=round(-r["rank"], 3)) for r in rows]
+        return []
+    finally:
+        conn.close()
+
+
+def _search_like(conn: sqlite3.Connection, spec: Dict[str, Any], words: List[str], fields: str,
+                 where: List[str], params: List[Any], limit: int) -> List[Dict[str, Any]]:
+    """
+    Unindexed fallback until the FTS table is migrated in: substring match
+    (all words, then any word), newest first, without snippet or rank.
+    """
+    text = " || ' ' || ".join(f"COALESCE(t.{c}, '')" for c in spec["columns"])
+    patterns = [f"%{w}%" for w in words]
+    for joiner in [" AND ", " OR "][:2 if len(words) > 1 else 1]:
+        match = "(" + joiner.join(f"({text}) LIKE ?" for _ in words) + ")"
+        rows = conn.execute(
+            f"SELECT {fields}, NULL AS snippet, NULL AS rank FROM {spec['table']} t "
+            f"WHERE {' AND '.join([match] + where)} ORDER BY t.created_at DESC LIMIT ?",
+            patterns + params + [limit]
+        ).fetchall()
+        if rows:
+            return [dict(r) for r in rows]
+    return []
+
+
+# ------------------------- Tools -------------------------
+@tool
+def search_tickets(query: str, status: str = "", since: str = "", until: str = "") -> List[Dict[str, Any]]:
+    """
+    Full-text search over support tickets (subject and body), best matches first.
+    Input: words to look for, e.g. "late delivery"; optional status ("open"/"closed")
+    and created_at range since/until as YYYY-MM-DD.
+    Returns ticket id, customer_id, subject, status, created_at and a matching snippet.
+    """
+    try:
+        return search_text("tickets", query, status or None, since or None, until or None)
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+@tool
+def search_lead_messages(query: str, status: str = "", since: str = "", until: str = "") -> List[Dict[str, Any]]:
+    """
+    Full-text search over lead messages, best matches first.
+    Input: words to look for, e.g. "bulk pricing"; optional status ("new"/"qualified"/"lost")
+    and created_at range since/until as YYYY-MM-DD.
+    Returns lead id, name, email, status, score, created_at and a matching snippet.
+    """
+    try:
+        return search_text("leads", query, status or None, since or None, until or None)
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+TEXT_SEARCH_TOOLS = [search_tickets, search_lead_messages]
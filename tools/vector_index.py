@@ -0,0 +1,471 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.tools import tool
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DB_PATH = "erp.db"
+INDEX_DIR = os.path.join("data", "vector_index")
+
+# Hashed vector width. 1M chunks x 512 float32 = 2 GB on disk, paged in by the OS.
+DIM = 512
+INITIAL_CAPACITY = 1024
+# Above this many live rows search switches from brute force to the IVF index.
+IVF_MIN_ROWS = 50_000
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+# Recent write batches (version, slots) kept in meta.json, so other processes
+# can update their IVF lists instead of rebuilding them.
+RECENT_WRITES_KEPT = 64
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "with", "how", "do",
+}
+
+
+# ------------------------- Embedding -------------------------
+def _tokens(text: str) -> List[str]:
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def _bucket(token: str) -> Tuple[int, float]:
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % DIM, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Hashed term-frequency vector (unigrams + bigrams, signed hashing, log tf),
+    L2-normalised. Deterministic and offline; no model download.
+    """
+    vec = np.zeros(DIM, dtype=np.float32)
+    counts: Dict[str, int] = {}
+    for tok in _tokens(text):
+        counts[tok] = counts.get(tok, 0) + 1
+    for tok, n in counts.items():
+        i, sign = _bucket(tok)
+        vec[i] += sign * (1.0 + np.log(n))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+# ------------------------- Vector Index -------------------------
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock across processes: server workers share one index directory."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class VectorIndex:
+    """
+    Memory-mapped float32 matrix of chunk vectors plus a small SQLite sidecar
+    (slot -> source, source_id, text, content hash). Slots freed by delete()
+    are reused, and chunks whose text is unchanged are not re-embedded.
+
+    Search is a brute-force matrix-vector product over the live slots; once the
+    index is large an IVF coarse quantiser, built in the background, narrows it
+    to a few lists. Query terms are weighted by IDF from document-frequency
+    counts kept per bucket.
+
+    Several processes may share the directory: writes hold a file lock and
+    first reload the slot bookkeeping if another process has written since.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_path = os.path.join(index_dir, "index.lock")
+        self._vectors_path = os.path.join(index_dir, "vectors.f32")
+        self._meta_path = os.path.join(index_dir, "meta.json")
+        self._meta = sqlite3.connect(os.path.join(index_dir, "chunks.db"), check_same_thread=False, timeout=30)
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._ivf_building = False
+        # Slots written while an IVF build runs (assigned when it is installed);
+        # None during a build means the build is outdated and is discarded.
+        self._ivf_pending: Optional[set] = None
+        with _file_lock(self._lock_path):
+            self._meta.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    slot INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    source_id TEXT NOT NULL,
+                    text TEXT,
+                    hash TEXT,
+                    UNIQUE (source, source_id)
+                )
+            """)
+            if "hash" not in {r[1] for r in self._meta.execute("PRAGMA table_info(chunks)")}:
+                self._meta.execute("ALTER TABLE chunks ADD COLUMN hash TEXT")
+            self._meta.commit()
+            self._load_state(self._read_state())
+
+    # ---------- storage ----------
+    def _read_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self._meta_path):
+            return {"capacity": INITIAL_CAPACITY, "size": 0, "version": 0}
+        with open(self._meta_path) as f:
+            return json.load(f)
+
+    def _load_state(self, state: Dict[str, Any]) -> None:
+        self.capacity = state["capacity"]
+        self.size = state["size"]  # high-water mark of used slots
+        self._version = state.get("version", 0)
+        self._log = state.get("log", [])
+        self._df = np.array(state.get("df", [0] * DIM), dtype=np.float32)
+        self._state_mtime = os.stat(self._meta_path).st_mtime_ns if os.path.exists(self._meta_path) else None
+        self._open_matrix()
+        self._alive = np.zeros(self.capacity, dtype=bool)
+        slots = [r[0] for r in self._meta.execute("SELECT slot FROM chunks")]
+        self._alive[slots] = True
+        self._free = sorted(set(range(self.size)) - set(slots), reverse=True)
+
+    def _open_matrix(self) -> None:
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode=mode,
+                                 shape=(self.capacity, DIM))
+
+    def _sync_from_disk(self, force: bool = False) -> None:
+        """
+        Pick up writes made by other processes since this one last read or wrote
+        the index. Searches trust meta.json's mtime; writes (force) always compare versions.
+        """
+        try:
+            mtime = os.stat(self._meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._state_mtime and not force:
+            return
+        state = self._read_state()
+        if state.get("version", 0) == self._version:
+            self._state_mtime = mtime
+            return
+        log = state.get("log", [])
+        changed: Optional[set] = None
+        if log and log[0][0] <= self._version + 1:
+            changed = {slot for version, slots in log if version > self._version for slot in slots}
+        self._load_state(state)
+        if self._ivf_building:
+            self._ivf_pending = None if changed is None or self._ivf_pending is None \
+                else self._ivf_pending | changed
+        if self._ivf is not None:
+            if changed is None:
+                self._ivf = None  # cannot tell which slots moved; rebuilt on the next search
+            else:
+                for slot in changed:
+                    if self._alive[slot]:
+                        self._ivf_assign(slot, self._matrix[slot])
+
+    def _grow(self) -> None:
+        self._matrix.flush()
+        del self._matrix
+        new_capacity = self.capacity * 2
+        with open(self._vectors_path, "r+b") as f:
+            f.truncate(new_capacity * DIM * 4)
+        self.capacity = new_capacity
+        self._open_matrix()
+        self._alive = np.concatenate([self._alive, np.zeros(new_capacity - len(self._alive), dtype=bool)])
+
+    def _save_state(self, slots: Iterable[int]) -> None:
+        """Persist one batch of writes; `slots` are the slots it touched (for other processes' IVF)."""
+        self._matrix.flush()
+        self._meta.commit()
+        self._version += 1
+        self._log = (self._log + [[self._version, sorted(set(int(s) for s in slots))]])[-RECENT_WRITES_KEPT:]
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"capacity": self.capacity, "size": self.size, "version": self._version,
+                       "log": self._log, "df": self._df.tolist()}, f)
+        os.replace(tmp, self._meta_path)
+        self._state_mtime = os.stat(self._meta_path).st_mtime_ns
+
+    def _df_update(self, vec: np.ndarray, sign: float) -> None:
+        self._df[vec != 0] += sign
+
+    # ---------- writes ----------
+    def upsert_many(self, items: Iterable[Tuple[str, Any, str]]) -> int:
+        """
+        Add or replace chunks given as (source, source_id, text). Chunks whose
+        text is unchanged are skipped. Returns count written.
+        """
+        written: List[int] = []
+        with self._lock, _file_lock(self._lock_path):
+            self._sync_from_disk(force=True)
+            for source, source_id, text in items:
+                source_id = str(source_id)
+                digest = _content_hash(text)
+                row = self._meta.execute(
+                    "SELECT slot, hash FROM chunks WHERE source = ? AND source_id = ?", (source, source_id)
+                ).fetchone()
+                if row and row[1] == digest:
+                    continue
+                if row:
+                    slot = row[0]
+                    self._df_update(self._matrix[slot], -1)
+                elif self._free:
+                    slot = self._free.pop()
+                else:
+                    if self.size >= self.capacity:
+                        self._grow()
+                    slot = self.size
+                    self.size += 1
+
+                vec = embed(text)
+                self._matrix[slot] = vec
+                self._df_update(vec, +1)
+                self._alive[slot] = True
+                self._meta.execute(
+                    "INSERT OR REPLACE INTO chunks (slot, source, source_id, text, hash) VALUES (?, ?, ?, ?, ?)",
+                    (slot, source, source_id, text, digest)
+                )
+                if self._ivf is not None:
+                    self._ivf_assign(slot, vec)
+                if self._ivf_pending is not None:
+                    self._ivf_pending.add(slot)
+                written.append(slot)
+            if written:
+                self._save_state(written)
+        return len(written)
+
+    def delete_many(self, keys: Iterable[Tuple[str, Any]]) -> int:
+        """Remove chunks given as (source, source_id). Returns count removed."""
+        removed: List[int] = []
+        with self._lock, _file_lock(self._lock_path):
+            self._sync_from_disk(force=True)
+            for source, source_id in keys:
+                row = self._meta.execute(
+                    "SELECT slot FROM chunks WHERE source = ? AND source_id = ?", (source, str(source_id))
+                ).fetchone()
+                if not row:
+                    continue
+                slot = row[0]
+                self._df_update(self._matrix[slot], -1)
+                self._matrix[slot] = 0.0
+                self._alive[slot] = False
+                self._free.append(slot)
+                self._meta.execute("DELETE FROM chunks WHERE slot = ?", (slot,))
+                removed.append(slot)
+            if removed:
+                self._save_state(removed)
+        return len(removed)
+
+    def delete(self, source: str, source_id: Any) -> bool:
+        return self.delete_many([(source, source_id)]) > 0
+
+    # ---------- IVF ----------
+    def build_ivf(self, nlist: int = IVF_NLIST, iterations: int = 10, sample: int = 100_000) -> bool:
+        """
+        Train a k-means coarse quantiser over the live vectors and assign every
+        slot to a list. Only the snapshot and the install hold the index lock,
+        so searches and writes carry on (brute force) while it trains.
+        Returns True when a new IVF index was installed.
+        """
+        with self._lock:
+            if self._ivf_building:
+                return False
+            live = np.flatnonzero(self._alive[:self.size])
+            if len(live) < nlist:
+                self._ivf = None
+                return False
+            self._ivf_building, self._ivf_pending = True, set()
+            matrix, capacity = self._matrix, self.capacity
+        try:
+            rng = np.random.default_rng(0)
+            train = np.array(matrix[rng.choice(live, size=min(sample, len(live)), replace=False)])
+            centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assign = np.argmax(train @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = train[assign == c]
+                    if len(members):
+                        centroid = members.mean(axis=0)
+                        norm = np.linalg.norm(centroid)
+                        centroids[c] = centroid / norm if norm > 0 else centroid
+
+            lists = np.full(capacity, -1, dtype=np.int32)
+            for start in range(0, len(live), 65536):
+                block = live[start:start + 65536]
+                lists[block] = np.argmax(matrix[block] @ centroids.T, axis=1)
+
+            with self._lock:
+                pending = self._ivf_pending
+                if pending is None:
+                    return False  # another process rewrote unknown slots meanwhile
+                self._ivf = (centroids, lists)
+                for slot in pending:
+                    if self._alive[slot]:
+                        self._ivf_assign(slot, self._matrix[slot])
+                return True
+        finally:
+            with self._lock:
+                self._ivf_building, self._ivf_pending = False, None
+
+    def _schedule_ivf(self) -> None:
+        """Build the IVF index in a background thread; searches stay brute force until it is installed."""
+        if not self._ivf_building:
+            threading.Thread(target=self.build_ivf, name="ivf-build", daemon=True).start()
+
+    def _ivf_assign(self, slot: int, vec: np.ndarray) -> None:
+        centroids, lists = self._ivf
+        if slot >= len(lists):
+            lists = np.concatenate([lists, np.full(self.capacity - len(lists), -1, dtype=np.int32)])
+            self._ivf = (centroids, lists)
+        lists[slot] = int(np.argmax(centroids @ vec))
+
+    # ---------- search ----------
+    def search(self, query: str, k: int = 5, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the top-k chunks for `query` as dicts with source, source_id, text and score."""
+        q = embed(query)
+        if not q.any():
+            return []
+
+        with self._lock:
+            self._sync_from_disk()
+            live_count = int(self._alive[:self.size].sum())
+            if live_count == 0:
+                return []
+            # IDF re-weighting on the query side only, so stored vectors never change
+            idf = np.log((1.0 + live_count) / (1.0 + self._df)) + 1.0
+            q = q * idf.astype(np.float32)
+
+            use_ivf = live_count >= IVF_MIN_ROWS
+            if use_ivf and self._ivf is None:
+                self._schedule_ivf()
+            if use_ivf and self._ivf is not None:
+                centroids, lists = self._ivf
+                probe = np.argsort(-(centroids @ q))[:IVF_NPROBE]
+                positions = np.flatnonzero(np.isin(lists[:self.size], probe) & self._alive[:self.size])
+                scores = self._matrix[positions] @ q
+            else:
+                # Deleted slots are zeroed, so they score 0 and are dropped below
+                positions = np.arange(self.size)
+                scores = self._matrix[:self.size] @ q
+        if len(positions) == 0:
+            return []
+
+        # Over-fetch when filtering by source so the filter still leaves k hits
+        fetch = min(len(positions), k * 4 if source else k)
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            score = float(scores[i])
+            if score <= 0:
+                break
+            row = self._meta.execute(
+                "SELECT source, source_id, text FROM chunks WHERE slot = ?", (int(positions[i]),)
+            ).fetchone()
+            if not row or (source and row[0] != source):
+                continue
+            results.append({"source": row[0], "source_id": row[1], "text": row[2], "score": round(score, 4)})
+            if len(results) >= k:
+                break
+        return results
+
+    def __len__(self) -> int:
+        return int(self._alive[:self.size].sum())
+
+
+# ------------------------- ERP Sources -------------------------
+def _document_text(module: str, path: str, tags: str) -> str:
+    """Text for a `documents` row: file contents for text files, else its metadata."""
+    text = f"{module} document {os.path.basename(path or '')} tags: {tags or ''}"
+    if path and path.lower().endswith((".md", ".txt")) and os.path.exists(path):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            text += "\n" + f.read()
+    return text
+
+
+def iter_erp_chunks(conn: sqlite3.Connection) -> Iterable[Tuple[str, Any, str]]:
+    """Yield (source, source_id, text) for documents, glossary terms and saved reports."""
+    for doc_id, module, path, tags in conn.execute("SELECT id, module, path, tags FROM documents"):
+        yield "documents", doc_id, _document_text(module, path, tags)
+    for term, definition, module in conn.execute("SELECT term, definition, module FROM glossary"):
+        yield "glossary", term, f"{term}: {definition} ({module})"
+    for report_id, title, sql in conn.execute("SELECT id, title, sql FROM saved_reports"):
+        yield "saved_reports", report_id, f"{title}\n{sql}"
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Return the process-wide index, syncing ERP sources the first time it is opened."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex()
+            sync_erp_sources(_index)
+        return _index
+
+
+def sync_erp_sources(index: Optional[VectorIndex] = None) -> int:
+    """(Re)index changed documents, glossary terms and saved_reports, dropping chunks whose rows are gone."""
+    if index is None:
+        index = get_vector_index()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        chunks = list(iter_erp_chunks(conn))
+    finally:
+        conn.close()
+    written = index.upsert_many(chunks)  # unchanged chunks are skipped by content hash
+    current = {(s, str(i)) for s, i, _ in chunks}
+    stale = [
+        (s, i) for s, i in index._meta.execute("SELECT source, source_id FROM chunks")
+        if s in ("documents", "glossary", "saved_reports") and (s, i) not in current
+    ]
+    index.delete_many(stale)
+    return written
+
+
+# ====================== RAG Tool =========================
+@tool
+def rag_search(query: str) -> str:
+    """
+    Search ERP documents, glossary definitions and saved reports by meaning.
+    Input: a natural-language question or keywords.
+    Returns the best matching snippets with their source.
+    """
+    try:
+        hits = get_vector_index().search(query, k=5)
+        if not hits:
+            return f"No related documents found for: {query}"
+        return "\n".join(
+            f"- [{h['source']} #{h['source_id']}] (score {h['score']}) {h['text'][:300]}" for h in hits
+        )
+    except Exception as e:
+        return f"RAG search error: {str(e)}"